@@ -0,0 +1,246 @@
+import argparse
+import smtplib
+import time
+import uuid
+from email.message import EmailMessage
+
+from psycopg2.extras import RealDictCursor, execute_values
+
+import fila
+import geo
+import metricas
+from config import Config
+from database import db_connection
+from matching import similaridade_raca
+
+# ==========================================
+# ALERTAS: ÍNDICE INVERTIDO
+# ==========================================
+
+# Cada alerta é gravado no índice alerta_indice uma vez por combinação
+# (situacao, especie, sexo, célula). sexo '*' vale para os dois e a célula é um
+# prefixo de geohash que cobre a área do alerta ('*' quando não há área).
+#
+# Para um anúncio novo, os alertas candidatos estão nas linhas com a mesma
+# situação e espécie, sexo igual ou '*', e célula igual a '*' ou a algum prefixo
+# do geohash do anúncio: no máximo 2 x 10 faixas da chave primária, não importa
+# quantos alertas existam. Só os candidatos passam pelos filtros finos
+# (distância exata, raça e período).
+
+QUALQUER = '*'
+
+def celulas_do_alerta(latitude, longitude, raio_km):
+    """Prefixos de geohash que cobrem a área do alerta (['*'] se ele não tem área)."""
+    if latitude is None or longitude is None or not raio_km:
+        return [QUALQUER]
+    return geo.celulas_cobrindo(latitude, longitude, raio_km, max_celulas=Config.ALERTA_MAX_CELULAS)
+
+def linhas_indice(id_alerta, situacao, especie, sexo, latitude, longitude, raio_km):
+    """Linhas de alerta_indice de um alerta."""
+    return [
+        (situacao, especie, sexo or QUALQUER, celula, id_alerta)
+        for celula in celulas_do_alerta(latitude, longitude, raio_km)
+    ]
+
+def celulas_do_pet(geohash):
+    """Células em que um anúncio pode cair: '*' e todos os prefixos do seu geohash."""
+    if not geohash:
+        return [QUALQUER]
+    return [QUALQUER] + [geohash[:tamanho] for tamanho in range(1, len(geohash) + 1)]
+
+def combina(alerta, pet):
+    """Filtros finos, aplicados só aos alertas que vieram do índice."""
+    if alerta['raio_km']:
+        if pet['latitude'] is None or pet['longitude'] is None:
+            return False
+        distancia = geo.distancia_km(alerta['latitude'], alerta['longitude'],
+                                     pet['latitude'], pet['longitude'])
+        if distancia > alerta['raio_km']:
+            return False
+    # Anúncio sem raça informada não é descartado: quem achou o animal nem sempre sabe a raça
+    if alerta['raca'] and pet['raca']:
+        if similaridade_raca(alerta['raca'], pet['raca']) < Config.ALERTA_MIN_RACA:
+            return False
+    return True
+
+@fila.tarefa('alertas.processar')
+@metricas.medir_sql('alertas.processar')
+def processar(pet_id):
+    """Grava na outbox um aviso para cada alerta que combina com o pet. Retorna quantos."""
+    with db_connection() as conn:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute("""
+            SELECT id_pet, id_usuario, especie, sexo, situacao, raca, data, latitude, longitude, geohash
+            FROM pet WHERE id_pet = %s AND NOT oculto
+        """, (pet_id,))
+        pet = cursor.fetchone()
+        if not pet:
+            cursor.close()
+            return 0
+
+        cursor.execute("""
+            SELECT a.id_alerta, a.id_usuario, a.raca, a.latitude, a.longitude, a.raio_km
+            FROM alerta_indice i
+            JOIN alerta a ON a.id_alerta = i.id_alerta
+            WHERE i.situacao = %s AND i.especie = %s AND i.sexo IN (%s, %s)
+              AND i.celula = ANY(%s)
+              AND a.ativo AND a.id_usuario <> %s
+              AND (a.data_inicio IS NULL OR a.data_inicio <= %s)
+              AND (a.data_fim IS NULL OR a.data_fim >= %s)
+        """, (pet['situacao'], pet['especie'], pet['sexo'], QUALQUER, celulas_do_pet(pet['geohash']),
+              pet['id_usuario'], pet['data'], pet['data']))
+        avisos = [
+            (alerta['id_alerta'], alerta['id_usuario'], pet_id)
+            for alerta in cursor.fetchall() if combina(alerta, pet)
+        ]
+        if avisos:
+            execute_values(cursor, """
+                INSERT INTO notificacao_outbox (id_alerta, id_usuario, id_pet) VALUES %s
+                ON CONFLICT (id_alerta, id_pet) DO NOTHING
+            """, avisos)
+        conn.commit()
+        cursor.close()
+        return len(avisos)
+
+# ==========================================
+# PROCESSAMENTO EM SEGUNDO PLANO
+# ==========================================
+
+def agendar(pet_id, cursor=None):
+    """Confere os alertas pela fila de tarefas, fora da requisição que salvou o pet."""
+    fila.enfileirar('alertas.processar', {'pet_id': pet_id}, cursor=cursor)
+
+# ==========================================
+# ENVIO DOS AVISOS (WORKER DA OUTBOX)
+# ==========================================
+
+def enviar(aviso):
+    """Manda o aviso por e-mail. Sem SMTP_HOST configurado, só registra no log."""
+    link = f"{Config.URL_SITE.rstrip('/')}/verpet/{aviso['id_pet']}"
+    texto = (
+        f"Olá, {aviso['nome']}!\n\n"
+        f"Um anúncio compatível com o seu alerta acaba de ser publicado no Radar Pet:\n\n"
+        f"{aviso['nome_pet']} ({aviso['especie']}, {aviso['situacao'].lower()}), visto em {aviso['visto_em']} "
+        f"no dia {aviso['data'].strftime('%d/%m/%Y')}.\n\n{link}\n"
+    )
+    if not Config.SMTP_HOST:
+        print(f"📨 Aviso para {aviso['e_mail']}: pet {aviso['id_pet']} ({link})")
+        return
+    mensagem = EmailMessage()
+    mensagem['Subject'] = f"Radar Pet: {aviso['especie']} {aviso['situacao'].lower()} compatível com seu alerta"
+    mensagem['From'] = Config.SMTP_REMETENTE
+    mensagem['To'] = aviso['e_mail']
+    mensagem.set_content(texto)
+    with smtplib.SMTP(Config.SMTP_HOST, Config.SMTP_PORTA, timeout=30) as smtp:
+        smtp.starttls()
+        if Config.SMTP_USUARIO:
+            smtp.login(Config.SMTP_USUARIO, Config.SMTP_SENHA)
+        smtp.send_message(mensagem)
+
+def _reservar(lote, reserva):
+    """Reserva até `lote` avisos pendentes para este worker, numa transação curta. Retorna os avisos.
+
+    FOR UPDATE SKIP LOCKED: dois workers nunca reservam o mesmo aviso. A
+    tentativa já conta na reserva: um aviso que derruba o worker não é tentado para sempre.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute("""
+            WITH reservados AS (
+                UPDATE notificacao_outbox
+                SET reservado_por = %s, reservado_ate = CURRENT_TIMESTAMP + %s * INTERVAL '1 second',
+                    tentativas = tentativas + 1
+                WHERE id_notificacao IN (
+                    SELECT id_notificacao FROM notificacao_outbox
+                    WHERE enviado_em IS NULL AND tentativas < %s
+                      AND (reservado_ate IS NULL OR reservado_ate < CURRENT_TIMESTAMP)
+                    ORDER BY id_notificacao
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id_notificacao, id_usuario, id_pet
+            )
+            SELECT r.id_notificacao, r.id_pet, u.nome, u.e_mail,
+                   p.nome AS nome_pet, p.especie, p.situacao, p.visto_em, p.data
+            FROM reservados r
+            JOIN usuario u ON u.id_usuario = r.id_usuario
+            JOIN pet p ON p.id_pet = r.id_pet
+            ORDER BY r.id_notificacao
+        """, (reserva, Config.ALERTA_RESERVA_SEGUNDOS, Config.ALERTA_MAX_TENTATIVAS, lote))
+        avisos = cursor.fetchall()
+        conn.commit()
+        cursor.close()
+    return avisos
+
+def _renovar(cursor, reserva, id_notificacao):
+    """Estende a reserva antes do envio. False se o aviso não é mais deste worker."""
+    cursor.execute("""
+        UPDATE notificacao_outbox SET reservado_ate = CURRENT_TIMESTAMP + %s * INTERVAL '1 second'
+        WHERE id_notificacao = %s AND reservado_por = %s AND enviado_em IS NULL
+    """, (Config.ALERTA_RESERVA_SEGUNDOS, id_notificacao, reserva))
+    renovada = cursor.rowcount == 1
+    cursor.connection.commit()
+    return renovada
+
+def despachar(lote=100):
+    """Envia um lote de avisos pendentes. Retorna (enviados, falhas).
+
+    Os avisos são reservados numa transação curta e enviados fora dela; cada
+    resultado é gravado assim que o e-mail sai. Nenhuma transação (nem lock)
+    fica aberta durante uma conversa SMTP, e um worker que morre no meio do
+    lote só pode repetir o aviso que estava enviando naquele instante.
+    """
+    reserva = str(uuid.uuid4())
+    avisos = _reservar(lote, reserva)
+    enviados = falhas = 0
+    if not avisos:
+        return enviados, falhas
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        for aviso in avisos:
+            if not _renovar(cursor, reserva, aviso['id_notificacao']):
+                # A reserva venceu e outro worker pegou o aviso
+                continue
+            try:
+                enviar(aviso)
+            except Exception as e:
+                falhas += 1
+                cursor.execute("""
+                    UPDATE notificacao_outbox SET erro = %s, reservado_por = NULL, reservado_ate = NULL
+                    WHERE id_notificacao = %s AND reservado_por = %s
+                """, (str(e)[:500], aviso['id_notificacao'], reserva))
+            else:
+                enviados += 1
+                cursor.execute("""
+                    UPDATE notificacao_outbox
+                    SET enviado_em = CURRENT_TIMESTAMP, erro = NULL, reservado_por = NULL, reservado_ate = NULL
+                    WHERE id_notificacao = %s
+                """, (aviso['id_notificacao'],))
+            conn.commit()
+        cursor.close()
+    return enviados, falhas
+
+def rodar_worker(intervalo=5, lote=100):
+    print("📬 Worker de alertas iniciado.")
+    while True:
+        try:
+            enviados, falhas = despachar(lote)
+        except Exception as e:
+            print(f"❌ Erro ao enviar avisos: {e}")
+            enviados = falhas = 0
+        if enviados or falhas:
+            print(f"📨 {enviados} aviso(s) enviado(s), {falhas} falha(s).")
+        # Lote cheio: provavelmente há mais pendentes, então não espera
+        if enviados + falhas < lote:
+            time.sleep(intervalo)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Envia os avisos de alertas pendentes na outbox.")
+    parser.add_argument('--intervalo', type=float, default=5, help="segundos entre verificações (padrão: 5)")
+    parser.add_argument('--lote', type=int, default=100)
+    parser.add_argument('--uma-vez', action='store_true', help="envia um lote e termina")
+    args = parser.parse_args()
+    if args.uma_vez:
+        print("%d enviado(s), %d falha(s)." % despachar(args.lote))
+    else:
+        rodar_worker(args.intervalo, args.lote)
@@ -1,8 +1,23 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, make_response, Response, g, send_from_directory
+from markupsafe import Markup
+import json
+import mimetypes
 import os
-from werkzeug.utils import secure_filename
-from database import init_db
-from models import Usuario, Pet, Denuncia # IMPORTANTE: Adicionar a importação de Denuncia
+from database import get_pool_stats, abrir_escopo, fechar_escopo
+from migrate import verificar_versao
+from models import Usuario, Pet, Denuncia, Alerta, CAMPOS_JSON, EmailJaCadastradoError # IMPORTANTE: Adicionar a importação de Denuncia
+from config import Config
+from cache import cache
+from imagens import agendar_variantes, variantes_disponiveis
+from storage import armazenamento, ArquivoGrandeDemaisError
+import phash
+import metricas
+import eventos
+import arquivo
+import assets
+import visualizacoes
+import threading
+import time
 from datetime import datetime
 from functools import wraps
 
@@ -10,9 +25,11 @@ app = Flask(__name__)
 app.secret_key = 'supersecretkey'  # IMPORTANTE: mude isso em produção
 
 # Configurações de upload
-UPLOAD_FOLDER = 'static/uploads'
+UPLOAD_FOLDER = Config.UPLOAD_FOLDER
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Corpo da requisição maior que isso é recusado (413) antes de ser lido
+app.config['MAX_CONTENT_LENGTH'] = Config.UPLOAD_MAX_BYTES + 1024 * 1024
 
 # Criar pasta de uploads se não existir
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -39,15 +56,327 @@ def admin_required(f):
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def resposta_condicional(resposta, namespace='pets:lista'):
+    """Adiciona ETag/Last-Modified e devolve 304 se o navegador já tiver esta versão."""
+    resposta.add_etag()
+    resposta.last_modified = cache.alterado_em(namespace)
+    # no-cache: o navegador guarda a resposta, mas sempre revalida (e recebe 304 se nada mudou)
+    resposta.cache_control.no_cache = True
+    return resposta.make_conditional(request)
+
+def pet_para_json(pet, campos=None):
+    """Formato de um pet nas respostas da API. `campos` limita as chaves devolvidas."""
+    # CORREÇÃO: Acessando dados como um dicionário ('pet['chave']')
+    # em vez de uma tupla ('pet[indice]').
+    item = {
+        'id': pet['id_pet'],
+        'nome': pet['nome'],
+        'especie': pet['especie'],
+        'raca': pet['raca'],
+        'situacao': pet['situacao'],
+        'foto': pet['foto'] if pet['foto'] else 'default-pet.jpg',
+        'data': pet['data'].strftime('%d/%m/%Y') if pet['data'] else '',
+        'sexo': pet['sexo'],
+        'descricao': pet['descricao'],
+        'mensagem_dono': pet['mensagem_dono'],
+        'nome_tutor': pet['nome_tutor'],
+        'telefone_tutor': pet['telefone_tutor'],
+        'visto_em': pet['visto_em'],
+        'nome_usuario': pet['nome_usuario'] if 'nome_usuario' in pet else '',
+        'latitude': pet.get('latitude'),
+        'longitude': pet.get('longitude'),
+        'status': pet.get('status', 'ativo'),
+    }
+    if campos is None or 'foto_srcset' in campos:
+        # srcset das versões reduzidas (None enquanto ainda não foram geradas)
+        item['foto_srcset'] = variantes_disponiveis(pet['foto'])
+    if campos is not None:
+        item = {campo: item[campo] for campo in campos}
+    return item
+
+def parse_campos(valor):
+    """?fields=id,nome,foto -> ['id', 'nome', 'foto'] (None quando não informado)."""
+    if not valor:
+        return None
+    campos = list(dict.fromkeys(campo.strip() for campo in valor.split(',') if campo.strip()))
+    invalidos = [campo for campo in campos if campo not in CAMPOS_JSON]
+    if invalidos or not campos:
+        raise ValueError(f"Campo(s) inválido(s) em fields: {', '.join(invalidos)}. "
+                         f"Use: {', '.join(CAMPOS_JSON)}.")
+    return campos
+
+def feed_em_streaming(campos, filtros, lote=500):
+    """Gera o JSON do feed inteiro aos pedaços, com a mesma forma da resposta paginada."""
+    campos = campos or list(CAMPOS_JSON)
+    yield '{"pets": ['
+    pedaco = []
+    primeiro = True
+    try:
+        for item in Pet.iterar_feed(campos, lote=lote, **filtros):
+            if 'foto_srcset' in item:
+                item['foto_srcset'] = variantes_disponiveis(item['foto_srcset'])
+            pedaco.append(json.dumps(item))
+            if len(pedaco) >= lote:
+                yield ('' if primeiro else ',') + ','.join(pedaco)
+                primeiro = False
+                pedaco = []
+    except Exception as e:
+        # Os cabeçalhos (200) já foram enviados: o JSON fica truncado e o cliente percebe o erro
+        print(f"Erro no streaming do feed: {e}")
+        raise
+    if pedaco:
+        yield ('' if primeiro else ',') + ','.join(pedaco)
+    yield '], "proximo_cursor": null}'
+
+def parse_coordenadas(latitude, longitude):
+    """Valida latitude/longitude vindas de formulário ou query string (ou None se vazias)."""
+    if latitude in (None, '') or longitude in (None, ''):
+        return None
+    try:
+        latitude, longitude = float(latitude), float(longitude)
+    except ValueError:
+        raise ValueError('Coordenadas inválidas.')
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError('Coordenadas fora do intervalo válido.')
+    return latitude, longitude
+
+def parse_perto(near, radius):
+    """Converte near='lat,lon' e radius (km) em (latitude, longitude, raio_km)."""
+    if not near:
+        return None
+    partes = near.split(',')
+    if len(partes) != 2:
+        raise ValueError("Use near=latitude,longitude")
+    latitude, longitude = parse_coordenadas(*partes)
+    try:
+        raio = float(radius) if radius else Config.RAIO_PADRAO_KM
+    except ValueError:
+        raise ValueError('Raio inválido.')
+    if raio <= 0:
+        raise ValueError('O raio deve ser maior que zero.')
+    return latitude, longitude, min(raio, Config.RAIO_MAX_KM)
+
+def pet_visivel(pet):
+    """Anúncios escondidos pela moderação só aparecem para administradores."""
+    return pet is not None and (not pet.get('oculto') or session.get('is_admin'))
+
+def parse_data(valor):
+    """Converte 'AAAA-MM-DD' vindo da query string em date (ou None se vazio)."""
+    if not valor:
+        return None
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f"Data inválida: {valor} (use AAAA-MM-DD)")
+
+def filtros_do_feed(args):
+    """Filtros do feed vindos da query string (mesmos nomes em /api/pets e /pet-perdido)."""
+    return {
+        'especie': args.get('especie'),
+        'situacao': args.get('situacao'),
+        'sexo': args.get('sexo'),
+        'data_inicio': parse_data(args.get('data_inicio')),
+        'data_fim': parse_data(args.get('data_fim')),
+        'perto': parse_perto(args.get('near'), args.get('radius')),
+        # Só os ativos por padrão; ?status=resolvido ou expirado mostra os encerrados
+        'status': args.get('status') or 'ativo',
+    }
+
+def pagina_de_pets(args):
+    """Uma página de pets para a página do feed: (pets, proxima_pagina).
+
+    Com ?q= usa a busca textual e a continuação é o número da próxima página;
+    sem, usa o feed e a continuação é o cursor.
+    """
+    termo = args.get('q', '').strip()
+    if termo:
+        pagina = max(1, min(args.get('pagina', 1, type=int), Config.BUSCA_MAX_PAGINAS))
+        pets, tem_mais = Pet.buscar_texto(
+            termo, limite=Config.PETS_POR_PAGINA, pagina=pagina,
+            max_candidatos=Config.BUSCA_MAX_CANDIDATOS,
+        )
+        return pets, (pagina + 1 if tem_mais and pagina < Config.BUSCA_MAX_PAGINAS else None)
+    return Pet.listar_todos(
+        limite=Config.PETS_POR_PAGINA, cursor=args.get('cursor'),
+        ordem=args.get('ordem') or 'recentes', **filtros_do_feed(args)
+    )
+
+def renderizar_cards(pets):
+    """HTML dos cards, cada um guardado em cache por (id_pet, revisao).
+
+    A revisão muda a cada UPDATE do pet, então um card em cache nunca fica
+    desatualizado; o srcset entra na chave porque as variantes da foto são
+    geradas depois do anúncio.
+    """
+    partes = []
+    for pet in pets:
+        foto_srcset = variantes_disponiveis(pet['foto'])
+        chave = f"cards:html:{pet['id_pet']}:{pet['revisao']}:{1 if foto_srcset else 0}"
+        partes.append(cache.get_or_set(
+            chave,
+            lambda: render_template('card-pet.html', pet=pet, foto_srcset=foto_srcset),
+            ttl=Config.CACHE_TTL_CARDS,
+        ))
+    return Markup(''.join(partes))
+
 # ==========================================
 # INICIALIZAÇÃO DO BANCO
 # ==========================================
 
+# As tabelas são criadas/atualizadas no deploy com `python migrate.py`.
+# Aqui só conferimos, uma vez por processo, se o banco está na versão esperada.
+verificar_versao()
+
+# Escuta os avisos de pets novos/removidos: alimenta /api/pets/eventos e, com o
+# cache em memória, invalida o cache deste processo quando outro worker escreve.
+if Config.EVENTOS_ATIVOS:
+    eventos.ouvinte.iniciar()
+
+# ==========================================
+# ARQUIVOS ESTÁTICOS VERSIONADOS (assets.py)
+# ==========================================
+
+# Nos templates, url_for('static', filename='index.css') aponta para a cópia
+# com hash no nome (dist/index.<hash>.css), que é servida já comprimida e com
+# cache de um ano. Arquivos sem cópia (uploads) seguem pelo caminho normal.
+if Config.ASSETS_ATIVOS:
+    assets.carregar()
+
+def url_for_estatico(endpoint, **values):
+    if endpoint == 'static' and 'filename' in values:
+        values['filename'] = assets.nome_versionado(values['filename'])
+    return url_for(endpoint, **values)
+
+def imagem_responsiva(filename, alt, sizes='100vw', classe=None):
+    """<img> de static/ dentro de um <picture> com as versões WebP, quando existem.
+
+    O <picture> usa display: contents para o CSS existente (flex, seletores
+    'pai img') continuar tratando o <img> como antes.
+    """
+    img = Markup('<img src="{}" alt="{}"{}>').format(
+        url_for_estatico('static', filename=filename), alt,
+        Markup(' class="{}"').format(classe) if classe else '',
+    )
+    variantes = assets.variantes_webp(filename)
+    if not variantes:
+        return img
+    srcset = ', '.join(f"{url_for('static', filename=nome)} {largura}w" for nome, largura in variantes)
+    return Markup('<picture style="display: contents"><source type="image/webp" srcset="{}" sizes="{}">{}</picture>').format(
+        srcset, sizes, img
+    )
+
+app.jinja_env.globals.update(url_for=url_for_estatico, imagem_responsiva=imagem_responsiva)
+
+def servir_estatico(filename):
+    if not assets.eh_versionado(filename):
+        return app.send_static_file(filename)
+    # Versionado: entrega o .br/.gz gerado no build, sem comprimir nada por requisição
+    resposta = None
+    for codificacao in ('br', 'gzip'):
+        comprimido = filename + ('.br' if codificacao == 'br' else '.gz')
+        if request.accept_encodings[codificacao] and os.path.isfile(os.path.join(app.static_folder, comprimido)):
+            resposta = send_from_directory(
+                app.static_folder, comprimido, max_age=Config.ASSETS_MAX_AGE,
+                mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+            )
+            resposta.headers['Content-Encoding'] = codificacao
+            break
+    if resposta is None:
+        resposta = send_from_directory(app.static_folder, filename, max_age=Config.ASSETS_MAX_AGE)
+    resposta.vary.add('Accept-Encoding')
+    resposta.cache_control.public = True
+    resposta.cache_control.immutable = True
+    return resposta
+
+app.view_functions['static'] = servir_estatico
+
+# ==========================================
+# CONEXÃO COM O BANCO POR REQUISIÇÃO
+# ==========================================
+
+# Todos os models chamados durante uma requisição usam a mesma conexão do pool
+# (emprestada só se alguma consulta for feita). No fim, o que ficou pendente é
+# confirmado, ou desfeito se a requisição terminou com erro.
+# Com réplicas de leitura, só GET/HEAD leem delas, e nem esses durante
+# DB_LEITURA_FIXA_SEGUNDOS depois de uma escrita do mesmo navegador: quem acabou
+# de publicar ou editar um anúncio o vê na próxima página, mesmo com a réplica atrasada.
+METODOS_LEITURA = ('GET', 'HEAD', 'OPTIONS')
+
+def leitura_fixada_no_primario():
+    escreveu_em = session.get('escreveu_em')
+    return escreveu_em is not None and time.time() - escreveu_em < Config.DB_LEITURA_FIXA_SEGUNDOS
+
 @app.before_request
-def before_first_request():
-    if not hasattr(app, 'db_initialized'):
-        init_db()
-        app.db_initialized = True
+def abrir_conexao_da_requisicao():
+    # Sem réplicas nem consulta a sessão (que acrescentaria "Vary: Cookie" às respostas)
+    usar_replica = bool(Config.DB_REPLICAS) and request.method in METODOS_LEITURA and not leitura_fixada_no_primario()
+    g.escopo_db = abrir_escopo(usar_replica=usar_replica)
+
+if Config.DB_REPLICAS:
+    @app.after_request
+    def lembrar_escrita(resposta):
+        if request.method not in METODOS_LEITURA and resposta.status_code < 400:
+            session['escreveu_em'] = time.time()
+        return resposta
+
+@app.teardown_request
+def fechar_conexao_da_requisicao(erro=None):
+    escopo = g.pop('escopo_db', None)
+    if escopo is not None:
+        fechar_escopo(escopo, erro)
+
+# ==========================================
+# MÉTRICAS E PROFILING
+# ==========================================
+
+if metricas.ATIVAS:
+    @app.before_request
+    def iniciar_medicao():
+        g.inicio_requisicao = time.perf_counter()
+        token = Config.PROFILER_TOKEN
+        if token and request.headers.get('X-Profile') == token:
+            g.amostrador = metricas.AmostradorPilha(threading.get_ident()).iniciar()
+
+    @app.after_request
+    def registrar_status(resposta):
+        g.status_resposta = resposta.status_code
+        amostrador = g.pop('amostrador', None)
+        if amostrador:
+            amostrador.parar()
+            print(f"🔬 Profile de {request.method} {request.path}:\n{amostrador.relatorio()}")
+            resposta.headers['X-Profile-Amostras'] = str(amostrador.amostras)
+        return resposta
+
+    @app.teardown_request
+    def registrar_duracao(erro=None):
+        inicio = g.pop('inicio_requisicao', None)
+        if inicio is None:
+            return
+        amostrador = g.pop('amostrador', None)
+        if amostrador:
+            # A requisição quebrou antes do after_request
+            amostrador.parar()
+        status = 500 if erro is not None else g.get('status_resposta', 500)
+        metricas.requisicoes.observar(
+            time.perf_counter() - inicio, request.endpoint or 'sem_rota', request.method, str(status)
+        )
+
+@app.route('/metrics')
+def metrics():
+    # Formato texto do Prometheus; métricas deste processo (cada worker tem as suas)
+    token = Config.METRICAS_TOKEN
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return Response('Não autorizado.\n', status=401, mimetype='text/plain')
+    return Response(metricas.exportar(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+# ==========================================
+# TRATAMENTO DE ERROS
+# ==========================================
+
+@app.errorhandler(413)
+def upload_grande_demais(e):
+    flash(f'A foto passa do limite de {Config.UPLOAD_MAX_BYTES // (1024 * 1024)} MB.', 'error')
+    return redirect(url_for('anunciar'))
 
 # ==========================================
 # ROTAS PÚBLICAS E DE USUÁRIO
@@ -66,18 +395,17 @@ def cadastro():
         email = request.form['email']
         telefone = request.form['telefone']
         
-        if Usuario.buscar_por_email(email):
+        usuario = Usuario(nome, sobrenome, email, telefone)
+        try:
+            user_id = usuario.salvar()
+        except EmailJaCadastradoError:
             flash('Email já cadastrado!', 'error')
             return render_template('cadastro.html')
         
-        usuario = Usuario(nome, sobrenome, email, telefone)
-        user_id = usuario.salvar()
-        
         if user_id:
-            user_data = Usuario.buscar_por_email(email)
-            session['user_id'] = user_data.id_usuario
-            session['user_name'] = user_data.nome
-            session['is_admin'] = user_data.is_admin # Armazena o status de admin na sessão
+            session['user_id'] = usuario.id_usuario
+            session['user_name'] = usuario.nome
+            session['is_admin'] = usuario.is_admin # Armazena o status de admin na sessão
             flash('Cadastro realizado com sucesso!', 'success')
             return redirect(url_for('index'))
         else:
@@ -122,20 +450,35 @@ def anunciar():
         if 'foto' in request.files:
             file = request.files['foto']
             if file and file.filename != '' and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
-                filename = timestamp + filename
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(file_path)
-                foto_filename = filename
+                # A foto é gravada pelo hash do conteúdo; fotos repetidas não ocupam espaço de novo
+                try:
+                    foto_filename, nova = armazenamento.salvar(file.stream, file.filename.rsplit('.', 1)[1])
+                except ArquivoGrandeDemaisError as e:
+                    flash(str(e), 'error')
+                    return render_template('anunciar.html')
+                if nova:
+                    # Thumbnails em WebP/JPEG são gerados pela fila de tarefas (python fila.py)
+                    try:
+                        agendar_variantes(foto_filename)
+                    except Exception as e:
+                        # O anúncio sai mesmo assim; `python imagens.py` gera as variantes que faltarem
+                        print(f"❌ Erro ao agendar variantes de {foto_filename}: {e}")
         
+        # Localização opcional, preenchida pelo botão "Usar minha localização"
+        try:
+            coordenadas = parse_coordenadas(request.form.get('latitude'), request.form.get('longitude'))
+        except ValueError:
+            coordenadas = None
+        latitude, longitude = coordenadas or (None, None)
+
         pet = Pet(
             nome=request.form['nome_pet'], especie=request.form['especie'],
             raca=request.form.get('raca', ''), situacao=request.form['situacao'],
             foto=foto_filename, data=request.form['data'], sexo=request.form['sexo'],
             descricao=request.form['descricao'], mensagem_dono=request.form.get('mensagem_dono', ''),
             nome_tutor=request.form['nome_tutor'], telefone_tutor=request.form['telefone_tutor'],
-            visto_em=request.form['visto_em'], id_usuario=session['user_id']
+            visto_em=request.form['visto_em'], id_usuario=session['user_id'],
+            latitude=latitude, longitude=longitude
         )
         
         pet_id = pet.salvar()
@@ -149,43 +492,271 @@ def anunciar():
 
 @app.route('/pet-perdido')
 def pet_perdido():
-    return render_template('pet-perdido.html')
+    # A primeira página de cards já vem no HTML; o JS só busca as seguintes
+    # em /pet-perdido/pagina.
+    try:
+        pets, proxima_pagina = pagina_de_pets(request.args)
+    except ValueError as e:
+        flash(str(e), 'error')
+        pets, proxima_pagina = [], None
+    return render_template(
+        'pet-perdido.html', cards=renderizar_cards(pets), sem_pets=not pets,
+        proxima_pagina=proxima_pagina, ao_vivo=Config.EVENTOS_ATIVOS,
+    )
+
+@app.route('/pet-perdido/card/<int:pet_id>')
+def pet_perdido_card(pet_id):
+    # Card de um pet só (usado quando chega um evento "novo" pelo /api/pets/eventos)
+    pet = Pet.buscar_por_id(pet_id)
+    if not pet_visivel(pet):
+        return Response('Pet não encontrado.', status=404, mimetype='text/plain')
+    return renderizar_cards([pet])
+
+@app.route('/pet-perdido/pagina')
+def pet_perdido_pagina():
+    # Próximas páginas do feed (?cursor=) ou da busca (?q=&pagina=), já como HTML dos cards.
+    # A continuação vem no cabeçalho X-Proxima-Pagina (ausente na última página).
+    try:
+        pets, proxima_pagina = pagina_de_pets(request.args)
+    except ValueError as e:
+        return Response(str(e), status=400, mimetype='text/plain')
+    resposta = make_response(renderizar_cards(pets))
+    if proxima_pagina is not None:
+        resposta.headers['X-Proxima-Pagina'] = str(proxima_pagina)
+    return resposta_condicional(resposta)
 
 @app.route('/api/pets')
 def api_pets():
-    pets = Pet.listar_todos()
-    pets_json = []
-    
-    for pet in pets:
-        # CORREÇÃO: Acessando dados como um dicionário ('pet['chave']')
-        # em vez de uma tupla ('pet[indice]').
-        pets_json.append({
-            'id': pet['id_pet'],
-            'nome': pet['nome'],
-            'especie': pet['especie'],
-            'raca': pet['raca'],
-            'situacao': pet['situacao'],
-            'foto': pet['foto'] if pet['foto'] else 'default-pet.jpg',
-            'data': pet['data'].strftime('%d/%m/%Y') if pet['data'] else '',
-            'sexo': pet['sexo'],
-            'descricao': pet['descricao'],
-            'mensagem_dono': pet['mensagem_dono'],
-            'nome_tutor': pet['nome_tutor'],
-            'telefone_tutor': pet['telefone_tutor'],
-            'visto_em': pet['visto_em'],
-            'nome_usuario': pet['nome_usuario'] if 'nome_usuario' in pet else ''
-        })
-    
-    return jsonify(pets_json)
+    # Paginação por cursor: ?cursor=<proximo_cursor da página anterior>&limite=N
+    # Filtros opcionais: especie, situacao, sexo, data_inicio e data_fim (AAAA-MM-DD)
+    # e near=lat,lon&radius=km para pets vistos perto de um ponto.
+    # ?fields=id,nome,foto devolve só esses campos; ?stream=1 devolve o feed inteiro
+    # (sem paginação) em streaming, lido do banco em lotes.
+    # ?ordem=tendencia (mais vistos recentemente) ou mais_vistos (total); padrão: recentes.
+    try:
+        campos = parse_campos(request.args.get('fields'))
+        limite = request.args.get('limite', Config.PETS_POR_PAGINA, type=int)
+        limite = max(1, min(limite, Config.PETS_POR_PAGINA_MAX))
+        filtros = filtros_do_feed(request.args)
+        ordem = request.args.get('ordem') or 'recentes'
+        if request.args.get('stream') in ('1', 'true'):
+            if ordem != 'recentes':
+                raise ValueError('O streaming só está disponível na ordem recentes.')
+            return Response(feed_em_streaming(campos, filtros), mimetype='application/json')
+        pets, proximo_cursor = Pet.listar_todos(
+            limite=limite, cursor=request.args.get('cursor'), ordem=ordem, **filtros
+        )
+    except ValueError as e:
+        return jsonify({'erro': str(e)}), 400
+
+    pets_json = [pet_para_json(pet, campos) for pet in pets]
+    return resposta_condicional(jsonify({'pets': pets_json, 'proximo_cursor': proximo_cursor}))
+
+@app.route('/api/pets/eventos')
+def api_pets_eventos():
+    # Server-Sent Events: "novo" e "removido" com o id do pet, para a página do
+    # feed atualizar os cards sem recarregar. Não usa conexão do banco.
+    if not Config.EVENTOS_ATIVOS:
+        return jsonify({'erro': 'Atualizações ao vivo desativadas.'}), 404
+    inscricao = eventos.ouvinte.inscrever()
+    if inscricao is None:
+        resposta = jsonify({'erro': 'Muitas conexões abertas, tente novamente em instantes.'})
+        resposta.status_code = 503
+        resposta.headers['Retry-After'] = '30'
+        return resposta
+
+    def gerar():
+        try:
+            # Intervalo de reconexão sugerido ao EventSource (ms)
+            yield 'retry: 5000\n\n'
+            fim = time.monotonic() + Config.EVENTOS_DURACAO_MAX
+            while inscricao.ativa and time.monotonic() < fim:
+                evento = inscricao.proximo(timeout=Config.EVENTOS_PING_SEGUNDOS)
+                if evento is None:
+                    yield ': ping\n\n'
+                else:
+                    yield f"event: {evento['tipo']}\ndata: {json.dumps(evento)}\n\n"
+        finally:
+            eventos.ouvinte.cancelar(inscricao)
+
+    resposta = Response(gerar(), mimetype='text/event-stream')
+    resposta.headers['Cache-Control'] = 'no-cache'
+    # Sem isso o nginx segura os eventos no buffer
+    resposta.headers['X-Accel-Buffering'] = 'no'
+    return resposta
+
+@app.route('/api/pets/search')
+def api_pets_search():
+    # Busca textual ranqueada: ?q=labrador caramelo centro&pagina=1&limite=20
+    termo = request.args.get('q', '').strip()
+    if not termo:
+        return jsonify({'erro': 'Informe o termo de busca no parâmetro q.'}), 400
+    try:
+        campos = parse_campos(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'erro': str(e)}), 400
+
+    limite = request.args.get('limite', Config.PETS_POR_PAGINA, type=int)
+    limite = max(1, min(limite, Config.PETS_POR_PAGINA_MAX))
+    pagina = request.args.get('pagina', 1, type=int)
+    pagina = max(1, min(pagina, Config.BUSCA_MAX_PAGINAS))
+
+    pets, tem_mais = Pet.buscar_texto(
+        termo, limite=limite, pagina=pagina, max_candidatos=Config.BUSCA_MAX_CANDIDATOS
+    )
+    proxima_pagina = pagina + 1 if tem_mais and pagina < Config.BUSCA_MAX_PAGINAS else None
+    return resposta_condicional(jsonify({
+        'pets': [pet_para_json(pet, campos) for pet in pets],
+        'pagina': pagina,
+        'proxima_pagina': proxima_pagina,
+    }))
+
+@app.route('/api/pets/<int:pet_id>/matches')
+def api_pet_matches(pet_id):
+    # Anúncios da situação oposta que podem ser o mesmo animal, com a nota (0 a 1)
+    if not pet_visivel(Pet.buscar_por_id(pet_id)):
+        return jsonify({'erro': 'Pet não encontrado.'}), 404
+    matches = []
+    for pet in Pet.listar_matches(pet_id, limite=Config.MATCH_MAX_POR_PET):
+        item = pet_para_json(pet)
+        item['pontuacao'] = round(pet['pontuacao'], 3)
+        matches.append(item)
+    return jsonify({'matches': matches})
+
+@app.route('/api/pets/<int:pet_id>/similar')
+def api_pet_similar(pet_id):
+    # Pets com foto igual ou parecida (mesma foto reenviada, ou outra foto do mesmo animal)
+    if not pet_visivel(Pet.buscar_por_id(pet_id)):
+        return jsonify({'erro': 'Pet não encontrado.'}), 404
+    raio = request.args.get('distancia', Config.PHASH_DISTANCIA_MAX, type=int)
+    raio = max(0, min(raio, 16))
+    try:
+        encontrados = phash.similares(pet_id, raio)[:Config.PETS_POR_PAGINA_MAX]
+    except Exception as e:
+        print(f"Erro ao buscar fotos parecidas: {e}")
+        encontrados = []
+    distancias = {outro: d for d, outro in encontrados}
+    similares = []
+    for pet in Pet.buscar_por_ids([outro for _, outro in encontrados]):
+        item = pet_para_json(pet)
+        item['distancia'] = distancias[pet['id_pet']]
+        similares.append(item)
+    return jsonify({'similares': similares})
 
 @app.route('/verpet/<int:pet_id>')
 def ver_pet(pet_id):
-    pet = Pet.buscar_por_id(pet_id)
-    if not pet:
+    # Encerrados há mais tempo saíram da tabela pet, mas a página continua no ar
+    pet = Pet.buscar_por_id(pet_id) or arquivo.buscar_arquivado(pet_id)
+    if not pet_visivel(pet):
         flash('Pet não encontrado!', 'error')
         return redirect(url_for('pet_perdido'))
+    if Config.VISUALIZACOES_ATIVAS and request.method == 'GET' and not pet.get('arquivado_em'):
+        # Só soma em memória; a gravação no banco é em lote (ver visualizacoes.py)
+        visualizacoes.contador.registrar(pet_id)
     
-    return render_template('verpet.html', pet=pet)
+    resposta = make_response(render_template(
+        'verpet.html', pet=pet, foto_srcset=variantes_disponiveis(pet['foto'])
+    ))
+    # A página mostra dados da sessão (nome do usuário), então só o navegador pode guardá-la
+    resposta.cache_control.private = True
+    return resposta_condicional(resposta)
+
+@app.route('/verpet/<int:pet_id>/status', methods=['POST'])
+def alterar_status_pet(pet_id):
+    # O dono marca o anúncio como resolvido (sai do feed) ou o reativa
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    status = request.form.get('status')
+    try:
+        alterado = Pet.alterar_status(pet_id, session['user_id'], status)
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('ver_pet', pet_id=pet_id))
+    if not alterado:
+        flash('Não foi possível alterar este anúncio.', 'error')
+    elif status == 'resolvido':
+        flash('Que bom! O anúncio foi marcado como resolvido e saiu do feed.', 'success')
+    else:
+        flash('Anúncio reativado.', 'success')
+    return redirect(url_for('ver_pet', pet_id=pet_id))
+
+# ==========================================
+# ALERTAS
+# ==========================================
+
+def alerta_do_formulario(form, id_usuario):
+    """Monta o Alerta a partir do formulário de /alertas (ValueError se algo estiver inválido)."""
+    especie = form.get('especie')
+    situacao = form.get('situacao', 'Achado')
+    sexo = form.get('sexo') or None
+    if especie not in ('Cachorro', 'Gato', 'Outros'):
+        raise ValueError('Escolha a espécie do animal.')
+    if situacao not in ('Achado', 'Perdido'):
+        raise ValueError('Situação inválida.')
+    if sexo not in (None, 'Macho', 'Fêmea'):
+        raise ValueError('Sexo inválido.')
+
+    coordenadas = parse_coordenadas(form.get('latitude'), form.get('longitude'))
+    latitude, longitude = coordenadas or (None, None)
+    raio_km = None
+    if coordenadas:
+        try:
+            raio_km = float(form.get('raio') or Config.RAIO_PADRAO_KM)
+        except ValueError:
+            raise ValueError('Raio inválido.')
+        if raio_km <= 0:
+            raise ValueError('O raio deve ser maior que zero.')
+        raio_km = min(raio_km, Config.ALERTA_RAIO_MAX_KM)
+
+    data_inicio = parse_data(form.get('data_inicio'))
+    data_fim = parse_data(form.get('data_fim'))
+    if data_inicio and data_fim and data_inicio > data_fim:
+        raise ValueError('A data inicial deve ser anterior à final.')
+
+    return Alerta(
+        id_usuario=id_usuario, especie=especie, situacao=situacao, sexo=sexo,
+        raca=(form.get('raca') or '').strip() or None, latitude=latitude, longitude=longitude,
+        raio_km=raio_km, data_inicio=data_inicio, data_fim=data_fim,
+    )
+
+@app.route('/alertas', methods=['GET', 'POST'])
+def alertas_usuario():
+    # Alertas do usuário: é avisado quando sai um anúncio compatível (ver alertas.py)
+    if 'user_id' not in session:
+        flash('Você precisa estar logado para criar alertas.', 'error')
+        return redirect(url_for('login'))
+
+    if request.method == 'POST':
+        if len(Alerta.listar_por_usuario(session['user_id'])) >= Config.ALERTAS_POR_USUARIO:
+            flash(f'Você já tem {Config.ALERTAS_POR_USUARIO} alertas. Remova algum para criar outro.', 'error')
+            return redirect(url_for('alertas_usuario'))
+        try:
+            alerta = alerta_do_formulario(request.form, session['user_id'])
+        except ValueError as e:
+            flash(str(e), 'error')
+            return redirect(url_for('alertas_usuario'))
+        if alerta.salvar():
+            flash('Alerta criado! Avisaremos você quando surgir um anúncio compatível.', 'success')
+        else:
+            flash('Erro ao criar o alerta.', 'error')
+        return redirect(url_for('alertas_usuario'))
+
+    return render_template(
+        'alertas.html',
+        alertas=Alerta.listar_por_usuario(session['user_id']),
+        avisos=Alerta.avisos_recentes(session['user_id']),
+        raio_padrao=Config.RAIO_PADRAO_KM, raio_max=Config.ALERTA_RAIO_MAX_KM,
+    )
+
+@app.route('/alertas/<int:alerta_id>/remover', methods=['POST'])
+def remover_alerta(alerta_id):
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    if Alerta.remover(alerta_id, session['user_id']):
+        flash('Alerta removido.', 'success')
+    else:
+        flash('Alerta não encontrado.', 'error')
+    return redirect(url_for('alertas_usuario'))
 
 # ==========================================
 # NOVAS ROTAS DE MODERAÇÃO
@@ -226,9 +797,53 @@ def denunciar(pet_id):
 @app.route('/admin')
 @admin_required # Protege a rota usando nosso decorator
 def admin_panel():
-    # Busca todas as denúncias com informações do pet e do usuário denunciante
-    denuncias = Denuncia.listar_todas() 
-    return render_template('admin.html', denuncias=denuncias)
+    # Fila de moderação: um item por pet denunciado, com as contagens e as denúncias mais recentes
+    ordem = request.args.get('ordem', 'contagem')
+    try:
+        itens, proximo_cursor = Denuncia.fila_moderacao(
+            ordem=ordem, cursor=request.args.get('cursor'), limite=Config.MODERACAO_POR_PAGINA
+        )
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('admin_panel'))
+    # Quantos outros anúncios usam uma foto igual/parecida (indício de golpe ou anúncio duplicado)
+    try:
+        fotos_parecidas = {
+            pet_id: len(encontrados)
+            for pet_id, encontrados in phash.similares_de_varios([item['id_pet'] for item in itens]).items()
+        }
+    except Exception as e:
+        print(f"Erro ao buscar fotos parecidas: {e}")
+        fotos_parecidas = {}
+    return render_template('admin.html', itens=itens, ordem=ordem, proximo_cursor=proximo_cursor,
+                           fotos_parecidas=fotos_parecidas)
+
+@app.route('/api/admin/moderacao')
+@admin_required
+def api_admin_moderacao():
+    # Mesma fila do painel em JSON: ?ordem=contagem|recentes&cursor=...&limite=N
+    limite = request.args.get('limite', Config.MODERACAO_POR_PAGINA, type=int)
+    limite = max(1, min(limite, Config.PETS_POR_PAGINA_MAX))
+    try:
+        itens, proximo_cursor = Denuncia.fila_moderacao(
+            ordem=request.args.get('ordem', 'contagem'), cursor=request.args.get('cursor'), limite=limite
+        )
+    except ValueError as e:
+        return jsonify({'erro': str(e)}), 400
+    for item in itens:
+        item['primeira'] = item['primeira'].isoformat()
+        item['ultima'] = item['ultima'].isoformat()
+    return jsonify({'itens': itens, 'proximo_cursor': proximo_cursor})
+
+@app.route('/admin/manter_pet/<int:pet_id>', methods=['POST'])
+@admin_required
+def manter_pet(pet_id):
+    # Denúncias analisadas e o anúncio fica: sai da fila e volta ao feed se estava oculto
+    if Denuncia.marcar_revisado(pet_id):
+        flash(f'Anúncio do pet ID {pet_id} mantido.', 'success')
+    else:
+        flash(f'Erro ao revisar o anúncio do pet ID {pet_id}.', 'error')
+    return redirect(url_for('admin_panel', ordem=request.args.get('ordem', 'contagem')))
 
 # @app.route('/admin/deletar_pet/<int:pet_id>', methods=['POST'])
 # @admin_required # Protege a rota
@@ -253,19 +868,8 @@ def admin_panel():
 @app.route('/admin/deletar_pet/<int:pet_id>', methods=['POST'])
 @admin_required # Protege a rota
 def deletar_pet(pet_id):
-    # buscar_por_id retorna um objeto RealDictRow (parecido com dicionário)
-    pet = Pet.buscar_por_id(pet_id)
-    
-    # CORREÇÃO: Acessar o campo 'foto' usando a sintaxe de dicionário ['foto']
-    if pet and pet['foto']:
-        try:
-            # Deleta o arquivo da imagem do servidor
-            os.remove(os.path.join(app.config['UPLOAD_FOLDER'], pet['foto']))
-        except OSError as e:
-            # Se o arquivo não for encontrado, apenas loga o erro, não impede a operação
-            print(f"Erro ao deletar arquivo de imagem: {e}")
-    
-    # Deleta o pet e suas denúncias (configurado com ON DELETE CASCADE no banco)
+    # Deleta o pet e suas denúncias (configurado com ON DELETE CASCADE no banco).
+    # A foto só é apagada do servidor se nenhum outro anúncio usar o mesmo arquivo.
     if Pet.deletar_por_id(pet_id):
         flash(f'Anúncio do pet ID {pet_id} deletado com sucesso.', 'success')
     else:
@@ -273,6 +877,18 @@ def deletar_pet(pet_id):
         
     return redirect(url_for('admin_panel'))
 
+@app.route('/admin/pool-stats')
+@admin_required
+def admin_pool_stats():
+    # Retrato do pool de conexões deste processo, para dimensionar DB_POOL_MIN/MAX
+    return jsonify(get_pool_stats() or {})
+
+@app.route('/admin/cache-stats')
+@admin_required
+def admin_cache_stats():
+    # Acertos/falhas do cache de leitura deste processo, por tipo de chave
+    return jsonify(cache.stats())
+
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,161 @@
+import argparse
+
+from psycopg2.extras import RealDictCursor
+
+import eventos
+import fila
+import metricas
+from config import Config
+from database import db_connection
+
+# ==========================================
+# CICLO DE VIDA DOS ANÚNCIOS
+# ==========================================
+
+# ativo -> resolvido (pelo dono) ou expirado (PET_EXPIRA_DIAS sem renovar).
+# O feed e a busca só mostram os ativos, com índices parciais que não crescem
+# com o histórico. Encerrados há mais de ARQUIVO_APOS_DIAS são movidos para
+# pet_arquivo, particionada por ano: a tabela pet fica com os anúncios "quentes"
+# e o histórico continua consultável (a página do pet cai no arquivo).
+#
+# A manutenção roda como tarefa periódica da fila (`python fila.py`) ou à mão:
+#   python arquivo.py
+
+# Colunas copiadas de pet para pet_arquivo
+COLUNAS_ARQUIVO = """
+    id_pet, nome, especie, raca, situacao, foto, data, sexo, descricao, mensagem_dono,
+    nome_tutor, telefone_tutor, visto_em, id_usuario, latitude, longitude, oculto,
+    status, status_em
+"""
+
+def _avisar_removidos(cursor, ids):
+    # Os cards saem do feed aberto e cada processo web limpa o cache (ver eventos.py)
+    for pet_id in ids:
+        eventos.notificar(cursor, 'removido', pet_id)
+
+@metricas.medir_sql('arquivo.expirar')
+def expirar(lote=None):
+    """Marca como 'expirado' os anúncios ativos há mais de PET_EXPIRA_DIAS. Retorna quantos."""
+    lote = lote or Config.ARQUIVO_LOTE
+    total = 0
+    while True:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE pet SET status = 'expirado', status_em = CURRENT_TIMESTAMP
+                WHERE id_pet IN (
+                    SELECT id_pet FROM pet
+                    WHERE status = 'ativo' AND status_em < CURRENT_TIMESTAMP - %s * INTERVAL '1 day'
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id_pet
+            """, (Config.PET_EXPIRA_DIAS, lote))
+            ids = [linha[0] for linha in cursor.fetchall()]
+            _avisar_removidos(cursor, ids)
+            conn.commit()
+            cursor.close()
+        total += len(ids)
+        if len(ids) < lote:
+            return total
+
+def _garantir_particoes(cursor, anos):
+    """Cria as partições anuais de pet_arquivo que ainda não existem."""
+    for ano in anos:
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS pet_arquivo_{ano:d} PARTITION OF pet_arquivo
+            FOR VALUES FROM ('{ano:d}-01-01') TO ('{ano + 1:d}-01-01')
+        """)
+
+@metricas.medir_sql('arquivo.arquivar')
+def arquivar(lote=None):
+    """Move para pet_arquivo os anúncios encerrados há mais de ARQUIVO_APOS_DIAS. Retorna quantos.
+
+    Cada lote é uma transação: o DELETE em pet e o INSERT no arquivo são
+    confirmados juntos. Denúncias, correspondências e avisos do anúncio saem
+    junto com ele (ON DELETE CASCADE); a foto continua contada em arquivo_upload.
+    """
+    lote = lote or Config.ARQUIVO_LOTE
+    total = 0
+    while True:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id_pet, EXTRACT(YEAR FROM data)::INTEGER FROM pet
+                WHERE status <> 'ativo' AND status_em < CURRENT_TIMESTAMP - %s * INTERVAL '1 day'
+                ORDER BY status_em
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, (Config.ARQUIVO_APOS_DIAS, lote))
+            linhas = cursor.fetchall()
+            ids = [pet_id for pet_id, _ in linhas]
+            if ids:
+                _garantir_particoes(cursor, sorted({ano for _, ano in linhas}))
+                cursor.execute(f"""
+                    WITH movidos AS (
+                        DELETE FROM pet WHERE id_pet = ANY(%s)
+                        RETURNING {COLUNAS_ARQUIVO}
+                    )
+                    INSERT INTO pet_arquivo ({COLUNAS_ARQUIVO})
+                    SELECT {COLUNAS_ARQUIVO} FROM movidos
+                """, (ids,))
+                _avisar_removidos(cursor, ids)
+            conn.commit()
+            cursor.close()
+        total += len(ids)
+        if len(ids) < lote:
+            return total
+
+@fila.periodica('arquivo.manutencao', Config.ARQUIVO_INTERVALO)
+def manutencao():
+    expirados = expirar()
+    arquivados = arquivar()
+    if expirados or arquivados:
+        print(f"🗄️ {expirados} anúncio(s) expirado(s), {arquivados} arquivado(s).")
+    return expirados, arquivados
+
+@metricas.medir_sql('arquivo.buscar')
+def buscar_arquivado(pet_id):
+    """O anúncio arquivado, no mesmo formato de Pet.buscar_por_id (ou None)."""
+    try:
+        with db_connection(leitura=True) as conn:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            cursor.execute("""
+                SELECT a.*, 0 AS revisao, u.nome AS nome_usuario
+                FROM pet_arquivo a
+                LEFT JOIN usuario u ON u.id_usuario = a.id_usuario
+                WHERE a.id_pet = %s
+            """, (pet_id,))
+            pet = cursor.fetchone()
+            cursor.close()
+            return dict(pet) if pet else None
+    except Exception as e:
+        print(f"Erro ao buscar pet arquivado: {e}")
+        return None
+
+def resumo():
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT status, COUNT(*) FROM pet GROUP BY status ORDER BY status")
+        por_status = cursor.fetchall()
+        cursor.execute("""
+            SELECT c.relname, c.reltuples::BIGINT
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'pet_arquivo'::regclass
+            ORDER BY c.relname
+        """)
+        particoes = cursor.fetchall()
+        cursor.close()
+    for status, total in por_status:
+        print(f"pet ({status}): {total}")
+    for nome, estimativa in particoes:
+        print(f"{nome}: ~{max(estimativa, 0)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Expira e arquiva anúncios encerrados.")
+    parser.add_argument('--resumo', action='store_true', help="mostra quantos anúncios há por status e partição")
+    args = parser.parse_args()
+    if args.resumo:
+        resumo()
+    else:
+        print("%d expirado(s), %d arquivado(s)." % manutencao())
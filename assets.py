@@ -0,0 +1,208 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+
+from config import Config
+
+# ==========================================
+# ARQUIVOS ESTÁTICOS VERSIONADOS
+# ==========================================
+
+# Cada arquivo de static/ (menos uploads/) ganha uma cópia em static/dist/ com
+# o hash do conteúdo no nome:
+#   index.css -> dist/index.3f2a1b4c.css (+ .gz e .br ao lado)
+#   imagens/pessoas_felizes_home.png -> dist/imagens/pessoas_felizes_home.9c0d....png
+#                                       (+ dist/imagens/pessoas_felizes_home.9c0d....960w.webp, ...)
+# Como o nome muda sempre que o conteúdo muda, o navegador pode guardar essas
+# cópias por um ano sem revalidar (Cache-Control: immutable). Os templates não
+# mudam: o url_for do app troca o nome original pelo versionado.
+#
+# A geração é incremental (só cria o que falta) e roda ao iniciar o app; para
+# gerar antes do deploy: python assets.py
+
+PASTA_STATIC = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+PASTA_SAIDA = 'dist'
+IGNORAR = ('uploads', PASTA_SAIDA)
+
+# Texto compensa comprimir; PNG/JPEG/WebP já são comprimidos
+COMPRIMIVEIS = ('.css', '.js', '.svg', '.ico', '.json', '.txt')
+IMAGENS_WEBP = ('.png', '.jpg', '.jpeg')
+LARGURAS_WEBP = (480, 960, 1600)
+
+_URL_CSS = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+_manifesto = {'arquivos': {}, 'webp': {}}
+
+def _hash(conteudo):
+    return hashlib.sha256(conteudo).hexdigest()[:12]
+
+def _gravar(caminho, conteudo):
+    """Grava de forma atômica: vários processos podem gerar o mesmo arquivo ao mesmo tempo."""
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, 'wb') as arquivo:
+        arquivo.write(conteudo)
+    os.replace(temporario, caminho)
+
+def _nome_com_hash(relativo, hash_conteudo, sufixo=None):
+    base, extensao = os.path.splitext(relativo)
+    return f"{PASTA_SAIDA}/{base}.{hash_conteudo}{extensao if sufixo is None else sufixo}"
+
+def _comprimir(destino, conteudo):
+    """Grava destino.gz e destino.br, quando ficam menores que o original."""
+    caminho = os.path.join(PASTA_STATIC, destino)
+    if not os.path.exists(caminho + '.gz'):
+        comprimido = gzip.compress(conteudo, compresslevel=9, mtime=0)
+        if len(comprimido) < len(conteudo):
+            _gravar(caminho + '.gz', comprimido)
+    if not os.path.exists(caminho + '.br'):
+        try:
+            import brotli  # opcional: sem ele, os navegadores recebem o .gz
+        except ImportError:
+            return
+        comprimido = brotli.compress(conteudo, quality=11)
+        if len(comprimido) < len(conteudo):
+            _gravar(caminho + '.br', comprimido)
+
+def _gerar_webp(origem, relativo, hash_conteudo):
+    """Versões WebP de uma imagem grande, uma por largura. Retorna {largura: nome}."""
+    from PIL import Image  # Pillow só é necessário para quem gera os arquivos
+
+    variantes = {}
+    with Image.open(origem) as imagem:
+        largura_original = imagem.width
+        for largura in LARGURAS_WEBP:
+            # Nunca amplia: a última variante é a largura original
+            largura = min(largura, largura_original)
+            destino = _nome_com_hash(relativo, hash_conteudo, f".{largura}w.webp")
+            caminho = os.path.join(PASTA_STATIC, destino)
+            if not os.path.exists(caminho):
+                copia = imagem.copy()
+                if copia.mode not in ('RGB', 'RGBA'):
+                    copia = copia.convert('RGBA')
+                copia.thumbnail((largura, largura * 4), Image.LANCZOS)
+                temporario = f"{caminho}.{os.getpid()}.tmp"
+                os.makedirs(os.path.dirname(caminho), exist_ok=True)
+                copia.save(temporario, 'WEBP', quality=80, method=6)
+                os.replace(temporario, caminho)
+            variantes[largura] = destino
+            if largura == largura_original:
+                break
+    return variantes
+
+def _arquivos_de_origem():
+    for pasta, subpastas, arquivos in os.walk(PASTA_STATIC):
+        relativa = os.path.relpath(pasta, PASTA_STATIC)
+        if relativa == '.':
+            subpastas[:] = [nome for nome in subpastas if nome not in IGNORAR]
+        for nome in sorted(arquivos):
+            if nome.startswith('.'):
+                continue
+            yield os.path.normpath(os.path.join(relativa, nome)).replace(os.sep, '/')
+
+def _reescrever_css(conteudo, relativo, arquivos):
+    """Troca as referências url(...) do CSS pelos nomes versionados."""
+    pasta_css = os.path.dirname(relativo)
+
+    def trocar(match):
+        aspas, url = match.groups()
+        if url.startswith(('data:', 'http:', 'https:', '//', '/')):
+            return match.group(0)
+        alvo = os.path.normpath(os.path.join(pasta_css, url)).replace(os.sep, '/')
+        if alvo not in arquivos:
+            return match.group(0)
+        # O CSS e a imagem estão ambos dentro de dist/, então o caminho relativo continua valendo
+        novo = os.path.relpath(arquivos[alvo], os.path.join(PASTA_SAIDA, pasta_css)).replace(os.sep, '/')
+        return f"url({aspas}{novo}{aspas})"
+
+    return _URL_CSS.sub(trocar, conteudo.decode('utf-8')).encode('utf-8')
+
+def construir():
+    """Gera o que falta em static/dist/ e retorna o manifesto ({'arquivos': ..., 'webp': ...})."""
+    arquivos = {}
+    webp = {}
+    origens = list(_arquivos_de_origem())
+    # CSS por último: ele referencia as imagens, e o hash dele depende dos nomes delas
+    for relativo in sorted(origens, key=lambda nome: nome.endswith('.css')):
+        origem = os.path.join(PASTA_STATIC, relativo)
+        with open(origem, 'rb') as arquivo:
+            conteudo = arquivo.read()
+        extensao = os.path.splitext(relativo)[1].lower()
+        if extensao == '.css':
+            conteudo = _reescrever_css(conteudo, relativo, arquivos)
+        hash_conteudo = _hash(conteudo)
+        destino = _nome_com_hash(relativo, hash_conteudo)
+        if not os.path.exists(os.path.join(PASTA_STATIC, destino)):
+            _gravar(os.path.join(PASTA_STATIC, destino), conteudo)
+        if extensao in COMPRIMIVEIS:
+            _comprimir(destino, conteudo)
+        if extensao in IMAGENS_WEBP and len(conteudo) >= Config.ASSETS_WEBP_MIN_BYTES:
+            try:
+                webp[relativo] = _gerar_webp(origem, relativo, hash_conteudo)
+            except Exception as e:
+                # Sem as versões WebP a página usa a imagem original
+                print(f"⚠️ Versões WebP de {relativo} não geradas: {e}")
+        arquivos[relativo] = destino
+
+    manifesto = {'arquivos': arquivos, 'webp': webp}
+    _gravar(os.path.join(PASTA_STATIC, PASTA_SAIDA, 'manifest.json'),
+            json.dumps(manifesto, indent=1, sort_keys=True).encode('utf-8'))
+    return manifesto
+
+def carregar():
+    """Prepara os arquivos versionados para este processo (chamado na inicialização do app)."""
+    global _manifesto
+    try:
+        _manifesto = construir()
+    except Exception as e:
+        # Sem os versionados (ex: disco só de leitura), os templates usam os nomes originais
+        print(f"⚠️ Não foi possível gerar os arquivos estáticos versionados: {e}")
+    return _manifesto
+
+def nome_versionado(filename):
+    """Nome em static/ da cópia versionada, ou o próprio filename se não houver."""
+    return _manifesto['arquivos'].get(filename, filename)
+
+def variantes_webp(filename):
+    """[(nome em static/, largura)] das versões WebP da imagem, da menor para a maior."""
+    return sorted(
+        ((nome, int(largura)) for largura, nome in _manifesto['webp'].get(filename, {}).items()),
+        key=lambda variante: variante[1],
+    )
+
+def eh_versionado(filename):
+    return filename.startswith(PASTA_SAIDA + '/')
+
+def limpar():
+    """Apaga de static/dist/ o que não pertence à versão atual. Retorna quantos arquivos."""
+    manifesto = construir()
+    atuais = {'manifest.json'}
+    for destino in manifesto['arquivos'].values():
+        atuais.update({destino, destino + '.gz', destino + '.br'})
+    for variantes in manifesto['webp'].values():
+        atuais.update(variantes.values())
+    atuais = {os.path.relpath(nome, PASTA_SAIDA) if eh_versionado(nome) else nome for nome in atuais}
+    removidos = 0
+    raiz = os.path.join(PASTA_STATIC, PASTA_SAIDA)
+    for pasta, _, arquivos in os.walk(raiz):
+        for nome in arquivos:
+            caminho = os.path.join(pasta, nome)
+            if os.path.relpath(caminho, raiz).replace(os.sep, '/') not in atuais:
+                os.remove(caminho)
+                removidos += 1
+    return removidos
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera as cópias versionadas e comprimidas de static/.")
+    parser.add_argument('--limpar', action='store_true',
+                        help="apaga as cópias de versões anteriores (cuidado com páginas ainda em cache)")
+    args = parser.parse_args()
+    if args.limpar:
+        print(f"🧹 {limpar()} arquivo(s) antigo(s) removido(s).")
+    else:
+        manifesto = construir()
+        print(f"📦 {len(manifesto['arquivos'])} arquivo(s) versionado(s), "
+              f"{len(manifesto['webp'])} imagem(ns) com versões WebP em static/{PASTA_SAIDA}/.")
@@ -0,0 +1,333 @@
+import argparse
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from datetime import date, datetime, timezone
+from http.cookiejar import CookieJar
+
+# ==========================================
+# TESTE DE CARGA DAS ROTAS
+# ==========================================
+
+# Dispara requisições contra um servidor já rodando (de preferência com
+# gunicorn, como em produção) e mede vazão e latência por cenário:
+#
+#   gunicorn -w 4 app:app &
+#   python benchmarks/semear.py --pets 100000
+#   python benchmarks/carga.py --url http://127.0.0.1:8000 --duracao 60 --saida resultado.json
+#   python benchmarks/carga.py --comparar antes.json depois.json
+#
+# O JSON de saída guarda o commit, os parâmetros e as estatísticas, para
+# comparar execuções entre commits.
+
+EMAIL_ADMIN = 'admin@benchmark.radarpet'
+EMAIL_USUARIO = 'usuario1@benchmark.radarpet'
+
+# Peso de cada cenário na mistura padrão
+MISTURA_PADRAO = {
+    'feed': 40,
+    'feed_filtros': 15,
+    'feed_paginas': 10,
+    'busca': 10,
+    'verpet': 20,
+    'anunciar': 3,
+    'admin': 2,
+}
+
+
+class SemRedirecionamento(urllib.request.HTTPRedirectHandler):
+    """Mede só a requisição em si: um 302 é a resposta, não um convite para outra."""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Cliente:
+    """Um "navegador": cookies próprios (sessão do Flask) e conexão HTTP própria."""
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self._abridor = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(CookieJar()), SemRedirecionamento()
+        )
+
+    def requisitar(self, caminho, dados=None, cabecalhos=None):
+        """Retorna (status, corpo). Respostas 3xx contam como sucesso."""
+        requisicao = urllib.request.Request(self.url + caminho, data=dados, headers=cabecalhos or {})
+        try:
+            with self._abridor.open(requisicao, timeout=30) as resposta:
+                return resposta.status, resposta.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def login(self, email):
+        status, _ = self.requisitar('/login', urllib.parse.urlencode({'email': email}).encode())
+        if status >= 400:
+            raise RuntimeError(f"Login de {email} falhou ({status}). Rode benchmarks/semear.py antes.")
+
+
+def _multipart(campos, arquivos):
+    fronteira = uuid.uuid4().hex
+    corpo = io.BytesIO()
+    for nome, valor in campos.items():
+        corpo.write(f'--{fronteira}\r\nContent-Disposition: form-data; name="{nome}"\r\n\r\n{valor}\r\n'.encode())
+    for nome, (arquivo, conteudo, tipo) in arquivos.items():
+        corpo.write(f'--{fronteira}\r\nContent-Disposition: form-data; name="{nome}"; '
+                    f'filename="{arquivo}"\r\nContent-Type: {tipo}\r\n\r\n'.encode())
+        corpo.write(conteudo)
+        corpo.write(b'\r\n')
+    corpo.write(f'--{fronteira}--\r\n'.encode())
+    return corpo.getvalue(), f'multipart/form-data; boundary={fronteira}'
+
+def gerar_fotos(quantidade, semente):
+    """Fotos JPEG distintas (ruído colorido), geradas uma vez antes da carga."""
+    from PIL import Image
+
+    rnd = random.Random(semente)
+    fotos = []
+    for _ in range(quantidade):
+        imagem = Image.frombytes('RGB', (640, 480), rnd.randbytes(640 * 480 * 3))
+        saida = io.BytesIO()
+        imagem.save(saida, 'JPEG', quality=85)
+        fotos.append(saida.getvalue())
+    return fotos
+
+# ==========================================
+# CENÁRIOS
+# ==========================================
+
+class Cenarios:
+    """Cada cenário faz uma requisição e retorna o status."""
+
+    def __init__(self, ids_pets, fotos, rnd):
+        self.ids_pets = ids_pets
+        self.fotos = fotos
+        self.rnd = rnd
+
+    def feed(self, cliente):
+        return cliente.requisitar('/api/pets?fields=id,nome,foto,foto_srcset,situacao,data,visto_em')[0]
+
+    def feed_filtros(self, cliente):
+        params = {'especie': self.rnd.choice(['Cachorro', 'Gato']),
+                  'situacao': self.rnd.choice(['Perdido', 'Achado'])}
+        if self.rnd.random() < 0.5:
+            params['near'] = f"{self.rnd.uniform(-23.7, -23.5):.4f},{self.rnd.uniform(-46.75, -46.5):.4f}"
+            params['radius'] = self.rnd.choice([1, 3, 5])
+        return cliente.requisitar('/api/pets?' + urllib.parse.urlencode(params))[0]
+
+    def feed_paginas(self, cliente):
+        # Segue alguns cursores: páginas fundas não podem ficar mais lentas que a primeira
+        caminho = '/api/pets?limite=20'
+        status = 200
+        for _ in range(5):
+            status, corpo = cliente.requisitar(caminho)
+            if status != 200:
+                break
+            cursor = json.loads(corpo).get('proximo_cursor')
+            if not cursor:
+                break
+            caminho = '/api/pets?limite=20&cursor=' + urllib.parse.quote(cursor)
+        return status
+
+    def busca(self, cliente):
+        termo = self.rnd.choice(['labrador', 'caramelo', 'coleira azul', 'siamês', 'centro', 'filhote'])
+        return cliente.requisitar('/api/pets/search?' + urllib.parse.urlencode({'q': termo}))[0]
+
+    def verpet(self, cliente):
+        return cliente.requisitar(f'/verpet/{self.rnd.choice(self.ids_pets)}')[0]
+
+    def anunciar(self, cliente):
+        campos = {
+            'nome_pet': 'Bench', 'especie': 'Cachorro', 'raca': 'SRD', 'situacao': 'Perdido',
+            'data': date.today().isoformat(), 'sexo': 'Macho', 'descricao': 'Anúncio de benchmark',
+            'mensagem_dono': '', 'nome_tutor': 'Benchmark', 'telefone_tutor': '11900000000',
+            'visto_em': 'Centro',
+        }
+        corpo, tipo = _multipart(campos, {'foto': ('foto.jpg', self.rnd.choice(self.fotos), 'image/jpeg')})
+        return cliente.requisitar('/anunciar', corpo, {'Content-Type': tipo})[0]
+
+    def admin(self, cliente):
+        status = cliente.requisitar('/admin')[0]
+        # Sem sessão de admin a rota redireciona: aqui isso é um erro, não um 302 qualquer
+        return 401 if 300 <= status < 400 else status
+
+# ==========================================
+# EXECUÇÃO
+# ==========================================
+
+def percentil(valores_ordenados, p):
+    if not valores_ordenados:
+        return None
+    indice = min(len(valores_ordenados) - 1, max(0, round(p / 100 * len(valores_ordenados)) - 1))
+    return valores_ordenados[indice]
+
+def coletar_ids(url, paginas):
+    """Ids de pets reais, seguindo o feed, para o cenário verpet."""
+    cliente = Cliente(url)
+    ids = []
+    caminho = '/api/pets?limite=100&fields=id'
+    for _ in range(paginas):
+        status, corpo = cliente.requisitar(caminho)
+        if status != 200:
+            raise RuntimeError(f"/api/pets respondeu {status}; o servidor está no ar em {url}?")
+        pagina = json.loads(corpo)
+        ids += [pet['id'] for pet in pagina['pets']]
+        if not pagina['proximo_cursor']:
+            break
+        caminho = '/api/pets?limite=100&fields=id&cursor=' + urllib.parse.quote(pagina['proximo_cursor'])
+    if not ids:
+        raise RuntimeError("Nenhum pet no feed. Rode benchmarks/semear.py antes.")
+    return ids
+
+def executar(url, mistura, duracao, usuarios, aquecimento, semente, paginas_ids, fotos_distintas):
+    ids_pets = coletar_ids(url, paginas_ids)
+    fotos = gerar_fotos(fotos_distintas, semente) if mistura.get('anunciar') else []
+    nomes = list(mistura)
+    pesos = [mistura[nome] for nome in nomes]
+    latencias = {nome: [] for nome in nomes}
+    erros = {nome: 0 for nome in nomes}
+    lock = threading.Lock()
+    inicio_medicao = time.monotonic() + aquecimento
+    fim = inicio_medicao + duracao
+
+    def trabalhador(numero):
+        rnd = random.Random(semente + numero)
+        cenarios = Cenarios(ids_pets, fotos, rnd)
+        comum, admin = Cliente(url), Cliente(url)
+        comum.login(EMAIL_USUARIO)
+        if 'admin' in mistura:
+            admin.login(EMAIL_ADMIN)
+        while True:
+            agora = time.monotonic()
+            if agora >= fim:
+                return
+            nome = rnd.choices(nomes, pesos)[0]
+            cliente = admin if nome == 'admin' else comum
+            t0 = time.perf_counter()
+            try:
+                status = getattr(cenarios, nome)(cliente)
+            except Exception:
+                status = 0
+            decorrido = time.perf_counter() - t0
+            if agora < inicio_medicao:
+                continue  # aquecimento: caches e pool ainda esfriando
+            with lock:
+                latencias[nome].append(decorrido)
+                if status == 0 or status >= 400:
+                    erros[nome] += 1
+
+    print(f"🏁 {usuarios} usuário(s) simultâneo(s), {aquecimento}s de aquecimento + {duracao}s medidos...")
+    threads = [threading.Thread(target=trabalhador, args=(i,), daemon=True) for i in range(usuarios)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    cenarios = {}
+    todas = []
+    for nome in nomes:
+        valores = sorted(latencias[nome])
+        todas += valores
+        cenarios[nome] = _estatisticas(valores, erros[nome], duracao)
+    return {
+        'commit': _commit_atual(),
+        'data': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'parametros': {
+            'url': url, 'duracao': duracao, 'usuarios': usuarios, 'aquecimento': aquecimento,
+            'semente': semente, 'mistura': mistura,
+        },
+        'total': _estatisticas(sorted(todas), sum(erros.values()), duracao),
+        'cenarios': cenarios,
+    }
+
+def _estatisticas(valores_ordenados, erros, duracao):
+    def ms(valor):
+        return round(valor * 1000, 2) if valor is not None else None
+    return {
+        'requisicoes': len(valores_ordenados),
+        'erros': erros,
+        'vazao_rps': round(len(valores_ordenados) / duracao, 2),
+        'p50_ms': ms(percentil(valores_ordenados, 50)),
+        'p95_ms': ms(percentil(valores_ordenados, 95)),
+        'p99_ms': ms(percentil(valores_ordenados, 99)),
+        'max_ms': ms(valores_ordenados[-1] if valores_ordenados else None),
+    }
+
+def _commit_atual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def imprimir(resultado):
+    print(f"\nCommit {resultado['commit']} — {resultado['data']}")
+    print(f"{'cenário':<14}{'req':>8}{'erros':>7}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}  (ms)")
+    linhas = list(resultado['cenarios'].items()) + [('TOTAL', resultado['total'])]
+    for nome, e in linhas:
+        print(f"{nome:<14}{e['requisicoes']:>8}{e['erros']:>7}{e['vazao_rps']:>9}"
+              f"{e['p50_ms'] or '-':>9}{e['p95_ms'] or '-':>9}{e['p99_ms'] or '-':>9}")
+
+def comparar(antes, depois):
+    """Diferença percentual de vazão e p95 por cenário entre duas execuções."""
+    print(f"{'cenário':<14}{'req/s antes':>12}{'depois':>9}{'Δ':>8}{'p95 antes':>11}{'depois':>9}{'Δ':>8}")
+    nomes = list(depois['cenarios']) + ['TOTAL']
+    for nome in nomes:
+        a = antes['total'] if nome == 'TOTAL' else antes['cenarios'].get(nome)
+        d = depois['total'] if nome == 'TOTAL' else depois['cenarios'][nome]
+        if not a:
+            continue
+
+        def delta(x, y):
+            return f"{100 * (y - x) / x:+.1f}%" if x and y is not None else '-'
+        print(f"{nome:<14}{a['vazao_rps']:>12}{d['vazao_rps']:>9}{delta(a['vazao_rps'], d['vazao_rps']):>8}"
+              f"{a['p95_ms'] or '-':>11}{d['p95_ms'] or '-':>9}{delta(a['p95_ms'], d['p95_ms']):>8}")
+
+def _mistura(texto):
+    if not texto:
+        return dict(MISTURA_PADRAO)
+    mistura = {}
+    for parte in texto.split(','):
+        nome, _, peso = parte.partition('=')
+        if not hasattr(Cenarios, nome.strip()):
+            raise argparse.ArgumentTypeError(f"Cenário desconhecido: {nome}. Use: {', '.join(MISTURA_PADRAO)}")
+        mistura[nome.strip()] = float(peso or 1)
+    return mistura
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Teste de carga das rotas do Radar Pet.")
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--duracao', type=float, default=30, help="segundos medidos")
+    parser.add_argument('--aquecimento', type=float, default=5, help="segundos descartados no início")
+    parser.add_argument('--usuarios', type=int, default=8, help="clientes simultâneos")
+    parser.add_argument('--mistura', type=_mistura, default=None,
+                        help="ex: feed=50,verpet=50 (padrão: %s)" % ','.join(f'{k}={v}' for k, v in MISTURA_PADRAO.items()))
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--paginas-ids', type=int, default=20, help="páginas do feed lidas para sortear pets")
+    parser.add_argument('--fotos-distintas', type=int, default=20, help="fotos diferentes usadas em /anunciar")
+    parser.add_argument('--saida', help="grava o resultado em JSON neste arquivo")
+    parser.add_argument('--comparar', nargs=2, metavar=('ANTES', 'DEPOIS'), help="compara dois resultados")
+    args = parser.parse_args()
+
+    if args.comparar:
+        with open(args.comparar[0], encoding='utf-8') as a, open(args.comparar[1], encoding='utf-8') as d:
+            comparar(json.load(a), json.load(d))
+        sys.exit(0)
+
+    resultado = executar(args.url, args.mistura or dict(MISTURA_PADRAO), args.duracao, args.usuarios,
+                         args.aquecimento, args.semente, args.paginas_ids, args.fotos_distintas)
+    imprimir(resultado)
+    if args.saida:
+        os.makedirs(os.path.dirname(os.path.abspath(args.saida)), exist_ok=True)
+        with open(args.saida, 'w', encoding='utf-8') as saida:
+            json.dump(resultado, saida, indent=2, ensure_ascii=False)
+        print(f"💾 Resultado gravado em {args.saida}")
@@ -0,0 +1,196 @@
+import argparse
+import csv
+import io
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+# Os scripts de benchmark rodam de dentro de benchmarks/, mas usam os módulos da raiz
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import geo  # noqa: E402
+from config import Config  # noqa: E402
+from database import get_db_connection  # noqa: E402
+from importacao import FluxoCopy  # noqa: E402
+
+# ==========================================
+# DADOS SINTÉTICOS PARA BENCHMARK
+# ==========================================
+
+# Gera usuários, pets e denúncias parecidos com os reais, de forma reproduzível
+# (mesma --semente, mesmos dados), e grava tudo por COPY:
+#
+#   python benchmarks/semear.py --pets 100000
+#   python benchmarks/semear.py --limpar
+#
+# Tudo o que é criado aqui é marcado (pet.origem = 'benchmark', e-mails em
+# @benchmark.radarpet) e pode ser apagado com --limpar sem tocar no resto.
+
+ORIGEM = 'benchmark'
+DOMINIO = 'benchmark.radarpet'
+# Conta administradora usada pelo harness para abrir o /admin
+EMAIL_ADMIN = f'admin@{DOMINIO}'
+
+NOMES_PET = ['Thor', 'Luna', 'Mel', 'Bob', 'Nina', 'Fred', 'Pipoca', 'Amora', 'Toby', 'Lola',
+             'Max', 'Belinha', 'Simba', 'Pretinha', 'Paçoca', 'Frida', 'Zeca', 'Mimi', 'Billy', 'Jade']
+RACAS = {
+    'Cachorro': ['SRD', 'Labrador', 'Poodle', 'Shih Tzu', 'Vira-lata caramelo', 'Pinscher',
+                 'Golden Retriever', 'Yorkshire', 'Pastor Alemão', 'Border Collie'],
+    'Gato': ['SRD', 'Siamês', 'Persa', 'Angorá', 'Maine Coon', 'Frajola', 'Rajado'],
+    'Outros': ['Calopsita', 'Coelho', 'Hamster', 'Papagaio', 'Jabuti'],
+}
+# Proporções aproximadas dos anúncios reais
+PESOS_ESPECIE = {'Cachorro': 0.62, 'Gato': 0.33, 'Outros': 0.05}
+CORES = ['caramelo', 'preto', 'branco', 'cinza', 'malhado', 'tigrado', 'marrom', 'amarelo']
+DETALHES = ['coleira vermelha', 'coleira azul', 'sem coleira', 'muito dócil', 'assustado',
+            'mancha no olho', 'rabo cortado', 'manca da pata traseira', 'castrado', 'filhote']
+BAIRROS = ['Centro', 'Vila Mariana', 'Pinheiros', 'Mooca', 'Tatuapé', 'Santana', 'Lapa',
+           'Butantã', 'Ipiranga', 'Saúde', 'Perdizes', 'Penha', 'Jabaquara', 'Liberdade']
+RUAS = ['Rua das Flores', 'Avenida Paulista', 'Rua Augusta', 'Rua da Consolação',
+        'Avenida Brasil', 'Rua Vergueiro', 'Praça da Sé', 'Rua Domingos de Morais']
+MOTIVOS = ['Anúncio falso', 'Pedido de dinheiro', 'Foto não é do animal', 'Conteúdo impróprio',
+           'Anúncio duplicado', 'Telefone não existe']
+# Região aproximada da cidade de São Paulo
+LATITUDES = (-23.75, -23.45)
+LONGITUDES = (-46.80, -46.45)
+
+def _copiar(cursor, tabela, colunas, linhas):
+    def gerar():
+        saida = io.StringIO()
+        escritor = csv.writer(saida)
+        for linha in linhas:
+            escritor.writerow(linha)
+            if saida.tell() > 64 * 1024:
+                yield saida.getvalue()
+                saida.seek(0)
+                saida.truncate()
+        yield saida.getvalue()
+    cursor.copy_expert(
+        f"COPY {tabela} ({', '.join(colunas)}) FROM STDIN WITH (FORMAT csv)", FluxoCopy(gerar())
+    )
+
+def _usuarios(quantidade):
+    yield ('Admin', 'Benchmark', EMAIL_ADMIN, '11900000000', True)
+    for i in range(1, quantidade):
+        yield (f'Usuário{i}', 'Benchmark', f'usuario{i}@{DOMINIO}', f'119{i:08d}'[:11], False)
+
+def _pets(rnd, quantidade, ids_usuarios, dias):
+    hoje = date.today()
+    especies = list(PESOS_ESPECIE)
+    pesos = list(PESOS_ESPECIE.values())
+    for i in range(quantidade):
+        especie = rnd.choices(especies, pesos)[0]
+        nome = rnd.choice(NOMES_PET)
+        cor = rnd.choice(CORES)
+        bairro = rnd.choice(BAIRROS)
+        # Datas concentradas nos dias mais recentes, como no feed real
+        data = hoje - timedelta(days=int(rnd.expovariate(1 / (dias / 4))) % dias)
+        latitude = longitude = geohash = None
+        if rnd.random() < 0.7:
+            latitude = round(rnd.uniform(*LATITUDES), 6)
+            longitude = round(rnd.uniform(*LONGITUDES), 6)
+            geohash = geo.geohash_encode(latitude, longitude)
+        yield (
+            nome, especie, rnd.choice(RACAS[especie]), rnd.choice(('Perdido', 'Achado')),
+            data.isoformat(), rnd.choice(('Macho', 'Fêmea')),
+            f"{especie} {cor}, {rnd.choice(DETALHES)} e {rnd.choice(DETALHES)}. Visto pela última vez no {bairro}.",
+            rnd.choice(['', 'Por favor, entre em contato!', 'Recompensa a quem encontrar.']),
+            f"Tutor {i}", f"119{rnd.randrange(10 ** 8):08d}",
+            f"{rnd.choice(RUAS)}, {bairro}", rnd.choice(ids_usuarios),
+            latitude, longitude, geohash, ORIGEM, f"bench-{i}",
+        )
+
+def _denuncias(rnd, quantidade, ids_pets, ids_usuarios):
+    # Poucos pets concentram muitas denúncias (golpes recorrentes), a maioria tem uma ou nenhuma
+    quentes = rnd.sample(ids_pets, max(1, len(ids_pets) // 1000))
+    for _ in range(quantidade):
+        id_pet = rnd.choice(quentes) if rnd.random() < 0.3 else rnd.choice(ids_pets)
+        yield (id_pet, rnd.choice(ids_usuarios), rnd.choice(MOTIVOS))
+
+def _ids(cursor, sql, params=()):
+    cursor.execute(sql, params)
+    return [linha[0] for linha in cursor.fetchall()]
+
+def limpar(conn):
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM pet WHERE origem = %s", (ORIGEM,))
+    pets = cursor.rowcount
+    cursor.execute("DELETE FROM usuario WHERE e_mail LIKE %s", (f'%@{DOMINIO}',))
+    usuarios = cursor.rowcount
+    conn.commit()
+    cursor.close()
+    print(f"🧹 {pets} pet(s) e {usuarios} usuário(s) de benchmark removidos.")
+
+def semear(conn, pets, usuarios=None, denuncias=None, dias=365, semente=42):
+    rnd = random.Random(semente)
+    usuarios = usuarios or max(10, pets // 20)
+    denuncias = pets // 50 if denuncias is None else denuncias
+    cursor = conn.cursor()
+    inicio = time.perf_counter()
+
+    _copiar(cursor, 'usuario', ('nome', 'sobrenome', 'e_mail', 'telefone', 'is_admin'), _usuarios(usuarios))
+    ids_usuarios = _ids(cursor, "SELECT id_usuario FROM usuario WHERE e_mail LIKE %s ORDER BY id_usuario",
+                        (f'%@{DOMINIO}',))
+    print(f"👤 {len(ids_usuarios)} usuário(s) ({time.perf_counter() - inicio:.1f}s)")
+
+    _copiar(cursor, 'pet', (
+        'nome', 'especie', 'raca', 'situacao', 'data', 'sexo', 'descricao', 'mensagem_dono',
+        'nome_tutor', 'telefone_tutor', 'visto_em', 'id_usuario', 'latitude', 'longitude',
+        'geohash', 'origem', 'id_externo',
+    ), _pets(rnd, pets, ids_usuarios, dias))
+    ids_pets = _ids(cursor, "SELECT id_pet FROM pet WHERE origem = %s ORDER BY id_pet", (ORIGEM,))
+    print(f"🐾 {len(ids_pets)} pet(s) ({time.perf_counter() - inicio:.1f}s)")
+
+    if denuncias:
+        _copiar(cursor, 'denuncia', ('id_pet', 'id_usuario', 'motivo'),
+                _denuncias(rnd, denuncias, ids_pets, ids_usuarios))
+        # O resumo da fila de moderação é mantido por Denuncia.salvar; o COPY passa por fora dele
+        cursor.execute("""
+            INSERT INTO denuncia_resumo AS r (id_pet, total, denunciantes, primeira, ultima)
+            SELECT d.id_pet, COUNT(*), COUNT(DISTINCT d.id_usuario), MIN(d.data_denuncia), MAX(d.data_denuncia)
+            FROM denuncia d JOIN pet p ON p.id_pet = d.id_pet
+            WHERE p.origem = %s
+            GROUP BY d.id_pet
+            ON CONFLICT (id_pet) DO UPDATE SET
+                total = EXCLUDED.total, denunciantes = EXCLUDED.denunciantes,
+                primeira = EXCLUDED.primeira, ultima = EXCLUDED.ultima, pendente = TRUE
+        """, (ORIGEM,))
+        cursor.execute("""
+            UPDATE pet SET oculto = TRUE
+            FROM denuncia_resumo r
+            WHERE r.id_pet = pet.id_pet AND pet.origem = %s
+              AND r.denunciantes - r.denunciantes_revisados >= %s
+        """, (ORIGEM, Config.DENUNCIA_LIMITE_OCULTAR))
+        print(f"🚩 {denuncias} denúncia(s) ({time.perf_counter() - inicio:.1f}s)")
+
+    conn.commit()
+    # Estatísticas atualizadas: sem isso o planejador usa estimativas da tabela vazia
+    conn.autocommit = True
+    for tabela in ('usuario', 'pet', 'denuncia', 'denuncia_resumo'):
+        cursor.execute(f"ANALYZE {tabela}")
+    conn.autocommit = False
+    cursor.close()
+    print(f"✅ Concluído em {time.perf_counter() - inicio:.1f}s. Admin do benchmark: {EMAIL_ADMIN}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera dados sintéticos de usuários, pets e denúncias.")
+    parser.add_argument('--pets', type=int, default=10000, help="de 10 mil a 1 milhão (padrão: 10000)")
+    parser.add_argument('--usuarios', type=int, default=None, help="padrão: pets / 20")
+    parser.add_argument('--denuncias', type=int, default=None, help="padrão: pets / 50")
+    parser.add_argument('--dias', type=int, default=365, help="intervalo de datas dos anúncios")
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--limpar', action='store_true', help="só remove os dados de benchmark")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    if not conn:
+        raise SystemExit(1)
+    try:
+        # Sempre recomeça do zero: a mesma semente gera os mesmos e-mails e id_externo
+        limpar(conn)
+        if not args.limpar:
+            semear(conn, args.pets, args.usuarios, args.denuncias, args.dias, args.semente)
+    finally:
+        conn.close()
@@ -0,0 +1,233 @@
+import argparse
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from config import Config
+
+# ==========================================
+# BACKENDS
+# ==========================================
+
+class LRUCache:
+    """Cache em memória (por processo) com limite de itens e expiração por TTL."""
+
+    def __init__(self, max_itens=1000, ttl=60):
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self._itens = OrderedDict()  # chave -> (expira_em, valor)
+        # Contadores (incr) e valores sem TTL (ttl=0): as gerações e o alterado_em
+        # de cada namespace. Ficam fora do LRU: se saíssem, a geração voltaria a 0
+        # e páginas gravadas em gerações antigas voltariam a ser servidas.
+        # São poucos (alguns por namespace).
+        self._permanentes = {}
+        self._lock = threading.Lock()
+
+    def get(self, chave):
+        """Retorna (encontrado, valor)."""
+        with self._lock:
+            if chave in self._permanentes:
+                return True, self._permanentes[chave]
+            item = self._itens.get(chave)
+            if item is None:
+                return False, None
+            expira_em, valor = item
+            if expira_em is not None and expira_em < time.monotonic():
+                del self._itens[chave]
+                return False, None
+            self._itens.move_to_end(chave)
+            return True, valor
+
+    def set(self, chave, valor, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            if not ttl:
+                self._itens.pop(chave, None)
+                self._permanentes[chave] = valor
+                return
+            self._permanentes.pop(chave, None)
+            expira_em = time.monotonic() + ttl
+            self._itens[chave] = (expira_em, valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def delete(self, chave):
+        with self._lock:
+            self._itens.pop(chave, None)
+            self._permanentes.pop(chave, None)
+
+    def incr(self, chave):
+        with self._lock:
+            valor = self._permanentes.get(chave, 0) + 1
+            self._permanentes[chave] = valor
+            return valor
+
+    def get_contador(self, chave):
+        with self._lock:
+            return self._permanentes.get(chave, 0)
+
+    def clear(self):
+        with self._lock:
+            self._itens.clear()
+            self._permanentes.clear()
+
+
+class RedisCache:
+    """Backend compartilhado entre processos (Redis ou qualquer servidor compatível)."""
+
+    def __init__(self, url, ttl=60):
+        import redis  # dependência opcional, só exigida quando CACHE_URL aponta para um Redis
+        self.ttl = ttl
+        self._cliente = redis.Redis.from_url(url)
+
+    def get(self, chave):
+        dados = self._cliente.get(chave)
+        if dados is None:
+            return False, None
+        return True, pickle.loads(dados)
+
+    def set(self, chave, valor, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self._cliente.set(chave, pickle.dumps(valor), ex=ttl or None)
+
+    def delete(self, chave):
+        self._cliente.delete(chave)
+
+    def incr(self, chave):
+        return self._cliente.incr(chave)
+
+    def get_contador(self, chave):
+        # INCR grava o número como texto (b'3'), não em pickle como os demais valores
+        dados = self._cliente.get(chave)
+        return int(dados) if dados is not None else 0
+
+    def clear(self):
+        self._cliente.flushdb()
+
+
+# ==========================================
+# FACHADA COM CONTADORES
+# ==========================================
+
+class Cache:
+    """Cache read-through com contadores de acertos/falhas por prefixo de chave."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _contar(self, chave, campo):
+        prefixo = chave.split(':', 2)[:2]
+        prefixo = ':'.join(prefixo)
+        with self._lock:
+            contadores = self._stats.setdefault(prefixo, {'hits': 0, 'misses': 0})
+            contadores[campo] += 1
+
+    def get_or_set(self, chave, carregar, ttl=None):
+        """Retorna o valor em cache ou chama `carregar()` e guarda o resultado.
+
+        Se o backend estiver indisponível, cai direto para `carregar()`.
+        """
+        try:
+            encontrado, valor = self.backend.get(chave)
+        except Exception as e:
+            print(f"⚠️ Cache indisponível: {e}")
+            return carregar()
+        if encontrado:
+            self._contar(chave, 'hits')
+            return valor
+
+        self._contar(chave, 'misses')
+        valor = carregar()
+        try:
+            self.backend.set(chave, valor, ttl)
+        except Exception as e:
+            print(f"⚠️ Erro ao gravar no cache: {e}")
+        return valor
+
+    def delete(self, chave):
+        try:
+            self.backend.delete(chave)
+        except Exception as e:
+            print(f"⚠️ Erro ao invalidar cache: {e}")
+
+    def geracao(self, namespace):
+        """Número da 'versão' atual de um grupo de chaves (ex: todas as páginas do feed)."""
+        try:
+            return self.backend.get_contador(f"{namespace}:geracao")
+        except Exception:
+            return 0
+
+    def invalidar_namespace(self, namespace):
+        """Invalida todas as chaves do grupo de uma vez, avançando a geração.
+
+        As chaves antigas não são apagadas uma a uma; elas deixam de ser
+        lidas e saem do cache pelo LRU/TTL.
+        """
+        try:
+            self.backend.incr(f"{namespace}:geracao")
+            self.backend.set(f"{namespace}:alterado_em", time.time(), ttl=0)
+        except Exception as e:
+            print(f"⚠️ Erro ao invalidar cache: {e}")
+
+    def alterado_em(self, namespace):
+        """Momento (timestamp) da última invalidação do grupo, para o header Last-Modified."""
+        try:
+            encontrado, valor = self.backend.get(f"{namespace}:alterado_em")
+        except Exception:
+            encontrado = False
+        if not encontrado:
+            valor = _INICIO
+            try:
+                self.backend.set(f"{namespace}:alterado_em", valor, ttl=0)
+            except Exception:
+                pass
+        return valor
+
+    def stats(self):
+        with self._lock:
+            stats = {prefixo: dict(c) for prefixo, c in self._stats.items()}
+        for contadores in stats.values():
+            total = contadores['hits'] + contadores['misses']
+            contadores['hit_ratio'] = round(contadores['hits'] / total, 4) if total else 0.0
+        return stats
+
+
+_INICIO = time.time()
+
+def _criar_backend():
+    if Config.CACHE_URL:
+        try:
+            return RedisCache(Config.CACHE_URL, ttl=Config.CACHE_TTL)
+        except Exception as e:
+            print(f"⚠️ Cache compartilhado indisponível ({e}); usando cache em memória.")
+    return LRUCache(max_itens=Config.CACHE_MAX_ITENS, ttl=Config.CACHE_TTL)
+
+cache = Cache(_criar_backend())
+
+def verificar(backend=None):
+    """Confere se invalidar_namespace avança a geração no backend. Retorna True se sim."""
+    fachada = Cache(backend or cache.backend)
+    namespace = f"verificacao:{os.getpid()}"
+    antes = fachada.geracao(namespace)
+    fachada.invalidar_namespace(namespace)
+    depois = fachada.geracao(namespace)
+    for sufixo in ('geracao', 'alterado_em'):
+        fachada.backend.delete(f"{namespace}:{sufixo}")
+    return depois == antes + 1
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ferramentas do cache.")
+    parser.add_argument('--verificar', action='store_true',
+                        help="confere, no backend configurado (CACHE_URL), se a invalidação por geração funciona")
+    args = parser.parse_args()
+    if args.verificar:
+        ok = verificar()
+        print(f"{'✅' if ok else '❌'} {type(cache.backend).__name__}: invalidação por geração "
+              f"{'funcionando' if ok else 'NÃO avança a geração'}.")
+        raise SystemExit(0 if ok else 1)
+    parser.print_help()
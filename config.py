@@ -21,4 +21,167 @@ class Config:
         DB_PORT = os.getenv('DB_PORT', '5432')
         DB_DATABASE = os.getenv('DB_DATABASE', 'radar_pet')
         
-        DB_CONNECTION_STRING = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_DATABASE}"
\ No newline at end of file
+        DB_CONNECTION_STRING = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_DATABASE}"
+
+    # --- Pool de conexões ---
+    # Quantidade mínima de conexões mantidas abertas e o limite máximo simultâneo.
+    DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', '1'))
+    DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', '10'))
+    # Tempo máximo (segundos) que uma requisição espera por uma conexão livre.
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+    # Uma conexão é descartada e recriada depois de N usos (0 desativa)...
+    DB_POOL_MAX_USOS = int(os.getenv('DB_POOL_MAX_USOS', '1000'))
+    # ...ou depois de ficar ociosa por mais de X segundos.
+    DB_POOL_IDLE_TIMEOUT = float(os.getenv('DB_POOL_IDLE_TIMEOUT', '300'))
+    # Conexões ociosas há mais de X segundos recebem um 'SELECT 1' antes de serem entregues.
+    DB_POOL_HEALTH_CHECK = float(os.getenv('DB_POOL_HEALTH_CHECK', '30'))
+    # Consultas frequentes viram prepared statements (PREPARE/EXECUTE) em cada conexão.
+    # Desligue atrás de um PgBouncer em modo transaction, onde a sessão muda a cada transação.
+    DB_PREPARED_STATEMENTS = os.getenv('DB_PREPARED_STATEMENTS', 'true').lower() == 'true'
+    DB_PREPARADAS_MAX = int(os.getenv('DB_PREPARADAS_MAX', '100'))
+
+    # --- Réplicas de leitura (opcional) ---
+    # DSNs separados por vírgula. Sem réplicas, tudo continua indo para DB_CONNECTION_STRING.
+    DB_REPLICAS = [dsn.strip() for dsn in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if dsn.strip()]
+    # Conexões máximas no pool de cada réplica (por processo)
+    DB_REPLICA_POOL_MAX = int(os.getenv('DB_REPLICA_POOL_MAX', os.getenv('DB_POOL_MAX', '10')))
+    # Réplica que falhou ou ficou atrasada sai do rodízio por este tempo (segundos)
+    DB_REPLICA_EJECAO = float(os.getenv('DB_REPLICA_EJECAO', '30'))
+    # Atraso máximo de replicação aceito (segundos), conferido a cada DB_REPLICA_VERIFICACAO
+    DB_REPLICA_ATRASO_MAX = float(os.getenv('DB_REPLICA_ATRASO_MAX', '5'))
+    DB_REPLICA_VERIFICACAO = float(os.getenv('DB_REPLICA_VERIFICACAO', '10'))
+    # Depois de uma escrita, as leituras do mesmo usuário ficam no primário por este tempo,
+    # para ele ver o que acabou de gravar mesmo com a réplica atrasada
+    DB_LEITURA_FIXA_SEGUNDOS = float(os.getenv('DB_LEITURA_FIXA_SEGUNDOS', '5'))
+
+    # --- Paginação do feed de pets (/api/pets) ---
+    PETS_POR_PAGINA = int(os.getenv('PETS_POR_PAGINA', '20'))
+    PETS_POR_PAGINA_MAX = int(os.getenv('PETS_POR_PAGINA_MAX', '100'))
+
+    # --- Cache de leitura (feed e detalhes dos pets) ---
+    # Sem CACHE_URL, cada processo usa um LRU em memória; com CACHE_URL
+    # (ex: redis://localhost:6379/0) o cache é compartilhado entre os workers.
+    CACHE_URL = os.getenv('CACHE_URL')
+    CACHE_TTL = int(os.getenv('CACHE_TTL', '30'))
+    CACHE_MAX_ITENS = int(os.getenv('CACHE_MAX_ITENS', '2000'))
+    # Cards do feed já renderizados: a chave leva a revisão do pet, então não
+    # ficam velhos e podem durar bem mais que o resto do cache.
+    CACHE_TTL_CARDS = int(os.getenv('CACHE_TTL_CARDS', '3600'))
+
+    # --- Busca textual (/api/pets/search) ---
+    # Quantos resultados mais recentes entram no ranking e até que página se pode navegar.
+    BUSCA_MAX_CANDIDATOS = int(os.getenv('BUSCA_MAX_CANDIDATOS', '2000'))
+    BUSCA_MAX_PAGINAS = int(os.getenv('BUSCA_MAX_PAGINAS', '50'))
+
+    # --- Busca por proximidade (/api/pets?near=lat,lon&radius=km) ---
+    RAIO_PADRAO_KM = float(os.getenv('RAIO_PADRAO_KM', '5'))
+    RAIO_MAX_KM = float(os.getenv('RAIO_MAX_KM', '100'))
+
+    # --- Uploads e variantes das fotos ---
+    UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'static/uploads')
+    # Tamanho máximo de uma foto; requisições maiores são recusadas antes de lidas
+    UPLOAD_MAX_BYTES = int(os.getenv('UPLOAD_MAX_BYTES', str(8 * 1024 * 1024)))
+
+    # --- Correspondência entre perdidos e achados (matching.py) ---
+    # Diferença máxima de datas (dias) entre um perdido e um achado candidatos
+    MATCH_JANELA_DIAS = int(os.getenv('MATCH_JANELA_DIAS', '60'))
+    MATCH_MAX_CANDIDATOS = int(os.getenv('MATCH_MAX_CANDIDATOS', '2000'))
+    # Candidatos a até N km (células de geohash) vêm primeiro; a 10 km a nota de local já é ~0
+    MATCH_RAIO_KM = float(os.getenv('MATCH_RAIO_KM', '10'))
+    MATCH_MIN_PONTUACAO = float(os.getenv('MATCH_MIN_PONTUACAO', '0.45'))
+    MATCH_MAX_POR_PET = int(os.getenv('MATCH_MAX_POR_PET', '20'))
+
+    # --- Fotos parecidas (phash.py) ---
+    # Distância máxima (em bits, de 64) para considerar duas fotos parecidas
+    PHASH_DISTANCIA_MAX = int(os.getenv('PHASH_DISTANCIA_MAX', '10'))
+    # A cada quantos segundos cada processo recarrega (em segundo plano) o índice de hashes do banco
+    PHASH_RECARGA_SEGUNDOS = int(os.getenv('PHASH_RECARGA_SEGUNDOS', '300'))
+
+    # --- Moderação (/admin) ---
+    MODERACAO_POR_PAGINA = int(os.getenv('MODERACAO_POR_PAGINA', '50'))
+    # Denunciantes distintos que escondem um anúncio automaticamente, até um administrador revisar
+    DENUNCIA_LIMITE_OCULTAR = int(os.getenv('DENUNCIA_LIMITE_OCULTAR', '5'))
+
+    # --- Métricas (/metrics) e profiling ---
+    METRICAS_ATIVAS = os.getenv('METRICAS_ATIVAS', 'true').lower() == 'true'
+    # Se definido, /metrics exige o cabeçalho "Authorization: Bearer <token>"
+    METRICAS_TOKEN = os.getenv('METRICAS_TOKEN', '')
+    # Consultas mais lentas que isso (ms) são logadas
+    SQL_LENTA_MS = float(os.getenv('SQL_LENTA_MS', '500'))
+    # Requisições com o cabeçalho "X-Profile: <token>" são amostradas pelo profiler (vazio desliga)
+    PROFILER_TOKEN = os.getenv('PROFILER_TOKEN', '')
+
+    # --- Atualizações ao vivo do feed (/api/pets/eventos) ---
+    EVENTOS_ATIVOS = os.getenv('EVENTOS_ATIVOS', 'true').lower() == 'true'
+    # Conexões SSE abertas ao mesmo tempo, por processo
+    EVENTOS_MAX_INSCRITOS = int(os.getenv('EVENTOS_MAX_INSCRITOS', '1000'))
+    # Comentário enviado a cada N segundos sem eventos, para proxies não derrubarem a conexão
+    EVENTOS_PING_SEGUNDOS = int(os.getenv('EVENTOS_PING_SEGUNDOS', '15'))
+    # Depois disso a conexão é encerrada e o navegador reconecta (redistribui entre os workers)
+    EVENTOS_DURACAO_MAX = int(os.getenv('EVENTOS_DURACAO_MAX', '600'))
+
+    # --- Alertas de anúncios compatíveis (alertas.py) ---
+    ALERTAS_POR_USUARIO = int(os.getenv('ALERTAS_POR_USUARIO', '20'))
+    ALERTA_RAIO_MAX_KM = float(os.getenv('ALERTA_RAIO_MAX_KM', '50'))
+    # Máximo de células de geohash por alerta no índice invertido
+    ALERTA_MAX_CELULAS = int(os.getenv('ALERTA_MAX_CELULAS', '16'))
+    # Similaridade mínima (0 a 1) entre a raça do alerta e a do anúncio
+    ALERTA_MIN_RACA = float(os.getenv('ALERTA_MIN_RACA', '0.6'))
+    # Depois disso o aviso fica na outbox com o último erro, sem novas tentativas
+    ALERTA_MAX_TENTATIVAS = int(os.getenv('ALERTA_MAX_TENTATIVAS', '5'))
+    # Por quanto tempo um worker reserva um aviso da outbox para enviá-lo (renovada a cada envio)
+    ALERTA_RESERVA_SEGUNDOS = int(os.getenv('ALERTA_RESERVA_SEGUNDOS', '300'))
+    # Endereço público do site, usado nos links dos e-mails
+    URL_SITE = os.getenv('URL_SITE', 'http://localhost:5000')
+    # Sem SMTP_HOST os avisos só aparecem no log (e na página de alertas)
+    SMTP_HOST = os.getenv('SMTP_HOST', '')
+    SMTP_PORTA = int(os.getenv('SMTP_PORTA', '587'))
+    SMTP_USUARIO = os.getenv('SMTP_USUARIO', '')
+    SMTP_SENHA = os.getenv('SMTP_SENHA', '')
+    SMTP_REMETENTE = os.getenv('SMTP_REMETENTE', 'Radar Pet <nao-responda@radarpet.com.br>')
+
+    # --- Fila de tarefas em segundo plano (fila.py) ---
+    # Tarefas executadas ao mesmo tempo por processo do worker
+    FILA_CONCORRENCIA = int(os.getenv('FILA_CONCORRENCIA', '4'))
+    # Sem avisos do banco, a fila é consultada a cada N segundos (tarefas com atraso, reconexão)
+    FILA_INTERVALO = float(os.getenv('FILA_INTERVALO', '5'))
+    FILA_MAX_TENTATIVAS = int(os.getenv('FILA_MAX_TENTATIVAS', '5'))
+    # Espera antes da 2ª tentativa; dobra a cada falha até FILA_ESPERA_MAX (segundos)
+    FILA_ESPERA_BASE = float(os.getenv('FILA_ESPERA_BASE', '10'))
+    FILA_ESPERA_MAX = float(os.getenv('FILA_ESPERA_MAX', '3600'))
+    # Prazo de uma execução: depois disso a tarefa é considerada perdida e volta para a fila
+    FILA_TEMPO_LIMITE = int(os.getenv('FILA_TEMPO_LIMITE', '600'))
+
+    # --- Ciclo de vida e arquivamento dos anúncios (arquivo.py) ---
+    # Anúncio ativo há mais de N dias (sem ser renovado) vira 'expirado' e sai do feed
+    PET_EXPIRA_DIAS = int(os.getenv('PET_EXPIRA_DIAS', '90'))
+    # Resolvidos/expirados há mais de N dias vão da tabela pet para pet_arquivo
+    ARQUIVO_APOS_DIAS = int(os.getenv('ARQUIVO_APOS_DIAS', '30'))
+    # De quanto em quanto tempo o worker roda a manutenção (segundos) e quantas linhas por transação
+    ARQUIVO_INTERVALO = int(os.getenv('ARQUIVO_INTERVALO', '3600'))
+    ARQUIVO_LOTE = int(os.getenv('ARQUIVO_LOTE', '500'))
+
+    # --- Arquivos estáticos versionados (assets.py) ---
+    # Gera/usa as cópias com hash no nome em static/dist/ (desligue no desenvolvimento de CSS/JS)
+    ASSETS_ATIVOS = os.getenv('ASSETS_ATIVOS', 'true').lower() in ('1', 'true', 'sim')
+    # Imagens de static/ a partir deste tamanho ganham versões WebP responsivas
+    ASSETS_WEBP_MIN_BYTES = int(os.getenv('ASSETS_WEBP_MIN_BYTES', '100000'))
+    # Cache-Control das cópias versionadas (o nome muda junto com o conteúdo)
+    ASSETS_MAX_AGE = int(os.getenv('ASSETS_MAX_AGE', str(365 * 24 * 3600)))
+
+    # --- Visualizações e ordenação por popularidade (visualizacoes.py) ---
+    VISUALIZACOES_ATIVAS = os.getenv('VISUALIZACOES_ATIVAS', 'true').lower() in ('1', 'true', 'sim')
+    # Cada processo grava as visualizações acumuladas a cada N segundos, numa única consulta
+    VISUALIZACOES_INTERVALO = float(os.getenv('VISUALIZACOES_INTERVALO', '5'))
+    # Em quanto tempo uma visualização passa a valer metade no placar de tendência
+    VISUALIZACOES_MEIA_VIDA_HORAS = float(os.getenv('VISUALIZACOES_MEIA_VIDA_HORAS', '24'))
+
+    # --- Limpeza dos uploads sem anúncio (limpeza_uploads.py) ---
+    # Fotos sem anúncio só são recolhidas depois de N horas sem alteração (o anúncio pode estar sendo gravado)
+    UPLOAD_CARENCIA_HORAS = float(os.getenv('UPLOAD_CARENCIA_HORAS', '24'))
+    # As recolhidas ficam N dias nesta pasta (fora de static/) antes de serem apagadas; 0 apaga na hora
+    UPLOAD_QUARENTENA = os.getenv('UPLOAD_QUARENTENA', 'quarentena/uploads')
+    UPLOAD_QUARENTENA_DIAS = float(os.getenv('UPLOAD_QUARENTENA_DIAS', '7'))
+    # De quanto em quanto tempo o worker roda a limpeza (segundos) e quantos arquivos por consulta
+    UPLOAD_LIMPEZA_INTERVALO = int(os.getenv('UPLOAD_LIMPEZA_INTERVALO', str(24 * 3600)))
+    UPLOAD_LIMPEZA_LOTE = int(os.getenv('UPLOAD_LIMPEZA_LOTE', '1000'))
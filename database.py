@@ -1,8 +1,23 @@
+import hashlib
+import itertools
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
 import psycopg2
+import psycopg2.extensions
+import metricas
 from config import Config
 
 def get_db_connection():
-    """Estabelece conexão com o banco de dados PostgreSQL."""
+    """Estabelece uma conexão avulsa (fora do pool) com o PostgreSQL.
+
+    Usada por scripts e pela inicialização do banco. As rotas e os models
+    devem usar db_connection(), que reaproveita conexões do pool.
+    """
     try:
         conn = psycopg2.connect(Config.DB_CONNECTION_STRING)
         return conn
@@ -13,84 +28,537 @@ def get_db_connection():
         print(f"❌ Erro inesperado: {e}")
         return None
 
-def init_db():
-    """Inicializa o banco de dados e cria/atualiza as tabelas necessárias."""
-    print("🚀 Inicializando banco de dados PostgreSQL...")
-    conn = get_db_connection()
-    if not conn:
-        print("❌ Abortando: Não foi possível conectar ao banco de dados.")
-        return False
-        
-    try:
+# ==========================================
+# POOL DE CONEXÕES
+# ==========================================
+
+class PoolEsgotadoError(Exception):
+    """Nenhuma conexão ficou livre dentro do tempo limite do pool."""
+
+
+class ConexaoPool(psycopg2.extensions.connection):
+    """Conexão do pool: lembra os prepared statements já criados nela."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.preparadas = set()
+
+
+class ConnectionPool:
+    """Pool de conexões thread-safe com limite mínimo/máximo.
+
+    Ao emprestar uma conexão, o pool descarta as que estão fechadas, ociosas
+    há tempo demais ou que já atingiram o número máximo de usos, e faz um
+    'SELECT 1' nas que ficaram paradas além do intervalo de health check.
+    """
+
+    def __init__(self, dsn, minconn, maxconn, timeout=10, max_usos=0,
+                 idle_timeout=0, health_check=0):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_usos = max_usos
+        self.idle_timeout = idle_timeout
+        self.health_check = health_check
+
+        self._lock = threading.Condition()
+        self._ociosas = deque()   # (conn, devolvida_em)
+        self._usos = {}           # id(conn) -> número de empréstimos
+        self._em_uso = 0
+        self._abertas = 0
+        self._aguardando = 0
+        self._criadas = 0
+        self._descartadas = 0
+        self._fechado = False
+
+        for _ in range(minconn):
+            conn = self._criar()
+            self._ociosas.append((conn, time.monotonic()))
+
+    def _criar(self):
+        conn = psycopg2.connect(self.dsn, connection_factory=ConexaoPool)
+        with self._lock:
+            self._usos[id(conn)] = 0
+            self._abertas += 1
+            self._criadas += 1
+        return conn
+
+    def _descartar(self, conn):
+        """Fecha a conexão e libera a vaga dela no pool (chamar sem o lock)."""
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._usos.pop(id(conn), None)
+            self._abertas -= 1
+            self._descartadas += 1
+            self._lock.notify()
+
+    def _saudavel(self, conn, ociosa_desde):
+        if conn.closed:
+            return False
+        agora = time.monotonic()
+        if self.idle_timeout and agora - ociosa_desde > self.idle_timeout:
+            return False
+        if self.max_usos and self._usos.get(id(conn), 0) >= self.max_usos:
+            return False
+        if self.health_check is not None and agora - ociosa_desde >= self.health_check:
+            try:
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1")
+                cursor.close()
+                conn.rollback()
+            except Exception:
+                return False
+        return True
+
+    def getconn(self):
+        """Empresta uma conexão, esperando até `timeout` segundos por uma vaga."""
+        limite = time.monotonic() + self.timeout
+        while True:
+            candidata = None
+            criar = False
+            with self._lock:
+                if self._fechado:
+                    raise PoolEsgotadoError("O pool de conexões foi fechado.")
+                while not self._ociosas and self._abertas >= self.maxconn:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        raise PoolEsgotadoError(
+                            f"Nenhuma conexão livre após {self.timeout}s "
+                            f"({self._em_uso} em uso, máximo {self.maxconn})."
+                        )
+                    self._aguardando += 1
+                    try:
+                        self._lock.wait(restante)
+                    finally:
+                        self._aguardando -= 1
+                if self._ociosas:
+                    # LIFO: a conexão usada mais recentemente tende a estar "quente".
+                    candidata = self._ociosas.pop()
+                else:
+                    # Reserva a vaga antes de conectar, fora do lock.
+                    self._abertas += 1
+                    criar = True
+                self._em_uso += 1
+
+            if criar:
+                try:
+                    conn = psycopg2.connect(self.dsn, connection_factory=ConexaoPool)
+                except Exception:
+                    with self._lock:
+                        self._abertas -= 1
+                        self._em_uso -= 1
+                        self._lock.notify()
+                    raise
+                with self._lock:
+                    self._usos[id(conn)] = 1
+                    self._criadas += 1
+                return conn
+
+            conn, ociosa_desde = candidata
+            if self._saudavel(conn, ociosa_desde):
+                with self._lock:
+                    self._usos[id(conn)] = self._usos.get(id(conn), 0) + 1
+                return conn
+
+            with self._lock:
+                self._em_uso -= 1
+            self._descartar(conn)
+
+    def putconn(self, conn, descartar=False):
+        """Devolve a conexão ao pool, desfazendo qualquer transação pendente."""
+        with self._lock:
+            self._em_uso -= 1
+
+        if not descartar and not conn.closed:
+            try:
+                status = conn.info.transaction_status
+                if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                descartar = True
+
+        if descartar or conn.closed or self._fechado:
+            self._descartar(conn)
+            return
+
+        with self._lock:
+            self._ociosas.append((conn, time.monotonic()))
+            self._lock.notify()
+        self._podar_ociosas()
+
+    def _podar_ociosas(self):
+        """Fecha as conexões paradas há mais de idle_timeout, preservando o mínimo."""
+        if not self.idle_timeout:
+            return
+        expiradas = []
+        agora = time.monotonic()
+        with self._lock:
+            # As mais antigas ficam à esquerda da fila.
+            while (self._ociosas and self._abertas - len(expiradas) > self.minconn
+                   and agora - self._ociosas[0][1] > self.idle_timeout):
+                expiradas.append(self._ociosas.popleft()[0])
+        for conn in expiradas:
+            self._descartar(conn)
+
+    def stats(self):
+        """Retorna um retrato do pool, útil para dimensionar min/max."""
+        with self._lock:
+            return {
+                'em_uso': self._em_uso,
+                'ociosas': len(self._ociosas),
+                'abertas': self._abertas,
+                'aguardando': self._aguardando,
+                'criadas': self._criadas,
+                'descartadas': self._descartadas,
+                'min': self.minconn,
+                'max': self.maxconn,
+            }
+
+    def closeall(self):
+        with self._lock:
+            self._fechado = True
+            ociosas = [conn for conn, _ in self._ociosas]
+            self._ociosas.clear()
+            self._lock.notify_all()
+        for conn in ociosas:
+            self._descartar(conn)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Cria o pool na primeira chamada (por processo) e o reaproveita depois."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    Config.DB_CONNECTION_STRING,
+                    minconn=Config.DB_POOL_MIN,
+                    maxconn=Config.DB_POOL_MAX,
+                    timeout=Config.DB_POOL_TIMEOUT,
+                    max_usos=Config.DB_POOL_MAX_USOS,
+                    idle_timeout=Config.DB_POOL_IDLE_TIMEOUT,
+                    health_check=Config.DB_POOL_HEALTH_CHECK,
+                )
+    return _pool
+
+def get_pool_stats():
+    """Estatísticas do pool (em uso, aguardando, criadas...) ou None se ainda não existe."""
+    if _pool is None:
+        return None
+    stats = _pool.stats()
+    if _replicas is not None:
+        stats['replicas'] = _replicas.stats()
+    return stats
+
+# ==========================================
+# RÉPLICAS DE LEITURA
+# ==========================================
+
+# Com DATABASE_REPLICA_URLS configurado, as leituras marcadas com
+# db_connection(leitura=True) vão para as réplicas, em rodízio. Uma réplica que
+# recusa conexão, quebra no meio de uma consulta ou fica mais atrasada que
+# DB_REPLICA_ATRASO_MAX sai do rodízio por DB_REPLICA_EJECAO segundos; depois
+# disso volta a ser tentada. Sem nenhuma réplica disponível, a leitura vai para
+# o primário. Escritas e o restante das consultas continuam no primário.
+
+# Atraso de replicação em segundos. Réplica sem nada pendente para aplicar
+# conta como em dia, mesmo que o primário esteja parado há tempo (e um servidor
+# que não é réplica, como um segundo Postgres de testes, também).
+_SQL_ATRASO = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+class Replicas:
+    """Pools das réplicas de leitura, escolhidas em rodízio entre as disponíveis."""
+
+    def __init__(self, dsns):
+        # minconn=0: uma réplica fora do ar não impede o processo de subir
+        self.pools = [
+            ConnectionPool(
+                dsn,
+                minconn=0,
+                maxconn=Config.DB_REPLICA_POOL_MAX,
+                timeout=Config.DB_POOL_TIMEOUT,
+                max_usos=Config.DB_POOL_MAX_USOS,
+                idle_timeout=Config.DB_POOL_IDLE_TIMEOUT,
+                health_check=Config.DB_POOL_HEALTH_CHECK,
+            )
+            for dsn in dsns
+        ]
+        self._vez = itertools.count()
+        self._fora_ate = [0.0] * len(self.pools)
+        self._verificada_em = [0.0] * len(self.pools)
+
+    def ejetar(self, indice, motivo, causa='erro'):
+        """Tira a réplica do rodízio por DB_REPLICA_EJECAO segundos."""
+        self._fora_ate[indice] = time.monotonic() + Config.DB_REPLICA_EJECAO
+        self._verificada_em[indice] = 0.0
+        print(f"⚠️ Réplica {indice} fora do rodízio por {Config.DB_REPLICA_EJECAO:g}s: {motivo}")
+        metricas.replicas_ejetadas.incrementar(str(indice), causa)
+
+    def _em_dia(self, indice, conn):
+        """Confere o atraso da réplica, no máximo uma vez a cada DB_REPLICA_VERIFICACAO segundos."""
+        agora = time.monotonic()
+        if agora - self._verificada_em[indice] < Config.DB_REPLICA_VERIFICACAO:
+            return True
         cursor = conn.cursor()
-        
-        print("📝 Verificando e criando tabela 'usuario'...")
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS usuario (
-                id_usuario      INTEGER PRIMARY KEY GENERATED ALWAYS AS IDENTITY,
-                nome            VARCHAR(255) NOT NULL,
-                sobrenome       VARCHAR(255) NOT NULL,
-                e_mail          VARCHAR(100) NOT NULL UNIQUE,
-                telefone        VARCHAR(20) NOT NULL,
-                is_admin        BOOLEAN DEFAULT FALSE
-            );
-        """)
-
-        # Adiciona a coluna is_admin se ela não existir (para bancos de dados antigos)
-        cursor.execute("""
-            DO $$
-            BEGIN
-                IF NOT EXISTS (SELECT 1 FROM information_schema.columns 
-                               WHERE table_name='usuario' AND column_name='is_admin') THEN
-                    ALTER TABLE usuario ADD COLUMN is_admin BOOLEAN DEFAULT FALSE;
-                END IF;
-            END$$;
-        """)
-        
-        print("📝 Verificando e criando tabela 'pet'...")
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS pet (
-                id_pet              INTEGER PRIMARY KEY GENERATED ALWAYS AS IDENTITY,
-                nome                VARCHAR(100) NOT NULL,
-                especie             VARCHAR(30) NOT NULL CHECK (especie IN ('Cachorro', 'Gato', 'Outros')),
-                raca                VARCHAR(100) NULL,
-                situacao            VARCHAR(15) NOT NULL CHECK (situacao IN ('Achado', 'Perdido')),
-                foto                VARCHAR(255) NULL,
-                data                DATE NOT NULL,
-                sexo                VARCHAR(15) NOT NULL CHECK (sexo IN ('Macho', 'Fêmea')),
-                descricao           TEXT NOT NULL,
-                mensagem_dono       TEXT NULL,
-                nome_tutor          VARCHAR(255) NOT NULL,
-                telefone_tutor      VARCHAR(20) NOT NULL,
-                visto_em            VARCHAR(255) NOT NULL,
-                id_usuario          INTEGER NOT NULL,
-                FOREIGN KEY (id_usuario) REFERENCES usuario (id_usuario) ON DELETE CASCADE
-            );
-        """)
-        
-        print("📝 Verificando e criando tabela 'denuncia'...")
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS denuncia (
-                id_denuncia     INTEGER PRIMARY KEY GENERATED ALWAYS AS IDENTITY,
-                id_pet          INTEGER NOT NULL REFERENCES pet(id_pet) ON DELETE CASCADE,
-                id_usuario      INTEGER NOT NULL REFERENCES usuario(id_usuario) ON DELETE CASCADE,
-                motivo          TEXT NOT NULL,
-                data_denuncia   TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-        
-        conn.commit()
+        cursor.execute(_SQL_ATRASO)
+        atraso = float(cursor.fetchone()[0])
         cursor.close()
-        conn.close()
-        print("✅ Banco de dados inicializado com sucesso!")
+        conn.rollback()
+        if atraso > Config.DB_REPLICA_ATRASO_MAX:
+            self.ejetar(indice, f"atraso de replicação de {atraso:.1f}s", causa='atraso')
+            return False
+        self._verificada_em[indice] = agora
         return True
-        
-    except Exception as e:
-        print(f"❌ Erro ao inicializar tabelas: {e}")
-        if conn:
+
+    def emprestar(self):
+        """Retorna (indice, conexão) de uma réplica disponível, ou None se não houver."""
+        for _ in range(len(self.pools)):
+            indice = next(self._vez) % len(self.pools)
+            if self._fora_ate[indice] > time.monotonic():
+                continue
+            pool = self.pools[indice]
+            try:
+                conn = _emprestar(pool)
+            except PoolEsgotadoError:
+                # Réplica cheia não é réplica com defeito: só passa a vez
+                continue
+            except Exception as e:
+                self.ejetar(indice, e)
+                continue
+            try:
+                if self._em_dia(indice, conn):
+                    return indice, conn
+            except Exception as e:
+                self.ejetar(indice, e)
+            pool.putconn(conn, descartar=bool(conn.closed))
+        return None
+
+    def stats(self):
+        agora = time.monotonic()
+        return [
+            dict(pool.stats(), disponivel=self._fora_ate[indice] <= agora)
+            for indice, pool in enumerate(self.pools)
+        ]
+
+    def closeall(self):
+        for pool in self.pools:
+            pool.closeall()
+
+
+_replicas = None
+
+def get_replicas():
+    """As réplicas configuradas em DB_REPLICAS (criadas na primeira chamada), ou None."""
+    global _replicas
+    if not Config.DB_REPLICAS:
+        return None
+    if _replicas is None:
+        with _pool_lock:
+            if _replicas is None:
+                _replicas = Replicas(Config.DB_REPLICAS)
+    return _replicas
+
+# ==========================================
+# CONEXÃO POR REQUISIÇÃO
+# ==========================================
+
+# Uma requisição costuma chamar vários métodos dos models, e cada um abre um
+# `with db_connection()`. Dentro de um escopo (aberto pelo app em before_request),
+# todos eles usam a mesma conexão, emprestada do pool no primeiro uso e
+# devolvida uma vez só, no teardown da requisição.
+#
+# As leituras têm uma vaga à parte (conn_leitura), numa réplica. Um escopo
+# aberto com usar_replica=False, ou que já usou o primário, lê só do primário:
+# assim a requisição sempre enxerga o que ela mesma (ou o usuário, pouco antes)
+# acabou de gravar.
+
+class EscopoConexao:
+    def __init__(self, usar_replica=True):
+        self.conn = None
+        self.conn_leitura = None
+        self.replica = None
+        self.usar_replica = usar_replica
+        self.token = None
+
+_escopo_atual = ContextVar('escopo_conexao', default=None)
+
+def abrir_escopo(usar_replica=True):
+    """Inicia um escopo de conexão no contexto atual e o retorna (para fechar_escopo)."""
+    escopo = EscopoConexao(usar_replica)
+    escopo.token = _escopo_atual.set(escopo)
+    return escopo
+
+def fechar_escopo(escopo, erro=None):
+    """Encerra o escopo: confirma a transação pendente (ou desfaz, se houve erro) e devolve a conexão."""
+    try:
+        _escopo_atual.reset(escopo.token)
+    except ValueError:
+        # Fechado num contexto diferente do que abriu: só desliga o escopo aqui
+        _escopo_atual.set(None)
+    conn_leitura = escopo.conn_leitura
+    escopo.conn_leitura = None
+    if conn_leitura is not None:
+        # Só leitura: putconn desfaz a transação aberta
+        get_replicas().pools[escopo.replica].putconn(conn_leitura, descartar=bool(conn_leitura.closed))
+    conn = escopo.conn
+    escopo.conn = None
+    if conn is None:
+        return
+    descartar = bool(conn.closed)
+    if not descartar:
+        try:
+            if erro is None:
+                conn.commit()
+            else:
+                conn.rollback()
+        except Exception as e:
+            print(f"❌ Erro ao encerrar a transação da requisição: {e}")
+            descartar = True
+    get_pool().putconn(conn, descartar=descartar)
+
+def _emprestar(pool):
+    inicio = time.perf_counter()
+    conn = pool.getconn()
+    metricas.espera_pool.observar(time.perf_counter() - inicio)
+    return conn
+
+def _conexao_leitura(escopo):
+    """(replicas, indice, conexão, devolver_no_fim) para uma leitura na réplica, ou None."""
+    if escopo is not None:
+        if not escopo.usar_replica or escopo.conn is not None:
+            return None
+        if escopo.conn_leitura is not None:
+            return get_replicas(), escopo.replica, escopo.conn_leitura, False
+    replicas = get_replicas()
+    if replicas is None:
+        return None
+    emprestada = replicas.emprestar()
+    if emprestada is None:
+        return None
+    indice, conn = emprestada
+    if escopo is None:
+        return replicas, indice, conn, True
+    escopo.replica, escopo.conn_leitura = indice, conn
+    return replicas, indice, conn, False
+
+@contextmanager
+def db_connection(leitura=False):
+    """Empresta uma conexão do pool e a devolve ao final do bloco `with`.
+
+    Se o bloco lançar uma exceção, a transação é desfeita; conexões que
+    quebraram no meio do caminho são descartadas em vez de voltarem ao pool.
+    Dentro de um escopo de requisição, devolve sempre a conexão do escopo.
+
+    leitura=True: o bloco só lê, e pode ser atendido por uma réplica (ver Replicas).
+    """
+    escopo = _escopo_atual.get()
+    if leitura:
+        replica = _conexao_leitura(escopo)
+        metricas.leituras.incrementar('replica' if replica else 'primario')
+        if replica is not None:
+            replicas, indice, conn, devolver = replica
+            try:
+                yield conn
+            except BaseException:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+                if conn.closed:
+                    # A réplica caiu no meio da consulta: sai do rodízio e a conexão é descartada
+                    replicas.ejetar(indice, "conexão perdida durante a consulta")
+                    if not devolver:
+                        escopo.conn_leitura = None
+                    replicas.pools[indice].putconn(conn, descartar=True)
+                elif devolver:
+                    replicas.pools[indice].putconn(conn)
+                raise
+            else:
+                if devolver:
+                    replicas.pools[indice].putconn(conn)
+            return
+
+    pool = get_pool()
+    if escopo is not None:
+        if escopo.conn is None:
+            escopo.conn = _emprestar(pool)
+        conn = escopo.conn
+        try:
+            yield conn
+        except BaseException:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            if conn.closed:
+                # Conexão perdida: a próxima consulta da requisição pega outra
+                escopo.conn = None
+                pool.putconn(conn, descartar=True)
+            raise
+        return
+
+    conn = _emprestar(pool)
+    try:
+        yield conn
+    except BaseException:
+        # BaseException: inclui o GeneratorExit de uma resposta em streaming interrompida no meio
+        try:
             conn.rollback()
-            conn.close()
-        return False
+        except Exception:
+            pass
+        pool.putconn(conn, descartar=bool(conn.closed))
+        raise
+    else:
+        pool.putconn(conn)
+
+# ==========================================
+# PREPARED STATEMENTS
+# ==========================================
+
+_PARAMETRO = re.compile(r'%s')
+
+def executar_preparado(cursor, sql, params=()):
+    """Executa `sql` (com parâmetros %s) como prepared statement da conexão do cursor.
+
+    Na primeira vez em cada conexão faz o PREPARE; depois só o EXECUTE, e o
+    banco pula o parse e o planejamento. Conexões fora do pool, consultas além
+    de DB_PREPARADAS_MAX ou DB_PREPARED_STATEMENTS desligado caem num execute comum.
+    """
+    preparadas = getattr(cursor.connection, 'preparadas', None)
+    if not Config.DB_PREPARED_STATEMENTS or preparadas is None:
+        cursor.execute(sql, params)
+        return
+    nome = 'rp_' + hashlib.sha1(sql.encode()).hexdigest()[:16]
+    if nome not in preparadas:
+        if len(preparadas) >= Config.DB_PREPARADAS_MAX:
+            cursor.execute(sql, params)
+            return
+        numero = iter(range(1, len(params) + 1))
+        corpo = _PARAMETRO.sub(lambda _: f"${next(numero)}", sql).replace('%%', '%')
+        cursor.execute(f"PREPARE {nome} AS {corpo}")
+        # PREPARE não é transacional: o statement continua existindo mesmo após um rollback
+        preparadas.add(nome)
+    if params:
+        cursor.execute(f"EXECUTE {nome} ({', '.join(['%s'] * len(params))})", params)
+    else:
+        cursor.execute(f"EXECUTE {nome}")
+
+def init_db():
+    """Cria/atualiza as tabelas aplicando as migrações pendentes (ver migrate.py)."""
+    from migrate import migrar
+    return migrar()
 
 if __name__ == "__main__":
     init_db()
\ No newline at end of file
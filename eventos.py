@@ -0,0 +1,132 @@
+import json
+import queue
+import select
+import threading
+import time
+
+from cache import cache, RedisCache
+from config import Config
+from database import get_db_connection
+
+# ==========================================
+# EVENTOS DO FEED (LISTEN/NOTIFY)
+# ==========================================
+
+# Pet.salvar e Pet.deletar_por_id avisam o banco com pg_notify dentro da própria
+# transação: o aviso só sai no commit e some se houver rollback. Em cada processo
+# do app, uma única thread faz LISTEN numa conexão própria e repassa os avisos
+# para as conexões SSE abertas (/api/pets/eventos). Quem está só olhando o
+# feed segura um socket e uma fila na memória, nunca uma conexão do banco.
+
+CANAL = 'pets_feed'
+
+def notificar(cursor, tipo, pet_id, **dados):
+    """Agenda o aviso `tipo` ('novo' ou 'removido') para quando a transação do cursor confirmar."""
+    evento = dict(dados, tipo=tipo, id=pet_id)
+    cursor.execute("SELECT pg_notify(%s, %s)", (CANAL, json.dumps(evento, default=str)))
+
+
+class Inscricao:
+    """Fila de eventos de uma conexão SSE."""
+
+    def __init__(self, tamanho):
+        self.fila = queue.Queue(maxsize=tamanho)
+        self.ativa = True
+
+    def proximo(self, timeout):
+        """Próximo evento, ou None se nada chegou em `timeout` segundos."""
+        try:
+            return self.fila.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class Ouvinte:
+    """Thread única por processo que escuta o canal e distribui os eventos."""
+
+    def __init__(self, canal=CANAL, max_inscritos=1000, tamanho_fila=100):
+        self.canal = canal
+        self.max_inscritos = max_inscritos
+        self.tamanho_fila = tamanho_fila
+        self._inscricoes = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def iniciar(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._rodar, name='ouvinte-eventos', daemon=True)
+                self._thread.start()
+        return self
+
+    def inscrever(self):
+        """Nova fila de eventos, ou None se o processo já está no limite de inscritos."""
+        with self._lock:
+            if len(self._inscricoes) >= self.max_inscritos:
+                return None
+            inscricao = Inscricao(self.tamanho_fila)
+            self._inscricoes.add(inscricao)
+            return inscricao
+
+    def cancelar(self, inscricao):
+        inscricao.ativa = False
+        with self._lock:
+            self._inscricoes.discard(inscricao)
+
+    def stats(self):
+        with self._lock:
+            return {'inscritos': len(self._inscricoes), 'max_inscritos': self.max_inscritos}
+
+    def _publicar(self, evento):
+        with self._lock:
+            inscricoes = list(self._inscricoes)
+        for inscricao in inscricoes:
+            try:
+                inscricao.fila.put_nowait(evento)
+            except queue.Full:
+                # Cliente que não consome (rede lenta, aba congelada): a conexão é
+                # encerrada e o EventSource do navegador reconecta sozinho.
+                self.cancelar(inscricao)
+
+    def _tratar(self, payload):
+        try:
+            evento = json.loads(payload)
+        except ValueError:
+            print(f"⚠️ Evento inválido no canal {self.canal}: {payload[:200]}")
+            return
+        # Com o cache em memória, cada processo tem o seu: a escrita feita em
+        # outro worker só chega aqui por este aviso.
+        if not isinstance(cache.backend, RedisCache):
+            cache.delete(f"pets:id:{evento['id']}")
+            cache.invalidar_namespace('pets:lista')
+        self._publicar(evento)
+
+    def _rodar(self):
+        espera = 1
+        while True:
+            conn = get_db_connection()
+            if conn is not None:
+                try:
+                    conn.autocommit = True
+                    cursor = conn.cursor()
+                    cursor.execute(f"LISTEN {self.canal}")
+                    espera = 1
+                    # Avisos enviados enquanto estávamos desconectados se perderam
+                    if not isinstance(cache.backend, RedisCache):
+                        cache.invalidar_namespace('pets:lista')
+                    while True:
+                        if select.select([conn], [], [], 30) == ([], [], []):
+                            # Nada em 30 s: confere se a conexão ainda está de pé
+                            cursor.execute("SELECT 1")
+                        conn.poll()
+                        while conn.notifies:
+                            self._tratar(conn.notifies.pop(0).payload)
+                except Exception as e:
+                    print(f"⚠️ Ouvinte de eventos desconectado: {e}")
+                finally:
+                    conn.close()
+            time.sleep(espera)
+            espera = min(espera * 2, 60)
+
+
+ouvinte = Ouvinte(max_inscritos=Config.EVENTOS_MAX_INSCRITOS)
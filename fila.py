@@ -0,0 +1,360 @@
+import argparse
+import importlib
+import random
+import select
+import signal
+import threading
+import time
+import traceback
+
+from psycopg2.extras import Json, RealDictCursor
+
+import metricas
+from config import Config
+from database import db_connection, get_db_connection
+
+# ==========================================
+# FILA DE TAREFAS (POSTGRES)
+# ==========================================
+
+# O trabalho que não precisa acontecer dentro da requisição (variantes das
+# fotos, correspondências, alertas, limpeza de arquivos) vira uma linha na
+# tabela `tarefa` e é executado pelo worker (`python fila.py`):
+#
+#   @fila.tarefa('matching.processar')
+#   def processar(pet_id): ...
+#
+#   fila.enfileirar('matching.processar', {'pet_id': 42}, cursor=cursor)
+#
+# Com `cursor`, a tarefa entra na transação de quem a criou: só existe se os
+# dados que ela vai processar foram confirmados. Vários workers (e várias
+# threads em cada um) pegam tarefas ao mesmo tempo com FOR UPDATE SKIP LOCKED.
+#
+# Tarefas de manutenção usam @fila.periodica('tipo', intervalo): o worker
+# mantém sempre uma (e só uma) delas na fila, para `intervalo` segundos depois
+# que a anterior terminou.
+
+CANAL = 'fila_tarefas'
+# Módulos que registram tarefas; o worker importa todos ao iniciar
+MODULOS_TAREFAS = ('alertas', 'arquivo', 'imagens', 'limpeza_uploads', 'matching', 'phash', 'storage')
+# De quanto em quanto tempo o worker confere se as tarefas periódicas estão agendadas (segundos)
+VERIFICAR_PERIODICAS = 60
+
+_tarefas = {}
+_periodicas = {}
+
+def tarefa(tipo):
+    """Decorator: registra a função como executora das tarefas `tipo`."""
+    def decorator(funcao):
+        _tarefas[tipo] = funcao
+        return funcao
+    return decorator
+
+def periodica(tipo, intervalo):
+    """Decorator: como `tarefa`, e o worker agenda a função a cada `intervalo` segundos."""
+    def decorator(funcao):
+        _periodicas[tipo] = intervalo
+        return tarefa(tipo)(funcao)
+    return decorator
+
+def enfileirar(tipo, argumentos=None, cursor=None, atraso=0, max_tentativas=None):
+    """Agenda uma tarefa e retorna o id dela.
+
+    `argumentos` precisa ser serializável em JSON. Com `cursor` (um cursor
+    comum, não RealDictCursor) a tarefa é gravada na transação dele; sem, é
+    gravada e confirmada na hora.
+    """
+    sql = """
+        INSERT INTO tarefa (tipo, argumentos, max_tentativas, executar_em)
+        VALUES (%s, %s, %s, CURRENT_TIMESTAMP + %s * INTERVAL '1 second')
+        RETURNING id_tarefa
+    """
+    params = (tipo, Json(argumentos or {}), max_tentativas or Config.FILA_MAX_TENTATIVAS, atraso)
+    if cursor is not None:
+        cursor.execute(sql, params)
+        id_tarefa = cursor.fetchone()[0]
+        # Acorda os workers parados; como o INSERT, o aviso só sai no commit
+        cursor.execute("SELECT pg_notify(%s, %s)", (CANAL, tipo))
+        return id_tarefa
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        id_tarefa = cursor.fetchone()[0]
+        cursor.execute("SELECT pg_notify(%s, %s)", (CANAL, tipo))
+        conn.commit()
+        cursor.close()
+    return id_tarefa
+
+def agendar_periodicas():
+    """Enfileira as tarefas periódicas que não estão na fila. Retorna os tipos agendados.
+
+    O advisory lock por tipo impede que dois workers agendem a mesma tarefa ao mesmo tempo.
+    """
+    agendadas = []
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        for tipo, intervalo in sorted(_periodicas.items()):
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", ('fila:' + tipo,))
+            cursor.execute("""
+                INSERT INTO tarefa (tipo, max_tentativas, executar_em)
+                SELECT %s, %s, CURRENT_TIMESTAMP + %s * INTERVAL '1 second'
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM tarefa WHERE tipo = %s AND estado IN ('pendente', 'executando')
+                )
+            """, (tipo, Config.FILA_MAX_TENTATIVAS, intervalo, tipo))
+            if cursor.rowcount:
+                agendadas.append(tipo)
+            # Libera o lock a cada tipo, em vez de segurá-los todos até o fim
+            conn.commit()
+        cursor.close()
+    return agendadas
+
+def espera_para(tentativas):
+    """Segundos até a próxima tentativa: exponencial com variação aleatória (±50%)."""
+    espera = min(Config.FILA_ESPERA_BASE * 2 ** max(tentativas - 1, 0), Config.FILA_ESPERA_MAX)
+    return espera * (0.5 + random.random())
+
+# ==========================================
+# WORKER
+# ==========================================
+
+class Worker:
+    """Threads que pegam e executam tarefas, mais uma que escuta o canal da fila."""
+
+    def __init__(self, concorrencia=None, intervalo=None):
+        self.concorrencia = concorrencia or Config.FILA_CONCORRENCIA
+        self.intervalo = intervalo or Config.FILA_INTERVALO
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._threads = []
+
+    def _pegar(self):
+        """Marca a próxima tarefa disponível como 'executando' e a retorna (ou None)."""
+        with db_connection() as conn:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            cursor.execute("""
+                UPDATE tarefa
+                SET estado = 'executando', tentativas = tentativas + 1, iniciada_em = CURRENT_TIMESTAMP,
+                    executar_em = CURRENT_TIMESTAMP + %s * INTERVAL '1 second'
+                WHERE id_tarefa = (
+                    SELECT id_tarefa FROM tarefa
+                    WHERE estado IN ('pendente', 'executando') AND executar_em <= CURRENT_TIMESTAMP
+                    ORDER BY executar_em
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id_tarefa, tipo, argumentos, tentativas, max_tentativas
+            """, (Config.FILA_TEMPO_LIMITE,))
+            item = cursor.fetchone()
+            conn.commit()
+            cursor.close()
+        return item
+
+    def _concluir(self, item):
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM tarefa WHERE id_tarefa = %s", (item['id_tarefa'],))
+            conn.commit()
+            cursor.close()
+
+    def _falhar(self, item, erro):
+        """Reagenda com espera crescente ou, sem tentativas restantes, marca como morta."""
+        morta = item['tentativas'] >= item['max_tentativas']
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE tarefa
+                SET estado = %s, erro = %s,
+                    executar_em = CURRENT_TIMESTAMP + %s * INTERVAL '1 second'
+                WHERE id_tarefa = %s
+            """, ('morta' if morta else 'pendente', erro[-4000:],
+                  0 if morta else espera_para(item['tentativas']), item['id_tarefa']))
+            conn.commit()
+            cursor.close()
+        return morta
+
+    def executar(self, item):
+        inicio = time.perf_counter()
+        funcao = _tarefas.get(item['tipo'])
+        if item['tentativas'] > item['max_tentativas']:
+            # Só acontece com uma tarefa cujo worker morreu na última tentativa
+            resultado = 'morta'
+            self._falhar(item, 'Prazo de execução esgotado na última tentativa.')
+        elif funcao is None:
+            resultado = 'morta' if self._falhar(item, f"Tipo de tarefa desconhecido: {item['tipo']}") else 'erro'
+        else:
+            try:
+                funcao(**item['argumentos'])
+            except Exception as e:
+                print(f"❌ Tarefa {item['id_tarefa']} ({item['tipo']}), tentativa {item['tentativas']}: {e}")
+                resultado = 'morta' if self._falhar(item, traceback.format_exc()) else 'erro'
+            else:
+                resultado = 'ok'
+                self._concluir(item)
+        metricas.tarefas.observar(time.perf_counter() - inicio, item['tipo'], resultado)
+        if resultado == 'morta':
+            print(f"💀 Tarefa {item['id_tarefa']} ({item['tipo']}) sem tentativas restantes.")
+
+    def _rodar(self):
+        while not self._parar.is_set():
+            try:
+                item = self._pegar()
+            except Exception as e:
+                print(f"❌ Erro ao buscar tarefas: {e}")
+                self._parar.wait(self.intervalo)
+                continue
+            if item is None:
+                # Fila vazia: dorme até o próximo aviso (ou o intervalo, para as tarefas com atraso)
+                self._acordar.wait(self.intervalo)
+                self._acordar.clear()
+                continue
+            try:
+                self.executar(item)
+            except Exception as e:
+                # Não conseguiu gravar o resultado: a tarefa volta para a fila quando o prazo vencer
+                print(f"❌ Erro ao registrar o resultado da tarefa {item['id_tarefa']}: {e}")
+
+    def _escutar(self):
+        espera = 1
+        while not self._parar.is_set():
+            conn = get_db_connection()
+            if conn is not None:
+                try:
+                    conn.autocommit = True
+                    cursor = conn.cursor()
+                    cursor.execute(f"LISTEN {CANAL}")
+                    espera = 1
+                    while not self._parar.is_set():
+                        if select.select([conn], [], [], self.intervalo) == ([], [], []):
+                            continue
+                        conn.poll()
+                        if conn.notifies:
+                            conn.notifies.clear()
+                            self._acordar.set()
+                except Exception as e:
+                    print(f"⚠️ Escuta da fila desconectada: {e}")
+                finally:
+                    conn.close()
+            # Sem os avisos, as threads continuam consultando a cada `intervalo`
+            self._parar.wait(espera)
+            espera = min(espera * 2, 60)
+
+    def _agendar(self):
+        while not self._parar.is_set():
+            try:
+                agendar_periodicas()
+            except Exception as e:
+                print(f"❌ Erro ao agendar as tarefas periódicas: {e}")
+            self._parar.wait(VERIFICAR_PERIODICAS)
+
+    def iniciar(self):
+        for modulo in MODULOS_TAREFAS:
+            importlib.import_module(modulo)
+        self._threads = [threading.Thread(target=self._escutar, name='fila-escuta', daemon=True)]
+        if _periodicas:
+            self._threads.append(threading.Thread(target=self._agendar, name='fila-agenda', daemon=True))
+        self._threads += [
+            threading.Thread(target=self._rodar, name=f'fila-{i}') for i in range(self.concorrencia)
+        ]
+        for thread in self._threads:
+            thread.start()
+        print(f"⚙️ Worker da fila iniciado: {self.concorrencia} thread(s), tarefas: {', '.join(sorted(_tarefas))}")
+        if _periodicas:
+            print("⏰ Tarefas periódicas: " + ', '.join(
+                f"{tipo} (a cada {intervalo}s)" for tipo, intervalo in sorted(_periodicas.items())))
+        return self
+
+    def pedir_parada(self):
+        """As threads param de pegar tarefas novas (as que estão rodando terminam)."""
+        self._parar.set()
+        self._acordar.set()
+
+    def parado(self, timeout=None):
+        return self._parar.wait(timeout)
+
+    def parar(self):
+        """Termina depois que as tarefas em execução acabarem."""
+        self.pedir_parada()
+        for thread in self._threads:
+            if not thread.daemon:
+                thread.join()
+
+# ==========================================
+# ADMINISTRAÇÃO (LINHA DE COMANDO)
+# ==========================================
+
+def status():
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT tipo, estado, COUNT(*), MIN(criada_em)
+            FROM tarefa GROUP BY tipo, estado ORDER BY tipo, estado
+        """)
+        linhas = cursor.fetchall()
+        cursor.close()
+    if not linhas:
+        print("Fila vazia.")
+    for tipo, estado, total, mais_antiga in linhas:
+        print(f"{tipo:<25} {estado:<11} {total:>7}  (mais antiga: {mais_antiga:%d/%m/%Y %H:%M})")
+
+def listar_mortas(limite=50):
+    with db_connection() as conn:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute("""
+            SELECT id_tarefa, tipo, argumentos, tentativas, erro FROM tarefa
+            WHERE estado = 'morta' ORDER BY id_tarefa DESC LIMIT %s
+        """, (limite,))
+        for item in cursor.fetchall():
+            ultima_linha = (item['erro'] or '').strip().splitlines()[-1:] or ['']
+            print(f"#{item['id_tarefa']} {item['tipo']} {item['argumentos']} "
+                  f"({item['tentativas']} tentativas): {ultima_linha[0]}")
+        cursor.close()
+
+def reprocessar(ids=None):
+    """Devolve tarefas mortas para a fila, com as tentativas zeradas. Sem ids, todas."""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE tarefa SET estado = 'pendente', tentativas = 0, executar_em = CURRENT_TIMESTAMP
+            WHERE estado = 'morta' AND (%s::BIGINT[] IS NULL OR id_tarefa = ANY(%s::BIGINT[]))
+        """, (ids, ids))
+        total = cursor.rowcount
+        cursor.execute("SELECT pg_notify(%s, '')", (CANAL,))
+        conn.commit()
+        cursor.close()
+    print(f"🔁 {total} tarefa(s) devolvida(s) para a fila.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker da fila de tarefas em segundo plano.")
+    parser.add_argument('--concorrencia', type=int, default=None,
+                        help=f"tarefas ao mesmo tempo (padrão: FILA_CONCORRENCIA={Config.FILA_CONCORRENCIA})")
+    parser.add_argument('--status', action='store_true', help="mostra quantas tarefas há por tipo e estado")
+    parser.add_argument('--mortas', action='store_true', help="lista as tarefas que esgotaram as tentativas")
+    parser.add_argument('--reprocessar', nargs='*', type=int, metavar='ID',
+                        help="devolve tarefas mortas para a fila (sem ids: todas)")
+    args = parser.parse_args()
+
+    if args.status:
+        status()
+    elif args.mortas:
+        listar_mortas()
+    elif args.reprocessar is not None:
+        reprocessar(args.reprocessar or None)
+    else:
+        worker = Worker(args.concorrencia).iniciar()
+        # SIGTERM (deploy/restart): para de pegar tarefas e espera as que estão rodando
+        signal.signal(signal.SIGTERM, lambda *_: worker.pedir_parada())
+        try:
+            while not worker.parado(1):
+                pass
+        except KeyboardInterrupt:
+            pass
+        print("⏹️ Encerrando o worker depois das tarefas em execução...")
+        worker.parar()
+
+if __name__ == "__main__":
+    # Rodando como script, este arquivo é o módulo __main__; os módulos de tarefas
+    # fazem `import fila` e registram as tarefas no módulo `fila`, que seria outra
+    # cópia deste. O worker precisa ler o mesmo registro em que elas entraram.
+    import fila
+    fila.main()
@@ -0,0 +1,93 @@
+import math
+
+# ==========================================
+# GEOHASH E DISTÂNCIAS
+# ==========================================
+
+# O geohash é usado como índice espacial de reserva (B-tree por prefixo) quando as
+# extensões cube/earthdistance não estão disponíveis no PostgreSQL.
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+RAIO_TERRA_KM = 6371.0088
+PRECISAO_GEOHASH = 9  # ~4,8 m x 4,8 m, mais do que suficiente para um anúncio
+
+def geohash_encode(latitude, longitude, precisao=PRECISAO_GEOHASH):
+    lat_min, lat_max = -90.0, 90.0
+    lon_min, lon_max = -180.0, 180.0
+    resultado = []
+    bits = 0
+    valor = 0
+    par = True  # os bits alternam entre longitude (pares) e latitude (ímpares)
+    while len(resultado) < precisao:
+        if par:
+            meio = (lon_min + lon_max) / 2
+            if longitude >= meio:
+                valor = (valor << 1) | 1
+                lon_min = meio
+            else:
+                valor <<= 1
+                lon_max = meio
+        else:
+            meio = (lat_min + lat_max) / 2
+            if latitude >= meio:
+                valor = (valor << 1) | 1
+                lat_min = meio
+            else:
+                valor <<= 1
+                lat_max = meio
+        par = not par
+        bits += 1
+        if bits == 5:
+            resultado.append(BASE32[valor])
+            bits = 0
+            valor = 0
+    return ''.join(resultado)
+
+def tamanho_celula(precisao):
+    """Altura e largura (em graus) de uma célula de geohash com essa precisão."""
+    bits = 5 * precisao
+    bits_lon = (bits + 1) // 2
+    bits_lat = bits // 2
+    return 180.0 / (2 ** bits_lat), 360.0 / (2 ** bits_lon)
+
+def caixa_do_raio(latitude, longitude, raio_km):
+    """Caixa (lat_min, lat_max, lon_min, lon_max) que contém o círculo do raio."""
+    dlat = math.degrees(raio_km / RAIO_TERRA_KM)
+    cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+    dlon = min(math.degrees(raio_km / (RAIO_TERRA_KM * cos_lat)), 180.0)
+    return (max(latitude - dlat, -90.0), min(latitude + dlat, 90.0),
+            longitude - dlon, longitude + dlon)
+
+def celulas_cobrindo(latitude, longitude, raio_km, max_celulas=16):
+    """Prefixos de geohash que, juntos, cobrem o círculo do raio.
+
+    Escolhe a maior precisão que cubra a caixa do raio com no máximo
+    `max_celulas` células: cada uma vira uma faixa (prefixo) no índice B-tree.
+    """
+    lat_min, lat_max, lon_min, lon_max = caixa_do_raio(latitude, longitude, raio_km)
+    for precisao in range(PRECISAO_GEOHASH, 0, -1):
+        altura, largura = tamanho_celula(precisao)
+        linhas = math.floor(lat_max / altura) - math.floor(lat_min / altura) + 1
+        colunas = math.floor(lon_max / largura) - math.floor(lon_min / largura) + 1
+        if linhas * colunas <= max_celulas or precisao == 1:
+            break
+
+    celulas = set()
+    lat = math.floor(lat_min / altura) * altura + altura / 2
+    while lat < lat_max + altura / 2:
+        lon = math.floor(lon_min / largura) * largura + largura / 2
+        while lon < lon_max + largura / 2:
+            # Normaliza a longitude para quem cruza o antimeridiano
+            lon_normalizada = ((lon + 180.0) % 360.0) - 180.0
+            celulas.add(geohash_encode(min(lat, 89.999999), lon_normalizada, precisao))
+            lon += largura
+        lat += altura
+    return sorted(celulas)
+
+def distancia_km(lat1, lon1, lat2, lon2):
+    """Distância em linha reta (haversine) entre dois pontos, em km."""
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = (math.sin(dlat / 2) ** 2
+         + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon / 2) ** 2)
+    return 2 * RAIO_TERRA_KM * math.asin(math.sqrt(a))
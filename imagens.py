@@ -0,0 +1,124 @@
+import argparse
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import fila
+from config import Config
+
+# ==========================================
+# VARIANTES DAS FOTOS ENVIADAS
+# ==========================================
+
+# Cada foto ganha versões reduzidas em WebP e JPEG, gravadas ao lado do original:
+#   20250612_195853_images.jpg -> 20250612_195853_images_thumb.webp, ..._medium.jpg, ...
+# O card do feed (200px de altura) usa a 'thumb'; a página do pet, a 'medium'.
+VARIANTES = {
+    'thumb': 400,
+    'medium': 960,
+}
+FORMATOS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+_EH_VARIANTE = re.compile(r'_(%s)\.(%s)$' % ('|'.join(VARIANTES), '|'.join(FORMATOS)))
+
+def eh_variante(nome_arquivo):
+    return _EH_VARIANTE.search(nome_arquivo) is not None
+
+def nome_variante(foto, variante, formato):
+    base = os.path.splitext(foto)[0]
+    return f"{base}_{variante}.{formato}"
+
+def gerar_variantes(caminho_original):
+    """Gera as variantes de uma foto. Retorna a lista de arquivos criados."""
+    from PIL import Image, ImageOps  # Pillow só é necessário para quem processa as imagens
+
+    pasta, foto = os.path.split(caminho_original)
+    criados = []
+    with Image.open(caminho_original) as imagem:
+        # Respeita a orientação das fotos de celular e descarta transparência/paleta
+        imagem = ImageOps.exif_transpose(imagem)
+        if imagem.mode not in ('RGB', 'L'):
+            fundo = Image.new('RGB', imagem.size, (255, 255, 255))
+            imagem = imagem.convert('RGBA')
+            fundo.paste(imagem, mask=imagem.split()[-1])
+            imagem = fundo
+
+        for variante, largura in VARIANTES.items():
+            copia = imagem.copy()
+            # Nunca amplia: fotos menores que a variante mantêm o tamanho original
+            copia.thumbnail((largura, largura * 4), Image.LANCZOS)
+            for formato, (formato_pil, opcoes) in FORMATOS.items():
+                destino = os.path.join(pasta, nome_variante(foto, variante, formato))
+                temporario = destino + '.tmp'
+                copia.save(temporario, formato_pil, **opcoes)
+                # Troca atômica: quem estiver servindo o arquivo nunca vê uma imagem pela metade
+                os.replace(temporario, destino)
+                criados.append(destino)
+    return criados
+
+def variantes_disponiveis(foto, pasta=None, prefixo='/static/uploads/'):
+    """srcset de cada formato ({'webp': ..., 'jpg': ...}), ou None se as variantes ainda não existem."""
+    pasta = pasta or Config.UPLOAD_FOLDER
+    if not foto or not os.path.exists(os.path.join(pasta, nome_variante(foto, 'thumb', 'webp'))):
+        return None
+    return {
+        formato: ', '.join(
+            f"{prefixo}{nome_variante(foto, variante, formato)} {largura}w"
+            for variante, largura in VARIANTES.items()
+        )
+        for formato in FORMATOS
+    }
+
+# ==========================================
+# PROCESSAMENTO EM SEGUNDO PLANO
+# ==========================================
+
+@fila.tarefa('imagens.variantes')
+def _tarefa_variantes(foto):
+    gerar_variantes(os.path.join(Config.UPLOAD_FOLDER, foto))
+
+def agendar_variantes(foto):
+    """Gera as variantes pela fila de tarefas; o anúncio é publicado sem esperar por elas."""
+    fila.enfileirar('imagens.variantes', {'foto': foto})
+
+# ==========================================
+# BACKFILL (LINHA DE COMANDO)
+# ==========================================
+
+def _pendentes(pasta, refazer=False):
+    # Percorre também as subpastas do armazenamento por hash (ex: 3f/a2/), ignorando as ocultas (.tmp)
+    for raiz, pastas, arquivos in os.walk(pasta):
+        pastas[:] = [nome for nome in pastas if not nome.startswith('.')]
+        for nome in arquivos:
+            if eh_variante(nome) or nome.endswith('.tmp'):
+                continue
+            if not refazer and os.path.exists(os.path.join(raiz, nome_variante(nome, 'thumb', 'webp'))):
+                continue
+            yield os.path.join(raiz, nome)
+
+def backfill(pasta, processos=None, refazer=False):
+    """Gera as variantes das fotos já existentes, em paralelo em todos os núcleos."""
+    arquivos = list(_pendentes(pasta, refazer))
+    print(f"🖼️ {len(arquivos)} foto(s) para processar em {pasta}")
+    erros = 0
+    with ProcessPoolExecutor(max_workers=processos) as executor:
+        futuros = {executor.submit(gerar_variantes, caminho): caminho for caminho in arquivos}
+        for futuro in as_completed(futuros):
+            try:
+                futuro.result()
+                print(f"✅ {os.path.basename(futuros[futuro])}")
+            except Exception as e:
+                erros += 1
+                print(f"❌ {os.path.basename(futuros[futuro])}: {e}")
+    print(f"Concluído: {len(arquivos) - erros} processada(s), {erros} erro(s).")
+    return erros == 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera as variantes (thumb/medium, WebP/JPEG) das fotos enviadas.")
+    parser.add_argument('--pasta', default=Config.UPLOAD_FOLDER)
+    parser.add_argument('--processos', type=int, default=None, help="padrão: número de núcleos")
+    parser.add_argument('--refazer', action='store_true', help="regera variantes que já existem")
+    args = parser.parse_args()
+    raise SystemExit(0 if backfill(args.pasta, args.processos, args.refazer) else 1)
@@ -0,0 +1,336 @@
+import argparse
+import csv
+import io
+import json
+import sys
+from datetime import date
+
+from psycopg2.extras import RealDictCursor
+
+import alertas
+import eventos
+import geo
+import matching
+import phash
+from cache import cache
+from database import get_db_connection
+
+# ==========================================
+# IMPORTAÇÃO E EXPORTAÇÃO EM LOTE
+# ==========================================
+
+# Parceiros (abrigos, controle de zoonoses) enviam centenas de anúncios de uma
+# vez em CSV ou JSON Lines. Em vez de um INSERT por pet, as linhas válidas vão
+# por COPY para uma tabela temporária e entram em pet com um único
+# INSERT ... SELECT ... ON CONFLICT, tudo na mesma transação.
+#
+#   python importacao.py importar abrigo.csv --origem abrigo-centro --usuario abrigo@exemplo.com
+#   python importacao.py exportar pets --formato jsonl --saida pets.jsonl
+
+# Valores aceitos pelas CHECK da tabela pet (migrations/0001_esquema_inicial.sql)
+ESPECIES = ('Cachorro', 'Gato', 'Outros')
+SITUACOES = ('Achado', 'Perdido')
+SEXOS = ('Macho', 'Fêmea')
+
+# Campo -> (tamanho máximo, obrigatório), como nas colunas de pet
+CAMPOS_TEXTO = {
+    'nome': (100, True),
+    'raca': (100, False),
+    'descricao': (None, True),
+    'mensagem_dono': (None, False),
+    'nome_tutor': (255, True),
+    'telefone_tutor': (20, True),
+    'visto_em': (255, True),
+}
+
+COLUNAS_STAGING = [
+    'linha', 'id_externo', 'nome', 'especie', 'raca', 'situacao', 'data', 'sexo',
+    'descricao', 'mensagem_dono', 'nome_tutor', 'telefone_tutor', 'visto_em',
+    'latitude', 'longitude', 'geohash',
+]
+# Colunas que uma reimportação atualiza (o dono do anúncio e a origem não mudam)
+COLUNAS_ATUALIZADAS = [c for c in COLUNAS_STAGING if c not in ('linha', 'id_externo')]
+
+def _opcoes(valores):
+    # Aceita 'cachorro', 'FEMEA' etc. e devolve a grafia exata da CHECK
+    return {matching.normalizar(valor): valor for valor in valores}
+
+_ESPECIES = _opcoes(ESPECIES)
+_SITUACOES = _opcoes(SITUACOES)
+_SEXOS = _opcoes(SEXOS)
+
+def validar(registro):
+    """Confere um registro do arquivo. Retorna (valores, erros); valores é None se houver erro."""
+    def texto(campo):
+        valor = registro.get(campo)
+        if valor is None:
+            return None
+        valor = str(valor).strip()
+        return valor or None
+
+    erros = []
+    valores = {'id_externo': texto('id_externo')}
+    if not valores['id_externo']:
+        erros.append("id_externo vazio")
+    elif len(valores['id_externo']) > 100:
+        erros.append("id_externo com mais de 100 caracteres")
+
+    for campo, opcoes in (('especie', _ESPECIES), ('situacao', _SITUACOES), ('sexo', _SEXOS)):
+        valor = texto(campo)
+        valores[campo] = opcoes.get(matching.normalizar(valor))
+        if valores[campo] is None:
+            erros.append(f"{campo} inválido ({valor!r}); use {', '.join(opcoes.values())}")
+
+    for campo, (tamanho, obrigatorio) in CAMPOS_TEXTO.items():
+        valores[campo] = texto(campo)
+        if valores[campo] is None and obrigatorio:
+            erros.append(f"{campo} vazio")
+        elif valores[campo] and tamanho and len(valores[campo]) > tamanho:
+            erros.append(f"{campo} com mais de {tamanho} caracteres")
+
+    try:
+        valores['data'] = date.fromisoformat(texto('data') or '')
+        if valores['data'] > date.today():
+            erros.append("data no futuro")
+    except ValueError:
+        erros.append(f"data inválida ({texto('data')!r}); use AAAA-MM-DD")
+
+    latitude, longitude = texto('latitude'), texto('longitude')
+    valores['latitude'] = valores['longitude'] = valores['geohash'] = None
+    if latitude or longitude:
+        try:
+            valores['latitude'], valores['longitude'] = float(latitude), float(longitude)
+            if not (-90 <= valores['latitude'] <= 90 and -180 <= valores['longitude'] <= 180):
+                raise ValueError
+            valores['geohash'] = geo.geohash_encode(valores['latitude'], valores['longitude'])
+        except (TypeError, ValueError):
+            erros.append("latitude/longitude inválidas")
+
+    return (None, erros) if erros else (valores, [])
+
+def ler_registros(caminho, formato=None, delimitador=','):
+    """Gera (linha, registro) do arquivo sem carregá-lo inteiro. '-' lê da entrada padrão."""
+    formato = formato or ('jsonl' if caminho.endswith(('.jsonl', '.ndjson')) else 'csv')
+    # utf-8-sig: planilhas exportadas pelo Excel começam com BOM
+    arquivo = sys.stdin if caminho == '-' else open(caminho, encoding='utf-8-sig', newline='')
+    try:
+        if formato == 'csv':
+            leitor = csv.DictReader(arquivo, delimiter=delimitador)
+            for registro in leitor:
+                yield leitor.line_num, registro
+        else:
+            for numero, linha in enumerate(arquivo, start=1):
+                if not linha.strip():
+                    continue
+                try:
+                    registro = json.loads(linha)
+                except ValueError as e:
+                    registro = {'_erro': f"JSON inválido: {e}"}
+                if not isinstance(registro, dict):
+                    registro = {'_erro': "a linha não é um objeto JSON"}
+                yield numero, registro
+    finally:
+        if arquivo is not sys.stdin:
+            arquivo.close()
+
+
+class FluxoCopy:
+    """Objeto "arquivo" que entrega ao COPY, sob demanda, as linhas de um gerador.
+
+    O psycopg2 só chama read(); assim o arquivo de entrada é lido, validado e
+    enviado ao banco em pedaços, sem montar o CSV inteiro na memória.
+    """
+
+    def __init__(self, linhas):
+        self._linhas = iter(linhas)
+        self._buffer = ''
+
+    def read(self, tamanho=-1):
+        while tamanho < 0 or len(self._buffer) < tamanho:
+            try:
+                self._buffer += next(self._linhas)
+            except StopIteration:
+                break
+        if tamanho < 0:
+            tamanho = len(self._buffer)
+        dados, self._buffer = self._buffer[:tamanho], self._buffer[tamanho:]
+        return dados
+
+
+def _linhas_csv(registros, rejeitados):
+    """Valida cada registro e gera as linhas CSV das que passaram; as outras vão para `rejeitados`."""
+    vistos = {}
+    saida = io.StringIO()
+    escritor = csv.writer(saida)
+    for numero, registro in registros:
+        if '_erro' in registro:
+            rejeitados.append((numero, [registro['_erro']]))
+            continue
+        valores, erros = validar(registro)
+        if valores and valores['id_externo'] in vistos:
+            # O upsert não pode atualizar a mesma linha duas vezes no mesmo comando
+            erros = [f"id_externo repetido (já usado na linha {vistos[valores['id_externo']]})"]
+        if erros:
+            rejeitados.append((numero, erros))
+            continue
+        vistos[valores['id_externo']] = numero
+        valores['linha'] = numero
+        escritor.writerow([valores[coluna] for coluna in COLUNAS_STAGING])
+        yield saida.getvalue()
+        saida.seek(0)
+        saida.truncate()
+
+def importar(caminho, origem, email_usuario, formato=None, delimitador=',', estrito=False, simular=False):
+    """Importa o arquivo numa única transação. Retorna (inseridos, atualizados, rejeitados)."""
+    conn = get_db_connection()
+    if not conn:
+        raise SystemExit(1)
+    rejeitados = []
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id_usuario FROM usuario WHERE e_mail = %s", (email_usuario,))
+        usuario = cursor.fetchone()
+        if not usuario:
+            raise ValueError(f"Usuário {email_usuario} não encontrado; cadastre a conta do parceiro primeiro.")
+
+        cursor.execute("""
+            CREATE TEMP TABLE pet_importacao (
+                linha INTEGER, id_externo TEXT, nome TEXT, especie TEXT, raca TEXT,
+                situacao TEXT, data DATE, sexo TEXT, descricao TEXT, mensagem_dono TEXT,
+                nome_tutor TEXT, telefone_tutor TEXT, visto_em TEXT,
+                latitude DOUBLE PRECISION, longitude DOUBLE PRECISION, geohash TEXT
+            ) ON COMMIT DROP
+        """)
+        registros = ler_registros(caminho, formato, delimitador)
+        cursor.copy_expert(
+            f"COPY pet_importacao ({', '.join(COLUNAS_STAGING)}) FROM STDIN WITH (FORMAT csv)",
+            FluxoCopy(_linhas_csv(registros, rejeitados)),
+        )
+
+        if rejeitados and estrito:
+            raise ValueError(f"{len(rejeitados)} linha(s) rejeitada(s); nada foi importado (--estrito).")
+
+        colunas = ', '.join(COLUNAS_ATUALIZADAS)
+        atualizacoes = ', '.join(f"{coluna} = EXCLUDED.{coluna}" for coluna in COLUNAS_ATUALIZADAS)
+        cursor.execute(f"""
+            INSERT INTO pet ({colunas}, id_usuario, origem, id_externo)
+            SELECT {colunas}, %s, %s, id_externo FROM pet_importacao
+            ORDER BY linha
+            ON CONFLICT (origem, id_externo) DO UPDATE SET {atualizacoes}
+            RETURNING id_pet, (xmax = 0) AS inserido, foto IS NOT NULL, data, especie, situacao, sexo
+        """, (usuario[0], origem))
+        resultado = cursor.fetchall()
+        # Como em Pet.salvar: o resto vai para a fila de tarefas, na mesma transação
+        # (com --simular, o rollback desfaz as tarefas junto com os anúncios)
+        for id_pet, inserido, tem_foto, data, especie, situacao, sexo in resultado:
+            matching.agendar(id_pet, cursor)
+            if tem_foto:
+                phash.agendar(id_pet, cursor)
+            if inserido:
+                # Alertas e o card no feed aberto só para os novos; os atualizados já passaram por isso
+                alertas.agendar(id_pet, cursor)
+                eventos.notificar(cursor, 'novo', id_pet, data=data, especie=especie,
+                                  situacao=situacao, sexo=sexo)
+        if simular:
+            conn.rollback()
+        else:
+            conn.commit()
+        cursor.close()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    ids = [linha[0] for linha in resultado]
+    inseridos = sum(1 for linha in resultado if linha[1])
+    if ids and not simular:
+        cache.invalidar_namespace('pets:lista')
+        for id_pet in ids:
+            cache.delete(f"pets:id:{id_pet}")
+    return inseridos, len(ids) - inseridos, rejeitados
+
+# ==========================================
+# EXPORTAÇÃO
+# ==========================================
+
+CONSULTAS_EXPORTACAO = {
+    'pets': """
+        SELECT id_pet, origem, id_externo, nome, especie, raca, situacao, foto, data, sexo,
+               descricao, mensagem_dono, nome_tutor, telefone_tutor, visto_em,
+               latitude, longitude, oculto, id_usuario
+        FROM pet ORDER BY id_pet
+    """,
+    'denuncias': """
+        SELECT id_denuncia, id_pet, id_usuario, motivo, data_denuncia
+        FROM denuncia ORDER BY id_denuncia
+    """,
+}
+
+def exportar(tabela, saida, formato='csv'):
+    """Escreve a tabela em `saida` sem carregá-la na memória. Retorna o número de linhas."""
+    consulta = CONSULTAS_EXPORTACAO[tabela]
+    conn = get_db_connection()
+    if not conn:
+        raise SystemExit(1)
+    try:
+        if formato == 'csv':
+            # O próprio servidor gera o CSV e o envia em pedaços direto para o arquivo
+            cursor = conn.cursor()
+            cursor.copy_expert(f"COPY ({consulta}) TO STDOUT WITH (FORMAT csv, HEADER)", saida)
+            total = cursor.rowcount
+        else:
+            # Cursor nomeado (no servidor): busca as linhas em lotes de itersize
+            cursor = conn.cursor(name=f'exportar_{tabela}', cursor_factory=RealDictCursor)
+            cursor.itersize = 5000
+            cursor.execute(consulta)
+            total = 0
+            for linha in cursor:
+                saida.write(json.dumps(linha, ensure_ascii=False, default=str) + '\n')
+                total += 1
+        cursor.close()
+        conn.rollback()
+        return total
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa e exporta anúncios em lote (CSV ou JSON Lines).")
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    p_importar = comandos.add_parser('importar', help="importa (ou atualiza) anúncios de um parceiro")
+    p_importar.add_argument('arquivo', help="CSV com cabeçalho ou .jsonl; '-' lê da entrada padrão")
+    p_importar.add_argument('--origem', required=True, help="identificador do parceiro, ex: abrigo-centro")
+    p_importar.add_argument('--usuario', required=True, help="e-mail da conta dona dos anúncios")
+    p_importar.add_argument('--formato', choices=['csv', 'jsonl'], help="padrão: pela extensão do arquivo")
+    p_importar.add_argument('--delimitador', default=',', help="separador do CSV (ex: ';')")
+    p_importar.add_argument('--estrito', action='store_true', help="não importa nada se alguma linha for rejeitada")
+    p_importar.add_argument('--simular', action='store_true', help="valida e executa, mas desfaz no final")
+
+    p_exportar = comandos.add_parser('exportar', help="exporta pets ou denúncias")
+    p_exportar.add_argument('tabela', choices=sorted(CONSULTAS_EXPORTACAO))
+    p_exportar.add_argument('--formato', choices=['csv', 'jsonl'], default='csv')
+    p_exportar.add_argument('--saida', default='-', help="arquivo de saída; padrão: saída padrão")
+
+    args = parser.parse_args()
+    if args.comando == 'importar':
+        try:
+            inseridos, atualizados, rejeitados = importar(
+                args.arquivo, args.origem, args.usuario, args.formato,
+                args.delimitador, args.estrito, args.simular,
+            )
+        except ValueError as e:
+            print(f"❌ {e}")
+            raise SystemExit(1)
+        for numero, erros in rejeitados:
+            print(f"⚠️ linha {numero}: {'; '.join(erros)}")
+        prefixo = "(simulação) " if args.simular else ""
+        print(f"✅ {prefixo}{inseridos} inserido(s), {atualizados} atualizado(s), {len(rejeitados)} rejeitado(s).")
+        raise SystemExit(0 if not rejeitados else 2)
+    else:
+        if args.saida == '-':
+            total = exportar(args.tabela, sys.stdout, args.formato)
+        else:
+            with open(args.saida, 'w', encoding='utf-8', newline='') as saida:
+                total = exportar(args.tabela, saida, args.formato)
+        print(f"✅ {total} linha(s) exportada(s).", file=sys.stderr)
@@ -0,0 +1,387 @@
+import argparse
+import os
+import shutil
+import time
+
+import fila
+import metricas
+from config import Config
+from database import db_connection
+from imagens import FORMATOS, VARIANTES, eh_variante, nome_variante
+from models import Pet
+from storage import armazenamento
+
+# ==========================================
+# LIMPEZA DOS UPLOADS ÓRFÃOS
+# ==========================================
+
+# Uma foto pode ficar em static/uploads sem nenhum anúncio: a remoção do arquivo
+# falhou, o usuário foi apagado (o ON DELETE CASCADE leva os pets, não os
+# arquivos) ou o Pet.salvar deu erro depois do upload. E um anúncio pode apontar
+# para uma foto que não está mais no disco. A limpeza confere os dois lados sem
+# carregar nenhum deles inteiro na memória:
+#
+# 1. Lê as fotos referenciadas (pet e pet_arquivo) com um cursor no servidor e
+#    confere se cada arquivo existe. Se estiver na quarentena, ele volta para o
+#    lugar; se não, é uma referência pendente, que só é listada (ou tirada do
+#    anúncio com --corrigir, que passa a mostrar a imagem padrão).
+# 2. Percorre static/uploads com os.scandir e consulta o banco a cada
+#    UPLOAD_LIMPEZA_LOTE arquivos (foto = ANY(...), pelos índices de foto).
+#    Fotos sem anúncio e sem alteração há mais de UPLOAD_CARENCIA_HORAS vão,
+#    com as variantes, para a quarentena (UPLOAD_QUARENTENA, fora de static/).
+# 3. Apaga da quarentena o que está lá há mais de UPLOAD_QUARENTENA_DIAS e
+#    continua sem anúncio.
+#
+# Roda como tarefa periódica da fila (`python fila.py`) ou à mão:
+#   python limpeza_uploads.py --simular
+
+# Extensões das fotos originais (para achar a original de uma variante)
+EXTENSOES_FOTO = ('jpg', 'jpeg', 'png', 'gif')
+# Restos de gravações interrompidas (imagens.gerar_variantes, assets._gravar)
+SUFIXOS_TEMPORARIOS = ('.tmp', '.upload')
+
+def _variantes(foto):
+    return [nome_variante(foto, variante, formato) for variante in VARIANTES for formato in FORMATOS]
+
+def _original_da_variante(pasta, nome):
+    """Nome da foto original de uma variante, se ela existir em `pasta` (ou None)."""
+    base = nome.rsplit('_', 1)[0]
+    for extensao in EXTENSOES_FOTO:
+        for candidato in (f"{base}.{extensao}", f"{base}.{extensao.upper()}"):
+            if os.path.exists(os.path.join(pasta, candidato)):
+                return candidato
+    return None
+
+def _percorrer(pasta):
+    """(nome relativo, stat) de cada arquivo de `pasta`, lidos aos poucos com os.scandir.
+
+    Só a lista de subpastas a visitar fica na memória, nunca a de arquivos.
+    Pastas ocultas (como a .tmp dos uploads em andamento) ficam de fora.
+    """
+    pendentes = ['']
+    while pendentes:
+        relativa = pendentes.pop()
+        try:
+            entradas = os.scandir(os.path.join(pasta, relativa))
+        except FileNotFoundError:
+            continue
+        with entradas:
+            for entrada in entradas:
+                nome = f"{relativa}/{entrada.name}" if relativa else entrada.name
+                try:
+                    if entrada.is_dir(follow_symlinks=False):
+                        if not entrada.name.startswith('.'):
+                            pendentes.append(nome)
+                    elif entrada.is_file(follow_symlinks=False):
+                        yield nome, entrada.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    # Movido ou apagado durante a varredura
+                    continue
+
+def _mover(pasta_origem, pasta_destino, nome):
+    """Move o arquivo mantendo o caminho relativo. Retorna o tamanho, ou None se ele não existia."""
+    origem = os.path.join(pasta_origem, nome)
+    destino = os.path.join(pasta_destino, nome)
+    try:
+        tamanho = os.stat(origem).st_size
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        shutil.move(origem, destino)
+    except FileNotFoundError:
+        return None
+    return tamanho
+
+def _apagar(pasta, nome, simular=False):
+    """Apaga o arquivo. Retorna o tamanho, ou None se ele não existia (ou não pôde ser apagado)."""
+    caminho = os.path.join(pasta, nome)
+    try:
+        tamanho = os.stat(caminho).st_size
+        if not simular:
+            os.remove(caminho)
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        print(f"❌ Erro ao apagar {caminho}: {e}")
+        return None
+    return tamanho
+
+def _tamanho(pasta, nomes):
+    total = 0
+    for nome in nomes:
+        try:
+            total += os.stat(os.path.join(pasta, nome)).st_size
+        except FileNotFoundError:
+            pass
+    return total
+
+def _formatar_bytes(total):
+    for unidade in ('B', 'KB', 'MB', 'GB'):
+        if total < 1024:
+            return f"{total:.0f} {unidade}" if unidade == 'B' else f"{total:.1f} {unidade}"
+        total /= 1024
+    return f"{total:.1f} TB"
+
+@metricas.medir_sql('uploads.referenciadas')
+def _referenciadas(nomes):
+    """Quais dos nomes são a foto de algum anúncio (ativo, encerrado ou arquivado)."""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT foto FROM pet WHERE foto = ANY(%s)
+            UNION
+            SELECT foto FROM pet_arquivo WHERE foto = ANY(%s)
+        """, (nomes, nomes))
+        em_uso = {linha[0] for linha in cursor.fetchall()}
+        cursor.close()
+    return em_uso
+
+# ==========================================
+# 1. REFERÊNCIAS PENDENTES
+# ==========================================
+
+def _restaurar(foto, simular=False):
+    """Devolve da quarentena a foto (e as variantes). Retorna se ela estava lá."""
+    if not os.path.exists(os.path.join(Config.UPLOAD_QUARENTENA, foto)):
+        return False
+    if simular:
+        return True
+    for arquivo in [foto] + _variantes(foto):
+        _mover(Config.UPLOAD_QUARENTENA, armazenamento.pasta, arquivo)
+    print(f"♻️ A foto {foto} voltou a ter anúncio e saiu da quarentena.")
+    return True
+
+@metricas.medir_sql('uploads.corrigir_referencias')
+def _corrigir_referencias(fotos):
+    """Tira dos anúncios as fotos que não existem mais: a página mostra a imagem padrão."""
+    # Confere de novo: alguém pode ter enviado a mesma foto desde a varredura
+    fotos = [foto for foto in fotos if not os.path.exists(armazenamento.caminho(foto))]
+    if not fotos:
+        return
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("UPDATE pet SET foto = NULL WHERE foto = ANY(%s) RETURNING id_pet", (fotos,))
+        ids = [linha[0] for linha in cursor.fetchall()]
+        cursor.execute("UPDATE pet_arquivo SET foto = NULL WHERE foto = ANY(%s)", (fotos,))
+        cursor.execute("DELETE FROM arquivo_upload WHERE caminho = ANY(%s)", (fotos,))
+        conn.commit()
+        cursor.close()
+    for pet_id in ids:
+        Pet.invalidar_cache(pet_id)
+
+def conferir_referencias(corrigir=False, simular=False, lote=None, exemplos=20):
+    """Confere se a foto de cada anúncio existe no disco.
+
+    Retorna {'verificadas', 'restauradas', 'pendentes', 'exemplos'}.
+    """
+    lote = lote or Config.UPLOAD_LIMPEZA_LOTE
+    resultado = {'verificadas': 0, 'restauradas': 0, 'pendentes': 0, 'exemplos': []}
+    a_corrigir = []
+    with db_connection() as conn:
+        # Cursor nomeado (no servidor): as fotos chegam em lotes de itersize
+        cursor = conn.cursor(name='limpeza_uploads_fotos')
+        cursor.itersize = lote
+        cursor.execute("""
+            SELECT foto FROM pet WHERE foto IS NOT NULL AND foto <> ''
+            UNION
+            SELECT foto FROM pet_arquivo WHERE foto IS NOT NULL AND foto <> ''
+        """)
+        for (foto,) in cursor:
+            resultado['verificadas'] += 1
+            if os.path.exists(armazenamento.caminho(foto)):
+                continue
+            if _restaurar(foto, simular):
+                resultado['restauradas'] += 1
+                continue
+            resultado['pendentes'] += 1
+            if len(resultado['exemplos']) < exemplos:
+                resultado['exemplos'].append(foto)
+            if corrigir and not simular:
+                a_corrigir.append(foto)
+                if len(a_corrigir) >= lote:
+                    _corrigir_referencias(a_corrigir)
+                    a_corrigir = []
+        cursor.close()
+        conn.rollback()
+    if a_corrigir:
+        _corrigir_referencias(a_corrigir)
+    return resultado
+
+# ==========================================
+# 2. FOTOS SEM ANÚNCIO
+# ==========================================
+
+def _retirar(nome, simular=False):
+    """Tira a foto e as variantes de static/uploads: para a quarentena ou, sem ela, direto para o lixo.
+
+    Retorna os bytes que saíram de static/uploads.
+    """
+    arquivos = [nome] + _variantes(nome)
+    if simular:
+        return _tamanho(armazenamento.pasta, arquivos)
+    if Config.UPLOAD_QUARENTENA_DIAS <= 0:
+        return sum(_apagar(armazenamento.pasta, arquivo) or 0 for arquivo in arquivos)
+    total = 0
+    for arquivo in arquivos:
+        try:
+            tamanho = _mover(armazenamento.pasta, Config.UPLOAD_QUARENTENA, arquivo)
+        except OSError as e:
+            print(f"❌ Erro ao mover {arquivo} para a quarentena: {e}")
+            continue
+        if tamanho is not None:
+            # Daqui em diante o mtime marca a entrada na quarentena
+            os.utime(os.path.join(Config.UPLOAD_QUARENTENA, arquivo))
+            total += tamanho
+    return total
+
+def _recolher_lote(candidatos, resultado, simular):
+    em_uso = _referenciadas(list(candidatos))
+    for nome, info in candidatos.items():
+        if nome in em_uso:
+            continue
+        try:
+            if os.stat(armazenamento.caminho(nome)).st_mtime != info.st_mtime:
+                # Reenviada durante a varredura (o storage renova o mtime de cópias idênticas)
+                continue
+        except FileNotFoundError:
+            continue
+        resultado['orfaos'] += 1
+        resultado['bytes'] += _retirar(nome, simular)
+
+def recolher_orfaos(simular=False, lote=None):
+    """Tira de static/uploads as fotos sem anúncio há mais de UPLOAD_CARENCIA_HORAS.
+
+    A carência protege os uploads cujo anúncio ainda não foi gravado.
+    Retorna {'verificados', 'orfaos', 'descartados', 'bytes'}.
+    """
+    lote = lote or Config.UPLOAD_LIMPEZA_LOTE
+    limite = time.time() - Config.UPLOAD_CARENCIA_HORAS * 3600
+    resultado = {'verificados': 0, 'orfaos': 0, 'descartados': 0, 'bytes': 0}
+    pasta = armazenamento.pasta
+    candidatos = {}
+    for nome, info in _percorrer(pasta):
+        resultado['verificados'] += 1
+        if info.st_mtime >= limite:
+            continue
+        if eh_variante(nome):
+            # Variantes vão junto com a foto; as que ficaram sem ela são apagadas (dá para gerar de novo)
+            if _original_da_variante(pasta, nome) is None and _apagar(pasta, nome, simular) is not None:
+                resultado['descartados'] += 1
+                resultado['bytes'] += info.st_size
+            continue
+        if nome.endswith(SUFIXOS_TEMPORARIOS):
+            if _apagar(pasta, nome, simular) is not None:
+                resultado['descartados'] += 1
+                resultado['bytes'] += info.st_size
+            continue
+        candidatos[nome] = info
+        if len(candidatos) >= lote:
+            _recolher_lote(candidatos, resultado, simular)
+            candidatos = {}
+    if candidatos:
+        _recolher_lote(candidatos, resultado, simular)
+
+    # Uploads interrompidos no meio (a pasta .tmp fica de fora da varredura acima)
+    for nome, info in _percorrer(armazenamento.pasta_temporaria):
+        if info.st_mtime < limite and _apagar(armazenamento.pasta_temporaria, nome, simular) is not None:
+            resultado['descartados'] += 1
+            resultado['bytes'] += info.st_size
+    return resultado
+
+# ==========================================
+# 3. QUARENTENA
+# ==========================================
+
+@metricas.medir_sql('uploads.esquecer')
+def _esquecer(fotos):
+    """Apaga de arquivo_upload a contagem das fotos apagadas (que o CASCADE deixou para trás)."""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            DELETE FROM arquivo_upload a
+            WHERE a.caminho = ANY(%s)
+              AND NOT EXISTS (SELECT 1 FROM pet p WHERE p.foto = a.caminho)
+              AND NOT EXISTS (SELECT 1 FROM pet_arquivo pa WHERE pa.foto = a.caminho)
+        """, (fotos,))
+        conn.commit()
+        cursor.close()
+
+def _esvaziar_lote(candidatos, resultado, simular):
+    em_uso = _referenciadas(list(candidatos))
+    apagadas = []
+    for nome in candidatos:
+        if nome in em_uso:
+            # Ganhou um anúncio enquanto estava na quarentena
+            _restaurar(nome, simular)
+            resultado['restaurados'] += 1
+            continue
+        liberados = sum(_apagar(Config.UPLOAD_QUARENTENA, arquivo, simular) or 0
+                        for arquivo in [nome] + _variantes(nome))
+        resultado['apagados'] += 1
+        resultado['bytes'] += liberados
+        apagadas.append(nome)
+    if apagadas and not simular:
+        _esquecer(apagadas)
+
+def esvaziar_quarentena(simular=False, lote=None):
+    """Apaga as fotos que estão na quarentena há mais de UPLOAD_QUARENTENA_DIAS e continuam sem anúncio.
+
+    Retorna {'apagados', 'restaurados', 'bytes'}.
+    """
+    lote = lote or Config.UPLOAD_LIMPEZA_LOTE
+    limite = time.time() - Config.UPLOAD_QUARENTENA_DIAS * 86400
+    resultado = {'apagados': 0, 'restaurados': 0, 'bytes': 0}
+    pasta = Config.UPLOAD_QUARENTENA
+    candidatos = {}
+    for nome, info in _percorrer(pasta):
+        if info.st_mtime >= limite:
+            continue
+        if eh_variante(nome):
+            # Saem junto com a foto original, a não ser que ela não esteja mais lá
+            if _original_da_variante(pasta, nome) is None and _apagar(pasta, nome, simular) is not None:
+                resultado['bytes'] += info.st_size
+            continue
+        candidatos[nome] = info
+        if len(candidatos) >= lote:
+            _esvaziar_lote(candidatos, resultado, simular)
+            candidatos = {}
+    if candidatos:
+        _esvaziar_lote(candidatos, resultado, simular)
+    return resultado
+
+# ==========================================
+# TAREFA PERIÓDICA E LINHA DE COMANDO
+# ==========================================
+
+def _relatorio(referencias, orfaos, quarentena, simular=False):
+    prefixo = "[simulação] " if simular else ""
+    destino = "para a quarentena" if Config.UPLOAD_QUARENTENA_DIAS > 0 else "apagada(s)"
+    linhas = [
+        f"{prefixo}🔗 {referencias['verificadas']} foto(s) referenciada(s): "
+        f"{referencias['pendentes']} sem arquivo, {referencias['restauradas']} devolvida(s) da quarentena.",
+        f"{prefixo}🗑️ {orfaos['verificados']} arquivo(s) em {armazenamento.pasta}: "
+        f"{orfaos['orfaos']} foto(s) sem anúncio {destino}, {orfaos['descartados']} resto(s) apagado(s), "
+        f"{_formatar_bytes(orfaos['bytes'])} liberado(s).",
+        f"{prefixo}🧹 Quarentena: {quarentena['apagados']} foto(s) apagada(s), "
+        f"{quarentena['restaurados']} devolvida(s), {_formatar_bytes(quarentena['bytes'])} recuperado(s).",
+    ]
+    for foto in referencias['exemplos']:
+        linhas.append(f"   ⚠️ Anúncio aponta para uma foto que não existe: {foto}")
+    return "\n".join(linhas)
+
+@fila.periodica('uploads.limpeza', Config.UPLOAD_LIMPEZA_INTERVALO)
+def limpeza(simular=False, corrigir=False):
+    """Roda as três etapas e retorna o resultado de cada uma."""
+    # As referências primeiro: o que voltou a ter anúncio sai da quarentena antes de ela ser esvaziada
+    referencias = conferir_referencias(corrigir, simular)
+    orfaos = recolher_orfaos(simular)
+    quarentena = esvaziar_quarentena(simular) if Config.UPLOAD_QUARENTENA_DIAS > 0 else \
+        {'apagados': 0, 'restaurados': 0, 'bytes': 0}
+    print(_relatorio(referencias, orfaos, quarentena, simular))
+    return {'referencias': referencias, 'orfaos': orfaos, 'quarentena': quarentena}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recolhe as fotos sem anúncio e confere as fotos dos anúncios.")
+    parser.add_argument('--simular', action='store_true', help="só mostra o que seria feito")
+    parser.add_argument('--corrigir', action='store_true',
+                        help="tira dos anúncios as fotos que não existem mais (mostram a imagem padrão)")
+    args = parser.parse_args()
+    limpeza(simular=args.simular, corrigir=args.corrigir)
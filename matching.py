@@ -0,0 +1,178 @@
+import math
+import re
+import unicodedata
+from datetime import timedelta
+from difflib import SequenceMatcher
+
+from psycopg2.extras import RealDictCursor, execute_values
+
+import fila
+import geo
+import metricas
+from config import Config
+from database import db_connection
+
+# ==========================================
+# CORRESPONDÊNCIA ENTRE PERDIDOS E ACHADOS
+# ==========================================
+
+# Quando um anúncio novo é salvo, procuramos anúncios da situação oposta
+# ('Perdido' <-> 'Achado'). Espécie e sexo são filtros obrigatórios; a
+# pontuação combina raça, proximidade das datas e local.
+#
+# Os candidatos vêm de faixas dos índices de blocagem, nunca de uma varredura
+# da tabela. No máximo MATCH_MAX_CANDIDATOS são pontuados: primeiro os das
+# células de geohash a até MATCH_RAIO_KM do pet (idx_pet_bloco_match_local),
+# depois os demais (idx_pet_bloco_match), sempre das datas mais próximas para
+# as mais distantes. Se a janela tiver candidatos demais, ficam de fora os
+# mais longe, no espaço e no tempo.
+
+PESOS = {'raca': 0.30, 'data': 0.25, 'local': 0.45}
+# Um achado pode ser anunciado um pouco antes do perdido correspondente (e vice-versa)
+FOLGA_DIAS = 3
+# Decaimentos: a nota cai para ~37% com 14 dias de diferença ou 2 km de distância
+ESCALA_DIAS = 14.0
+ESCALA_KM = 2.0
+
+_PALAVRAS_IGNORADAS = {
+    'rua', 'avenida', 'av', 'perto', 'proximo', 'proxima', 'bairro', 'cidade',
+    'de', 'da', 'do', 'das', 'dos', 'na', 'no', 'em', 'e', 'ao', 'a', 'o',
+}
+
+def normalizar(texto):
+    """Minúsculas e sem acentos: 'São João' -> 'sao joao'."""
+    if not texto:
+        return ''
+    texto = unicodedata.normalize('NFKD', texto.lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c)).strip()
+
+def tokens(texto):
+    return {
+        palavra for palavra in re.findall(r'[a-z0-9]+', normalizar(texto))
+        if len(palavra) > 2 and palavra not in _PALAVRAS_IGNORADAS
+    }
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def similaridade_raca(raca_a, raca_b):
+    a, b = normalizar(raca_a), normalizar(raca_b)
+    if not a or not b:
+        # Raça não informada: nem aproxima nem afasta
+        return 0.5
+    return max(SequenceMatcher(None, a, b).ratio(), jaccard(tokens(a), tokens(b)))
+
+def similaridade_local(pet_a, pet_b, tokens_a=None):
+    if None not in (pet_a['latitude'], pet_a['longitude'], pet_b['latitude'], pet_b['longitude']):
+        distancia = geo.distancia_km(pet_a['latitude'], pet_a['longitude'],
+                                     pet_b['latitude'], pet_b['longitude'])
+        return math.exp(-distancia / ESCALA_KM)
+    if tokens_a is None:
+        tokens_a = tokens(pet_a['visto_em'])
+    return jaccard(tokens_a, tokens(pet_b['visto_em']))
+
+def pontuar(pet, candidato, tokens_pet=None):
+    """Nota entre 0 e 1 de o candidato ser o mesmo animal do pet."""
+    dias = abs((pet['data'] - candidato['data']).days)
+    notas = {
+        'raca': similaridade_raca(pet['raca'], candidato['raca']),
+        'data': math.exp(-dias / ESCALA_DIAS),
+        'local': similaridade_local(pet, candidato, tokens_pet),
+    }
+    return sum(PESOS[criterio] * nota for criterio, nota in notas.items())
+
+def _janela(pet):
+    """Intervalo de datas em que os candidatos podem estar."""
+    janela = timedelta(days=Config.MATCH_JANELA_DIAS)
+    folga = timedelta(days=FOLGA_DIAS)
+    if pet['situacao'] == 'Perdido':
+        # O animal perdido só pode ser achado depois de sumir
+        return 'Achado', pet['data'] - folga, pet['data'] + janela
+    return 'Perdido', pet['data'] - janela, pet['data'] + folga
+
+_CANDIDATOS = """
+    SELECT id_pet, raca, data, visto_em, latitude, longitude
+    FROM pet
+    WHERE especie = %s AND sexo = %s AND situacao = %s
+      AND data BETWEEN %s AND %s AND NOT oculto AND status = 'ativo'
+      AND {bloco}
+    ORDER BY abs(data - %s), id_pet
+    LIMIT %s
+"""
+
+def _bloco_local(pet):
+    """Condição SQL (e parâmetros) das células de geohash a até MATCH_RAIO_KM do pet."""
+    celulas = geo.celulas_cobrindo(pet['latitude'], pet['longitude'], Config.MATCH_RAIO_KM)
+    # Todos os caracteres do base32 do geohash são menores que '~'
+    faixas = ' OR '.join(["(geohash >= %s AND geohash < %s)"] * len(celulas))
+    return f"({faixas})", [valor for celula in celulas for valor in (celula, celula + '~')]
+
+def _candidatos(cursor, pet, situacao_oposta, inicio, fim):
+    """Até MATCH_MAX_CANDIDATOS candidatos: os próximos do pet primeiro, depois os demais."""
+    limite = Config.MATCH_MAX_CANDIDATOS
+    filtros = [pet['especie'], pet['sexo'], situacao_oposta, inicio, fim]
+    if pet['latitude'] is None or pet['longitude'] is None:
+        cursor.execute(_CANDIDATOS.format(bloco='TRUE'), filtros + [pet['data'], limite])
+        return cursor.fetchall()
+
+    bloco, params_bloco = _bloco_local(pet)
+    cursor.execute(_CANDIDATOS.format(bloco=bloco), filtros + params_bloco + [pet['data'], limite])
+    candidatos = cursor.fetchall()
+    if len(candidatos) < limite:
+        # Sem coordenadas (comparados pelo texto de visto_em) ou mais longe
+        cursor.execute(
+            _CANDIDATOS.format(bloco=f"(geohash IS NULL OR NOT {bloco})"),
+            filtros + params_bloco + [pet['data'], limite - len(candidatos)],
+        )
+        candidatos += cursor.fetchall()
+    return candidatos
+
+@fila.tarefa('matching.processar')
+@metricas.medir_sql('matching.processar')
+def processar(pet_id):
+    """Calcula e grava as correspondências de um pet. Retorna quantas foram gravadas."""
+    with db_connection() as conn:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute("""
+            SELECT id_pet, especie, sexo, situacao, raca, data, visto_em, latitude, longitude
+            FROM pet WHERE id_pet = %s
+        """, (pet_id,))
+        pet = cursor.fetchone()
+        if not pet:
+            cursor.close()
+            return 0
+
+        situacao_oposta, inicio, fim = _janela(pet)
+        candidatos = _candidatos(cursor, pet, situacao_oposta, inicio, fim)
+
+        tokens_pet = tokens(pet['visto_em'])
+        pontuados = []
+        for candidato in candidatos:
+            pontuacao = pontuar(pet, candidato, tokens_pet)
+            if pontuacao >= Config.MATCH_MIN_PONTUACAO:
+                pontuados.append((pontuacao, candidato['id_pet']))
+        pontuados.sort(reverse=True)
+        pontuados = pontuados[:Config.MATCH_MAX_POR_PET]
+
+        if pontuados:
+            if pet['situacao'] == 'Perdido':
+                linhas = [(pet_id, id_outro, pontuacao) for pontuacao, id_outro in pontuados]
+            else:
+                linhas = [(id_outro, pet_id, pontuacao) for pontuacao, id_outro in pontuados]
+            execute_values(cursor, """
+                INSERT INTO pet_match (id_perdido, id_achado, pontuacao) VALUES %s
+                ON CONFLICT (id_perdido, id_achado) DO UPDATE SET pontuacao = EXCLUDED.pontuacao
+            """, linhas)
+        conn.commit()
+        cursor.close()
+        return len(pontuados)
+
+# ==========================================
+# PROCESSAMENTO EM SEGUNDO PLANO
+# ==========================================
+
+def agendar(pet_id, cursor=None):
+    """Calcula as correspondências pela fila de tarefas, fora da requisição que salvou o pet."""
+    fila.enfileirar('matching.processar', {'pet_id': pet_id}, cursor=cursor)
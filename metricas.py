@@ -0,0 +1,257 @@
+import bisect
+import functools
+import sys
+import threading
+import time
+from collections import Counter
+
+from config import Config
+
+# ==========================================
+# MÉTRICAS (FORMATO TEXTO DO PROMETHEUS)
+# ==========================================
+
+# Histogramas e contadores simples, guardados na memória de cada processo e
+# expostos em /metrics. Com METRICAS_ATIVAS=false os decorators devolvem a
+# própria função e observar() retorna na primeira linha: o custo é quase zero.
+
+ATIVAS = Config.METRICAS_ATIVAS
+
+# Em segundos: de 1 ms a 10 s
+BUCKETS_TEMPO = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Em bytes: de 16 KB a 16 MB
+BUCKETS_BYTES = tuple(16 * 1024 * 4 ** i for i in range(6))
+
+def _escapar(valor):
+    return str(valor).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+def _rotulos(nomes, valores, extra=None):
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Histograma:
+
+    def __init__(self, nome, ajuda, rotulos=(), buckets=BUCKETS_TEMPO):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.buckets = tuple(buckets)
+        self._series = {}  # valores dos rótulos -> [contagem por bucket..., +Inf, soma]
+        self._lock = threading.Lock()
+        _registro.append(self)
+
+    def observar(self, valor, *valores_rotulos):
+        if not ATIVAS:
+            return
+        indice = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(valores_rotulos)
+            if serie is None:
+                serie = self._series[valores_rotulos] = [0] * (len(self.buckets) + 1) + [0.0]
+            serie[indice] += 1
+            serie[-1] += valor
+
+    def exportar(self):
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} histogram"]
+        with self._lock:
+            series = {chave: list(serie) for chave, serie in self._series.items()}
+        for valores, serie in sorted(series.items()):
+            acumulado = 0
+            for limite, contagem in zip(self.buckets + ('+Inf',), serie[:-1]):
+                acumulado += contagem
+                le = 'le="%s"' % (limite if limite == '+Inf' else _numero(float(limite)))
+                linhas.append(f"{self.nome}_bucket{_rotulos(self.rotulos, valores, le)} {acumulado}")
+            linhas.append(f"{self.nome}_sum{_rotulos(self.rotulos, valores)} {_numero(serie[-1])}")
+            linhas.append(f"{self.nome}_count{_rotulos(self.rotulos, valores)} {acumulado}")
+        return linhas
+
+
+class Contador:
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._valores = Counter()
+        self._lock = threading.Lock()
+        _registro.append(self)
+
+    def incrementar(self, *valores_rotulos, quantidade=1):
+        if not ATIVAS:
+            return
+        with self._lock:
+            self._valores[valores_rotulos] += quantidade
+
+    def exportar(self):
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} counter"]
+        with self._lock:
+            valores = dict(self._valores)
+        for chave, valor in sorted(valores.items()):
+            linhas.append(f"{self.nome}{_rotulos(self.rotulos, chave)} {_numero(valor)}")
+        return linhas
+
+
+_registro = []
+
+requisicoes = Histograma(
+    'radarpet_http_request_duration_seconds', "Duração das requisições por endpoint.",
+    ('endpoint', 'metodo', 'status'),
+)
+consultas = Histograma(
+    'radarpet_sql_duration_seconds', "Duração das consultas ao banco, por consulta nomeada.",
+    ('consulta',),
+)
+consultas_lentas = Contador(
+    'radarpet_sql_slow_total', "Consultas acima de SQL_LENTA_MS.", ('consulta',),
+)
+erros_sql = Contador(
+    'radarpet_sql_errors_total', "Consultas que terminaram com exceção.", ('consulta',),
+)
+espera_pool = Histograma(
+    'radarpet_pool_acquire_seconds', "Tempo para conseguir uma conexão do pool.",
+)
+leituras = Contador(
+    'radarpet_db_reads_total', "Blocos de leitura por destino (primario ou replica).", ('destino',),
+)
+replicas_ejetadas = Contador(
+    'radarpet_db_replica_ejections_total', "Vezes que uma réplica saiu do rodízio.", ('replica', 'motivo'),
+)
+upload_bytes = Histograma(
+    'radarpet_upload_bytes', "Tamanho das fotos enviadas.", buckets=BUCKETS_BYTES,
+)
+upload_duracao = Histograma(
+    'radarpet_upload_duration_seconds', "Tempo para receber e gravar uma foto.",
+)
+tarefas = Histograma(
+    'radarpet_job_duration_seconds', "Duração das tarefas da fila, por tipo e resultado.",
+    ('tipo', 'resultado'), buckets=BUCKETS_TEMPO + (30.0, 60.0, 300.0),
+)
+
+def medir_sql(nome):
+    """Decorator: registra a duração da função como a consulta `nome` e loga as lentas.
+
+    Vai nas funções que só fazem a ida ao banco (ex: Pet._buscar_pagina), não
+    nas que podem responder do cache.
+    """
+    def decorator(funcao):
+        if not ATIVAS:
+            return funcao
+
+        @functools.wraps(funcao)
+        def medida(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return funcao(*args, **kwargs)
+            except Exception:
+                erros_sql.incrementar(nome)
+                raise
+            finally:
+                duracao = time.perf_counter() - inicio
+                consultas.observar(duracao, nome)
+                if duracao * 1000 >= Config.SQL_LENTA_MS:
+                    consultas_lentas.incrementar(nome)
+                    argumentos = repr(args + tuple(kwargs.values()))[:200]
+                    print(f"🐢 Consulta lenta {nome}: {duracao * 1000:.0f} ms {argumentos}")
+        return medida
+    return decorator
+
+def _coletar_externos():
+    """Métricas lidas na hora da exportação: pool de conexões e cache."""
+    from cache import cache
+    from database import get_pool_stats
+
+    linhas = []
+    pool = get_pool_stats()
+    if pool:
+        linhas += ["# HELP radarpet_pool_connections Conexões do pool por estado.",
+                   "# TYPE radarpet_pool_connections gauge"]
+        for estado in ('em_uso', 'ociosas', 'abertas', 'aguardando'):
+            if estado in pool:
+                linhas.append(f'radarpet_pool_connections{{estado="{estado}"}} {pool[estado]}')
+
+    stats = cache.stats()
+    for nome, chave, tipo, ajuda in (
+        ('radarpet_cache_hits_total', 'hits', 'counter', "Acertos do cache por prefixo de chave."),
+        ('radarpet_cache_misses_total', 'misses', 'counter', "Falhas do cache por prefixo de chave."),
+        ('radarpet_cache_hit_ratio', 'hit_ratio', 'gauge', "Proporção de acertos do cache."),
+    ):
+        linhas += [f"# HELP {nome} {ajuda}", f"# TYPE {nome} {tipo}"]
+        for prefixo, contadores in sorted(stats.items()):
+            linhas.append(f'{nome}{{prefixo="{_escapar(prefixo)}"}} {_numero(contadores[chave])}')
+    return linhas
+
+def exportar():
+    """Todas as métricas deste processo no formato texto do Prometheus."""
+    linhas = []
+    for metrica in _registro:
+        linhas += metrica.exportar()
+    try:
+        linhas += _coletar_externos()
+    except Exception as e:
+        print(f"⚠️ Erro ao coletar métricas do pool/cache: {e}")
+    return '\n'.join(linhas) + '\n'
+
+# ==========================================
+# PROFILER POR AMOSTRAGEM (POR REQUISIÇÃO)
+# ==========================================
+
+class AmostradorPilha:
+    """Tira "fotos" da pilha de uma thread a cada `intervalo` segundos.
+
+    Não instrumenta as chamadas (como o cProfile), então a requisição
+    amostrada roda quase na velocidade normal. Ligado só para as requisições
+    que mandam o cabeçalho de profiling (ver app.py).
+    """
+
+    def __init__(self, thread_id, intervalo=0.005):
+        self.thread_id = thread_id
+        self.intervalo = intervalo
+        self.amostras = 0
+        self.proprias = Counter()     # função no topo da pilha
+        self.acumuladas = Counter()   # função em qualquer ponto da pilha
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._rodar, name='amostrador', daemon=True)
+
+    def iniciar(self):
+        self._thread.start()
+        return self
+
+    def _rodar(self):
+        while not self._parar.wait(self.intervalo):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.amostras += 1
+            vistas = set()
+            topo = True
+            while frame is not None:
+                codigo = frame.f_code
+                funcao = f"{codigo.co_filename}:{codigo.co_firstlineno}({codigo.co_name})"
+                if topo:
+                    self.proprias[funcao] += 1
+                    topo = False
+                if funcao not in vistas:
+                    self.acumuladas[funcao] += 1
+                    vistas.add(funcao)
+                frame = frame.f_back
+
+    def parar(self):
+        self._parar.set()
+        self._thread.join()
+        return self
+
+    def relatorio(self, limite=15):
+        if not self.amostras:
+            return "(nenhuma amostra)"
+        linhas = [f"{self.amostras} amostras a cada {self.intervalo * 1000:.0f} ms",
+                  "  própria  acumulada  função"]
+        for funcao, acumuladas in self.acumuladas.most_common(limite):
+            linhas.append(f"  {100 * self.proprias[funcao] / self.amostras:6.1f}%"
+                          f"  {100 * acumuladas / self.amostras:8.1f}%  {funcao}")
+        return '\n'.join(linhas)
@@ -0,0 +1,135 @@
+import argparse
+import os
+import re
+
+from database import get_db_connection
+
+# ==========================================
+# MIGRAÇÕES DO ESQUEMA
+# ==========================================
+
+# Cada arquivo em migrations/ é uma migração, aplicada em ordem pelo número do
+# nome (0001_..., 0002_...). A tabela schema_version registra quais já rodaram.
+# Rode no deploy (`python migrate.py`), nunca dentro de uma requisição.
+
+PASTA_MIGRACOES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+# Chave do advisory lock: garante que só um processo migra por vez
+CHAVE_LOCK = 7_311_042
+
+_NOME_MIGRACAO = re.compile(r'^(\d+)_(.+)\.sql$')
+
+def listar_migracoes():
+    """Retorna [(versao, nome, caminho)] em ordem crescente de versão."""
+    migracoes = []
+    for arquivo in os.listdir(PASTA_MIGRACOES):
+        encontrado = _NOME_MIGRACAO.match(arquivo)
+        if encontrado:
+            migracoes.append((int(encontrado.group(1)), encontrado.group(2),
+                              os.path.join(PASTA_MIGRACOES, arquivo)))
+    migracoes.sort()
+    versoes = [versao for versao, _, _ in migracoes]
+    if len(versoes) != len(set(versoes)):
+        raise RuntimeError("Há duas migrações com o mesmo número em migrations/.")
+    return migracoes
+
+def versao_esperada():
+    migracoes = listar_migracoes()
+    return migracoes[-1][0] if migracoes else 0
+
+def versao_atual(conn):
+    """Versão aplicada no banco (0 se a tabela schema_version ainda não existe)."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT to_regclass('schema_version') IS NOT NULL")
+    if not cursor.fetchone()[0]:
+        cursor.close()
+        return 0
+    cursor.execute("SELECT COALESCE(MAX(versao), 0) FROM schema_version")
+    versao = cursor.fetchone()[0]
+    cursor.close()
+    return versao
+
+def migrar():
+    """Aplica as migrações pendentes, cada uma na sua própria transação."""
+    print("🚀 Aplicando migrações do banco de dados PostgreSQL...")
+    conn = get_db_connection()
+    if not conn:
+        print("❌ Abortando: Não foi possível conectar ao banco de dados.")
+        return False
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT pg_advisory_lock(%s)", (CHAVE_LOCK,))
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                versao          INTEGER PRIMARY KEY,
+                nome            VARCHAR(255) NOT NULL,
+                aplicada_em     TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+        conn.commit()
+
+        # Lida só depois de pegar o lock: outro deploy pode ter acabado de migrar
+        atual = versao_atual(conn)
+        pendentes = [m for m in listar_migracoes() if m[0] > atual]
+        if not pendentes:
+            print(f"✅ Banco já está na versão {atual}.")
+        for versao, nome, caminho in pendentes:
+            print(f"📝 Aplicando {versao:04d}_{nome}...")
+            with open(caminho, encoding='utf-8') as arquivo:
+                sql = arquivo.read()
+            try:
+                cursor.execute(sql)
+                cursor.execute("INSERT INTO schema_version (versao, nome) VALUES (%s, %s)", (versao, nome))
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"❌ Erro na migração {versao:04d}_{nome}: {e}")
+                return False
+        if pendentes:
+            print(f"✅ Banco migrado para a versão {pendentes[-1][0]}.")
+        return True
+    except Exception as e:
+        print(f"❌ Erro ao aplicar migrações: {e}")
+        conn.rollback()
+        return False
+    finally:
+        try:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (CHAVE_LOCK,))
+            conn.commit()
+        except Exception:
+            pass
+        conn.close()
+
+def verificar_versao():
+    """Checagem barata para a inicialização do app: avisa se faltam migrações.
+
+    Retorna True quando o banco está na versão esperada.
+    """
+    conn = get_db_connection()
+    if not conn:
+        print("⚠️ Não foi possível verificar a versão do banco de dados.")
+        return False
+    try:
+        atual, esperada = versao_atual(conn), versao_esperada()
+    except Exception as e:
+        print(f"⚠️ Erro ao verificar a versão do banco de dados: {e}")
+        return False
+    finally:
+        conn.close()
+    if atual < esperada:
+        print(f"⚠️ Banco na versão {atual}, mas o código espera a {esperada}. Rode: python migrate.py")
+        return False
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aplica as migrações pendentes do banco de dados.")
+    parser.add_argument('--status', action='store_true', help="só mostra a versão atual e a esperada")
+    args = parser.parse_args()
+    if args.status:
+        conn = get_db_connection()
+        if not conn:
+            raise SystemExit(1)
+        print(f"Versão do banco: {versao_atual(conn)} | versão esperada: {versao_esperada()}")
+        conn.close()
+    else:
+        raise SystemExit(0 if migrar() else 1)
@@ -0,0 +1,40 @@
+-- Tabelas originais do Radar Pet. Tudo com IF NOT EXISTS: bancos criados
+-- antes do controle de versão passam por esta migração sem alterações.
+
+CREATE TABLE IF NOT EXISTS usuario (
+    id_usuario      INTEGER PRIMARY KEY GENERATED ALWAYS AS IDENTITY,
+    nome            VARCHAR(255) NOT NULL,
+    sobrenome       VARCHAR(255) NOT NULL,
+    e_mail          VARCHAR(100) NOT NULL UNIQUE,
+    telefone        VARCHAR(20) NOT NULL,
+    is_admin        BOOLEAN DEFAULT FALSE
+);
+
+-- Adiciona a coluna is_admin se ela não existir (para bancos de dados antigos)
+ALTER TABLE usuario ADD COLUMN IF NOT EXISTS is_admin BOOLEAN DEFAULT FALSE;
+
+CREATE TABLE IF NOT EXISTS pet (
+    id_pet              INTEGER PRIMARY KEY GENERATED ALWAYS AS IDENTITY,
+    nome                VARCHAR(100) NOT NULL,
+    especie             VARCHAR(30) NOT NULL CHECK (especie IN ('Cachorro', 'Gato', 'Outros')),
+    raca                VARCHAR(100) NULL,
+    situacao            VARCHAR(15) NOT NULL CHECK (situacao IN ('Achado', 'Perdido')),
+    foto                VARCHAR(255) NULL,
+    data                DATE NOT NULL,
+    sexo                VARCHAR(15) NOT NULL CHECK (sexo IN ('Macho', 'Fêmea')),
+    descricao           TEXT NOT NULL,
+    mensagem_dono       TEXT NULL,
+    nome_tutor          VARCHAR(255) NOT NULL,
+    telefone_tutor      VARCHAR(20) NOT NULL,
+    visto_em            VARCHAR(255) NOT NULL,
+    id_usuario          INTEGER NOT NULL,
+    FOREIGN KEY (id_usuario) REFERENCES usuario (id_usuario) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS denuncia (
+    id_denuncia     INTEGER PRIMARY KEY GENERATED ALWAYS AS IDENTITY,
+    id_pet          INTEGER NOT NULL REFERENCES pet(id_pet) ON DELETE CASCADE,
+    id_usuario      INTEGER NOT NULL REFERENCES usuario(id_usuario) ON DELETE CASCADE,
+    motivo          TEXT NOT NULL,
+    data_denuncia   TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,13 @@
+-- O feed é paginado por (data, id_pet); cada filtro tem um índice composto
+-- que termina nessas colunas, para que o custo por página não cresça com a tabela.
+
+CREATE INDEX IF NOT EXISTS idx_pet_feed
+    ON pet (data DESC, id_pet DESC);
+CREATE INDEX IF NOT EXISTS idx_pet_especie_feed
+    ON pet (especie, data DESC, id_pet DESC);
+CREATE INDEX IF NOT EXISTS idx_pet_situacao_feed
+    ON pet (situacao, data DESC, id_pet DESC);
+CREATE INDEX IF NOT EXISTS idx_pet_sexo_feed
+    ON pet (sexo, data DESC, id_pet DESC);
+CREATE INDEX IF NOT EXISTS idx_pet_especie_situacao_feed
+    ON pet (especie, situacao, data DESC, id_pet DESC);
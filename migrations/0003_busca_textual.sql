@@ -0,0 +1,37 @@
+-- Busca textual em nome, raça, local e descrição.
+-- Configuração 'portuguese' sem acentos: "São João" e "sao joao" viram os mesmos lexemas.
+
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'pt_unaccent') THEN
+        CREATE TEXT SEARCH CONFIGURATION pt_unaccent (COPY = portuguese);
+        ALTER TEXT SEARCH CONFIGURATION pt_unaccent
+            ALTER MAPPING FOR hword, hword_part, word WITH unaccent, portuguese_stem;
+    END IF;
+END$$;
+
+-- A coluna 'busca' é mantida pelo trigger; o nome pesa mais que raça/local, que pesam mais que a descrição
+ALTER TABLE pet ADD COLUMN IF NOT EXISTS busca tsvector;
+
+CREATE OR REPLACE FUNCTION pet_atualizar_busca() RETURNS trigger AS $$
+BEGIN
+    NEW.busca :=
+        setweight(to_tsvector('pt_unaccent', coalesce(NEW.nome, '')), 'A') ||
+        setweight(to_tsvector('pt_unaccent', coalesce(NEW.raca, '')), 'B') ||
+        setweight(to_tsvector('pt_unaccent', coalesce(NEW.visto_em, '')), 'B') ||
+        setweight(to_tsvector('pt_unaccent', coalesce(NEW.descricao, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_pet_busca ON pet;
+CREATE TRIGGER trg_pet_busca
+    BEFORE INSERT OR UPDATE OF nome, raca, descricao, visto_em ON pet
+    FOR EACH ROW EXECUTE PROCEDURE pet_atualizar_busca();
+
+-- Preenche as linhas que existiam antes do trigger
+UPDATE pet SET nome = nome WHERE busca IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_pet_busca ON pet USING GIN (busca);
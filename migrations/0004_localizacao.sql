@@ -0,0 +1,20 @@
+-- Localização opcional dos pets para a busca por raio.
+-- geohash com collation "C" permite buscar por prefixo usando o B-tree.
+
+ALTER TABLE pet ADD COLUMN IF NOT EXISTS latitude DOUBLE PRECISION NULL;
+ALTER TABLE pet ADD COLUMN IF NOT EXISTS longitude DOUBLE PRECISION NULL;
+ALTER TABLE pet ADD COLUMN IF NOT EXISTS geohash VARCHAR(12) COLLATE "C" NULL;
+
+CREATE INDEX IF NOT EXISTS idx_pet_geohash ON pet (geohash) WHERE geohash IS NOT NULL;
+
+-- Índice GiST com earthdistance quando as extensões existem; senão fica só o geohash
+DO $$
+BEGIN
+    CREATE EXTENSION IF NOT EXISTS cube;
+    CREATE EXTENSION IF NOT EXISTS earthdistance;
+    CREATE INDEX IF NOT EXISTS idx_pet_localizacao
+        ON pet USING GIST (ll_to_earth(latitude, longitude))
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL;
+EXCEPTION WHEN OTHERS THEN
+    RAISE NOTICE 'earthdistance indisponível (%), usando apenas geohash', SQLERRM;
+END$$;
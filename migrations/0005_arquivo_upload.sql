@@ -0,0 +1,7 @@
+-- Contagem de referências das fotos armazenadas por hash (ver storage.py)
+
+CREATE TABLE IF NOT EXISTS arquivo_upload (
+    caminho         VARCHAR(255) PRIMARY KEY,
+    referencias     INTEGER NOT NULL DEFAULT 0,
+    criado_em       TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
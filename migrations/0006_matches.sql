@@ -0,0 +1,17 @@
+-- Motor de correspondência entre pets perdidos e achados (ver matching.py).
+
+-- Índice de blocagem: os candidatos de um anúncio têm a mesma espécie e sexo,
+-- a situação oposta e uma data próxima, então a busca é uma faixa neste índice.
+CREATE INDEX IF NOT EXISTS idx_pet_bloco_match
+    ON pet (especie, sexo, situacao, data);
+
+CREATE TABLE IF NOT EXISTS pet_match (
+    id_perdido      INTEGER NOT NULL REFERENCES pet(id_pet) ON DELETE CASCADE,
+    id_achado       INTEGER NOT NULL REFERENCES pet(id_pet) ON DELETE CASCADE,
+    pontuacao       REAL NOT NULL,
+    criado_em       TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id_perdido, id_achado)
+);
+
+CREATE INDEX IF NOT EXISTS idx_pet_match_perdido ON pet_match (id_perdido, pontuacao DESC);
+CREATE INDEX IF NOT EXISTS idx_pet_match_achado ON pet_match (id_achado, pontuacao DESC);
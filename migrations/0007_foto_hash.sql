@@ -0,0 +1,4 @@
+-- Hash perceptual (dHash, 64 bits) da foto de cada pet, usado para achar fotos
+-- repetidas ou parecidas (ver phash.py). O índice de Hamming fica em memória.
+
+ALTER TABLE pet ADD COLUMN IF NOT EXISTS foto_hash BIGINT NULL;
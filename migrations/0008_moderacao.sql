@@ -0,0 +1,34 @@
+-- Fila de moderação: denúncias agrupadas por pet (ver Denuncia.fila_moderacao).
+
+-- Anúncios escondidos (por excesso de denúncias) saem do feed, da busca e das correspondências.
+ALTER TABLE pet ADD COLUMN IF NOT EXISTS oculto BOOLEAN NOT NULL DEFAULT FALSE;
+
+-- Denúncias mais recentes de um pet e "este usuário já denunciou este pet?"
+CREATE INDEX IF NOT EXISTS idx_denuncia_pet_data ON denuncia (id_pet, data_denuncia DESC);
+CREATE INDEX IF NOT EXISTS idx_denuncia_pet_usuario ON denuncia (id_pet, id_usuario);
+
+-- Contadores por pet, atualizados por Denuncia.salvar na mesma transação da denúncia.
+-- A fila lê só esta tabela, sem agregar a tabela denuncia a cada página.
+CREATE TABLE IF NOT EXISTS denuncia_resumo (
+    id_pet                  INTEGER PRIMARY KEY REFERENCES pet(id_pet) ON DELETE CASCADE,
+    total                   INTEGER NOT NULL DEFAULT 0,
+    denunciantes            INTEGER NOT NULL DEFAULT 0,
+    primeira                TIMESTAMP WITH TIME ZONE NOT NULL,
+    ultima                  TIMESTAMP WITH TIME ZONE NOT NULL,
+    -- Aguardando um administrador (volta a TRUE quando chega uma denúncia nova)
+    pendente                BOOLEAN NOT NULL DEFAULT TRUE,
+    -- Denunciantes já vistos na última revisão; o limite de ocultação conta a partir daqui
+    denunciantes_revisados  INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT INTO denuncia_resumo (id_pet, total, denunciantes, primeira, ultima)
+SELECT id_pet, COUNT(*), COUNT(DISTINCT id_usuario), MIN(data_denuncia), MAX(data_denuncia)
+FROM denuncia
+GROUP BY id_pet
+ON CONFLICT (id_pet) DO NOTHING;
+
+-- Paginação por cursor da fila, nas duas ordenações
+CREATE INDEX IF NOT EXISTS idx_denuncia_resumo_contagem
+    ON denuncia_resumo (total DESC, id_pet DESC) WHERE pendente;
+CREATE INDEX IF NOT EXISTS idx_denuncia_resumo_recentes
+    ON denuncia_resumo (ultima DESC, id_pet DESC) WHERE pendente;
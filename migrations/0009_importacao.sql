@@ -0,0 +1,9 @@
+-- Importação em lote de parceiros (abrigos, controle de zoonoses), ver importacao.py.
+-- 'origem' identifica o parceiro e 'id_externo' o código do animal no sistema dele:
+-- reimportar o mesmo arquivo atualiza os anúncios em vez de duplicá-los.
+
+ALTER TABLE pet ADD COLUMN IF NOT EXISTS origem VARCHAR(50) NULL;
+ALTER TABLE pet ADD COLUMN IF NOT EXISTS id_externo VARCHAR(100) NULL;
+
+-- Anúncios feitos pelo site têm origem NULL e nunca conflitam entre si
+CREATE UNIQUE INDEX IF NOT EXISTS idx_pet_origem_externo ON pet (origem, id_externo);
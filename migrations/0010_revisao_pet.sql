@@ -0,0 +1,19 @@
+-- Revisão de cada anúncio, incrementada a cada alteração da linha.
+-- O HTML do card do pet fica em cache pela chave (id_pet, revisao): qualquer
+-- mudança gera uma chave nova e o card antigo simplesmente deixa de ser usado.
+
+ALTER TABLE pet ADD COLUMN IF NOT EXISTS revisao INTEGER NOT NULL DEFAULT 1;
+
+CREATE OR REPLACE FUNCTION pet_incrementar_revisao() RETURNS trigger AS $$
+BEGIN
+    NEW.revisao := OLD.revisao + 1;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_pet_revisao ON pet;
+CREATE TRIGGER trg_pet_revisao
+    BEFORE UPDATE ON pet
+    FOR EACH ROW
+    WHEN (OLD.* IS DISTINCT FROM NEW.*)
+    EXECUTE PROCEDURE pet_incrementar_revisao();
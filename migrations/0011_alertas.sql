@@ -0,0 +1,58 @@
+-- Alertas: o usuário descreve o animal que procura (espécie, sexo, raça, área
+-- e período) e é avisado quando um anúncio compatível é publicado (ver alertas.py).
+
+CREATE TABLE IF NOT EXISTS alerta (
+    id_alerta       INTEGER PRIMARY KEY GENERATED ALWAYS AS IDENTITY,
+    id_usuario      INTEGER NOT NULL REFERENCES usuario(id_usuario) ON DELETE CASCADE,
+    -- Situação dos anúncios que interessam: quem perdeu o animal quer os 'Achado'
+    situacao        VARCHAR(15) NOT NULL DEFAULT 'Achado' CHECK (situacao IN ('Achado', 'Perdido')),
+    especie         VARCHAR(30) NOT NULL CHECK (especie IN ('Cachorro', 'Gato', 'Outros')),
+    sexo            VARCHAR(15) NULL CHECK (sexo IN ('Macho', 'Fêmea')),
+    raca            VARCHAR(100) NULL,
+    -- Área opcional: centro e raio
+    latitude        DOUBLE PRECISION NULL,
+    longitude       DOUBLE PRECISION NULL,
+    raio_km         REAL NULL,
+    -- Período opcional, comparado com a data do anúncio
+    data_inicio     DATE NULL,
+    data_fim        DATE NULL,
+    ativo           BOOLEAN NOT NULL DEFAULT TRUE,
+    criado_em       TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    CHECK ((latitude IS NULL) = (raio_km IS NULL))
+);
+
+CREATE INDEX IF NOT EXISTS idx_alerta_usuario ON alerta (id_usuario, id_alerta DESC);
+
+-- Índice invertido: uma linha por (situacao, especie, sexo, célula) de cada alerta.
+-- sexo '*' vale para os dois; célula é um prefixo de geohash que cobre a área
+-- do alerta, ou '*' para alertas sem área. Um anúncio novo encontra os alertas
+-- candidatos procurando pelos prefixos do próprio geohash, sem varrer a tabela alerta.
+CREATE TABLE IF NOT EXISTS alerta_indice (
+    situacao        VARCHAR(15) NOT NULL,
+    especie         VARCHAR(30) NOT NULL,
+    sexo            VARCHAR(15) NOT NULL,
+    celula          VARCHAR(12) COLLATE "C" NOT NULL,
+    id_alerta       INTEGER NOT NULL REFERENCES alerta(id_alerta) ON DELETE CASCADE,
+    PRIMARY KEY (situacao, especie, sexo, celula, id_alerta)
+);
+
+CREATE INDEX IF NOT EXISTS idx_alerta_indice_alerta ON alerta_indice (id_alerta);
+
+-- Outbox: os avisos são gravados aqui e enviados depois, por `python alertas.py`.
+-- O UNIQUE garante um aviso só por alerta e anúncio, mesmo se o anúncio for reprocessado.
+CREATE TABLE IF NOT EXISTS notificacao_outbox (
+    id_notificacao  BIGINT PRIMARY KEY GENERATED ALWAYS AS IDENTITY,
+    id_alerta       INTEGER NOT NULL REFERENCES alerta(id_alerta) ON DELETE CASCADE,
+    id_usuario      INTEGER NOT NULL REFERENCES usuario(id_usuario) ON DELETE CASCADE,
+    id_pet          INTEGER NOT NULL REFERENCES pet(id_pet) ON DELETE CASCADE,
+    criado_em       TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    enviado_em      TIMESTAMP WITH TIME ZONE NULL,
+    tentativas      INTEGER NOT NULL DEFAULT 0,
+    erro            TEXT NULL,
+    UNIQUE (id_alerta, id_pet)
+);
+
+CREATE INDEX IF NOT EXISTS idx_outbox_pendentes
+    ON notificacao_outbox (id_notificacao) WHERE enviado_em IS NULL;
+CREATE INDEX IF NOT EXISTS idx_outbox_usuario
+    ON notificacao_outbox (id_usuario, id_notificacao DESC);
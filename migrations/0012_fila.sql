@@ -0,0 +1,26 @@
+-- Fila de tarefas em segundo plano (ver fila.py).
+--
+-- Uma tarefa pendente espera até executar_em. Ao ser pega por um worker ela
+-- passa a 'executando' e executar_em vira o prazo da execução: se o worker
+-- morrer no meio, a tarefa volta a ser pega quando o prazo vencer. Concluída,
+-- a linha é apagada; esgotadas as tentativas, fica como 'morta' com o último erro.
+
+CREATE TABLE IF NOT EXISTS tarefa (
+    id_tarefa       BIGINT PRIMARY KEY GENERATED ALWAYS AS IDENTITY,
+    tipo            VARCHAR(100) NOT NULL,
+    argumentos      JSONB NOT NULL DEFAULT '{}',
+    estado          VARCHAR(15) NOT NULL DEFAULT 'pendente'
+                    CHECK (estado IN ('pendente', 'executando', 'morta')),
+    tentativas      INTEGER NOT NULL DEFAULT 0,
+    max_tentativas  INTEGER NOT NULL DEFAULT 5,
+    executar_em     TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    criada_em       TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    iniciada_em     TIMESTAMP WITH TIME ZONE NULL,
+    erro            TEXT NULL
+);
+
+-- Só as tarefas que ainda podem rodar entram no índice: as mortas não atrapalham a busca
+CREATE INDEX IF NOT EXISTS idx_tarefa_proximas
+    ON tarefa (executar_em) WHERE estado IN ('pendente', 'executando');
+CREATE INDEX IF NOT EXISTS idx_tarefa_mortas
+    ON tarefa (tipo, id_tarefa) WHERE estado = 'morta';
@@ -0,0 +1,75 @@
+-- Ciclo de vida dos anúncios (ver arquivo.py).
+--
+-- Todo anúncio nasce 'ativo'. O dono pode marcá-lo como 'resolvido', e o que
+-- fica PET_EXPIRA_DIAS ativo sem ser renovado passa a 'expirado'. status_em
+-- guarda quando o status mudou pela última vez.
+--
+-- O feed e a busca só olham os ativos, então os índices deles passam a ser
+-- parciais: o tamanho deles (e a latência) acompanha os anúncios ativos, não
+-- todo o histórico. Encerrados há mais de ARQUIVO_APOS_DIAS saem da tabela pet
+-- e vão para pet_arquivo, particionada por ano da data do anúncio.
+
+ALTER TABLE pet ADD COLUMN IF NOT EXISTS status VARCHAR(15) NOT NULL DEFAULT 'ativo'
+    CHECK (status IN ('ativo', 'resolvido', 'expirado'));
+ALTER TABLE pet ADD COLUMN IF NOT EXISTS status_em TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP;
+
+-- Anúncios antigos contam a validade a partir da data do anúncio, não da migração
+UPDATE pet SET status_em = data WHERE status_em > data;
+
+-- Índices do feed só com os anúncios visíveis
+DROP INDEX IF EXISTS idx_pet_feed;
+DROP INDEX IF EXISTS idx_pet_especie_feed;
+DROP INDEX IF EXISTS idx_pet_situacao_feed;
+DROP INDEX IF EXISTS idx_pet_sexo_feed;
+DROP INDEX IF EXISTS idx_pet_especie_situacao_feed;
+
+CREATE INDEX IF NOT EXISTS idx_pet_feed_ativo
+    ON pet (data DESC, id_pet DESC) WHERE status = 'ativo' AND NOT oculto;
+CREATE INDEX IF NOT EXISTS idx_pet_especie_feed_ativo
+    ON pet (especie, data DESC, id_pet DESC) WHERE status = 'ativo' AND NOT oculto;
+CREATE INDEX IF NOT EXISTS idx_pet_situacao_feed_ativo
+    ON pet (situacao, data DESC, id_pet DESC) WHERE status = 'ativo' AND NOT oculto;
+CREATE INDEX IF NOT EXISTS idx_pet_sexo_feed_ativo
+    ON pet (sexo, data DESC, id_pet DESC) WHERE status = 'ativo' AND NOT oculto;
+CREATE INDEX IF NOT EXISTS idx_pet_especie_situacao_feed_ativo
+    ON pet (especie, situacao, data DESC, id_pet DESC) WHERE status = 'ativo' AND NOT oculto;
+
+-- Feed de resolvidos/expirados (pouco usado) e as varreduras do job de arquivamento
+CREATE INDEX IF NOT EXISTS idx_pet_status
+    ON pet (status, status_em);
+CREATE INDEX IF NOT EXISTS idx_pet_status_feed
+    ON pet (status, data DESC, id_pet DESC) WHERE status <> 'ativo';
+
+DROP INDEX IF EXISTS idx_pet_busca;
+CREATE INDEX IF NOT EXISTS idx_pet_busca_ativo
+    ON pet USING GIN (busca) WHERE status = 'ativo' AND NOT oculto;
+
+-- Arquivo: mesmas colunas do anúncio (menos a busca textual), sem chaves
+-- estrangeiras. A chave primária inclui a data porque ela é a chave de partição.
+-- As partições anuais são criadas pelo job de arquivamento quando precisa delas.
+CREATE TABLE IF NOT EXISTS pet_arquivo (
+    id_pet              INTEGER NOT NULL,
+    nome                VARCHAR(100) NOT NULL,
+    especie             VARCHAR(30) NOT NULL,
+    raca                VARCHAR(100) NULL,
+    situacao            VARCHAR(15) NOT NULL,
+    foto                VARCHAR(255) NULL,
+    data                DATE NOT NULL,
+    sexo                VARCHAR(15) NOT NULL,
+    descricao           TEXT NOT NULL,
+    mensagem_dono       TEXT NULL,
+    nome_tutor          VARCHAR(255) NOT NULL,
+    telefone_tutor      VARCHAR(20) NOT NULL,
+    visto_em            VARCHAR(255) NOT NULL,
+    id_usuario          INTEGER NOT NULL,
+    latitude            DOUBLE PRECISION NULL,
+    longitude           DOUBLE PRECISION NULL,
+    oculto              BOOLEAN NOT NULL DEFAULT FALSE,
+    status              VARCHAR(15) NOT NULL,
+    status_em           TIMESTAMP WITH TIME ZONE NOT NULL,
+    arquivado_em        TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id_pet, data)
+) PARTITION BY RANGE (data);
+
+CREATE INDEX IF NOT EXISTS idx_pet_arquivo_id ON pet_arquivo (id_pet);
+CREATE INDEX IF NOT EXISTS idx_pet_arquivo_usuario ON pet_arquivo (id_usuario);
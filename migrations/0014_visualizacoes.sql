@@ -0,0 +1,18 @@
+-- Visualizações dos anúncios (ver visualizacoes.py).
+--
+-- Os acessos a /verpet/<id> são somados em memória por processo e gravados
+-- aqui em lote, a cada poucos segundos. `total` é a contagem acumulada e
+-- `tendencia` um placar que perde metade do peso a cada VISUALIZACOES_MEIA_VIDA_HORAS.
+-- O placar fica guardado em escala logarítmica e relativo a uma data fixa:
+-- visualizações recentes valem mais sem que seja preciso reduzir as antigas, e
+-- placares gravados em momentos diferentes continuam comparáveis (e indexáveis).
+
+CREATE TABLE IF NOT EXISTS pet_visualizacao (
+    id_pet          INTEGER PRIMARY KEY REFERENCES pet(id_pet) ON DELETE CASCADE,
+    total           BIGINT NOT NULL DEFAULT 0,
+    tendencia       DOUBLE PRECISION NOT NULL,
+    atualizado_em   TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_pet_visualizacao_tendencia ON pet_visualizacao (tendencia DESC, id_pet DESC);
+CREATE INDEX IF NOT EXISTS idx_pet_visualizacao_total ON pet_visualizacao (total DESC, id_pet DESC);
@@ -0,0 +1,8 @@
+-- Índices da foto dos anúncios, usados pela limpeza de uploads (ver limpeza_uploads.py).
+--
+-- A limpeza confere os arquivos de static/uploads em lotes (foto = ANY(...))
+-- e lista as fotos referenciadas em ordem, com um cursor no servidor. Sem
+-- estes índices, cada lote seria uma varredura completa de pet e de pet_arquivo.
+
+CREATE INDEX IF NOT EXISTS idx_pet_foto ON pet (foto) WHERE foto IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_pet_arquivo_foto ON pet_arquivo (foto) WHERE foto IS NOT NULL;
@@ -0,0 +1,9 @@
+-- Reserva dos avisos da outbox (ver alertas.despachar).
+--
+-- O worker reserva um lote numa transação curta (reservado_por/reservado_ate)
+-- e envia os e-mails fora dela, gravando cada envio na hora. Se ele morrer no
+-- meio do lote, os avisos já enviados continuam marcados e os demais voltam a
+-- ficar disponíveis quando a reserva vence.
+
+ALTER TABLE notificacao_outbox ADD COLUMN IF NOT EXISTS reservado_por UUID NULL;
+ALTER TABLE notificacao_outbox ADD COLUMN IF NOT EXISTS reservado_ate TIMESTAMP WITH TIME ZONE NULL;
@@ -0,0 +1,9 @@
+-- Blocagem por local no motor de correspondência (ver matching._candidatos).
+--
+-- Os candidatos próximos do pet são buscados primeiro, por faixas de prefixo
+-- de geohash dentro do bloco (especie, sexo, situacao). A data fica no fim do
+-- índice para o filtro da janela ser resolvido sem ler a tabela.
+
+CREATE INDEX IF NOT EXISTS idx_pet_bloco_match_local
+    ON pet (especie, sexo, situacao, geohash, data)
+    WHERE geohash IS NOT NULL AND status = 'ativo' AND NOT oculto;
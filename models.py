@@ -1,5 +1,165 @@
-from database import get_db_connection
-from psycopg2.extras import RealDictCursor # Facilita o trabalho com os resultados como se fossem dicionários
+import base64
+import hashlib
+from datetime import date, datetime
+
+import alertas
+import eventos
+import geo
+import matching
+import metricas
+import phash
+from cache import cache
+from config import Config
+from database import db_connection, executar_preparado
+from storage import agendar_remocao
+from psycopg2.extras import RealDictCursor, execute_values # Facilita o trabalho com os resultados como se fossem dicionários
+
+# ==========================================
+# PAGINAÇÃO POR CURSOR (KEYSET)
+# ==========================================
+
+# O feed é ordenado por (data, id_pet) decrescente. O cursor guarda a chave do
+# último item da página, e a próxima página começa logo "abaixo" dela, o que
+# usa o índice em vez de um OFFSET que precisaria pular todas as linhas anteriores.
+# A mesma ideia serve para outras ordenações (ex: fila de moderação por contagem),
+# então o cursor guarda também o tipo do valor.
+
+_TIPOS_CURSOR = {
+    'd': (date, date.fromisoformat),
+    't': (datetime, datetime.fromisoformat),
+    'i': (int, int),
+    'f': (float, float),
+}
+
+def codificar_cursor(valor, id_pet):
+    # datetime antes de date: todo datetime também é um date
+    for tag in ('t', 'd', 'i', 'f'):
+        if isinstance(valor, _TIPOS_CURSOR[tag][0]):
+            break
+    else:
+        raise TypeError(f"Tipo de cursor não suportado: {type(valor).__name__}")
+    texto = valor.isoformat() if tag in ('d', 't') else repr(valor)
+    chave = f"{tag}:{texto}|{id_pet}"
+    return base64.urlsafe_b64encode(chave.encode()).decode().rstrip('=')
+
+def decodificar_cursor(cursor, tag_esperada=None):
+    """Converte o cursor recebido na URL em (valor, id_pet). Lança ValueError se for inválido.
+
+    Com `tag_esperada`, um cursor de outra ordenação (ex: uma data vinda do feed
+    por recentes numa página por visualizações) também é inválido.
+    """
+    try:
+        preenchimento = '=' * (-len(cursor) % 4)
+        chave = base64.urlsafe_b64decode(cursor + preenchimento).decode()
+        valor_str, id_str = chave.rsplit('|', 1)
+        tag, texto = valor_str.split(':', 1)
+        if tag_esperada is not None and tag != tag_esperada:
+            raise ValueError(tag)
+        return _TIPOS_CURSOR[tag][1](texto), int(id_str)
+    except Exception:
+        raise ValueError('Cursor inválido')
+
+# Colunas devolvidas nas consultas de pet. A coluna 'busca' (tsvector) fica de fora:
+# ela só serve para a busca textual e deixaria as linhas (e o cache) bem maiores.
+COLUNAS_PET = """
+    p.id_pet, p.nome, p.especie, p.raca, p.situacao, p.foto, p.data, p.sexo,
+    p.descricao, p.mensagem_dono, p.nome_tutor, p.telefone_tutor, p.visto_em,
+    p.id_usuario, p.latitude, p.longitude, p.oculto, p.revisao, p.status, u.nome AS nome_usuario
+"""
+
+# Ciclo de vida dos anúncios (ver arquivo.py)
+STATUS_PET = ('ativo', 'resolvido', 'expirado')
+
+# Ordenações do feed: nome -> (junção extra, coluna de ordenação, id de desempate,
+# tipo do valor no cursor).
+# As de popularidade só incluem anúncios que já tiveram alguma visualização,
+# e percorrem os índices de pet_visualizacao (ver visualizacoes.py).
+ORDENS_FEED = {
+    'recentes': ('', 'p.data', 'p.id_pet', 'd'),
+    'tendencia': ('JOIN pet_visualizacao v ON v.id_pet = p.id_pet', 'v.tendencia', 'v.id_pet', 'f'),
+    'mais_vistos': ('JOIN pet_visualizacao v ON v.id_pet = p.id_pet', 'v.total', 'v.id_pet', 'i'),
+}
+
+# Campos das respostas da API -> expressão SQL que já os entrega no formato final.
+# Usado pelo modo streaming do feed, que não passa os pets por pet_para_json.
+CAMPOS_JSON = {
+    'id': "p.id_pet",
+    'nome': "p.nome",
+    'especie': "p.especie",
+    'raca': "p.raca",
+    'situacao': "p.situacao",
+    'foto': "COALESCE(p.foto, 'default-pet.jpg')",
+    'data': "COALESCE(to_char(p.data, 'DD/MM/YYYY'), '')",
+    'sexo': "p.sexo",
+    'descricao': "p.descricao",
+    'mensagem_dono': "p.mensagem_dono",
+    'nome_tutor': "p.nome_tutor",
+    'telefone_tutor': "p.telefone_tutor",
+    'visto_em': "p.visto_em",
+    'nome_usuario': "COALESCE(u.nome, '')",
+    'latitude': "p.latitude",
+    'longitude': "p.longitude",
+    'status': "p.status",
+    # O srcset depende dos arquivos em disco: o banco entrega o nome da foto e a rota completa
+    'foto_srcset': "p.foto",
+}
+
+# ==========================================
+# BUSCA POR RAIO
+# ==========================================
+
+_tem_earthdistance = None
+
+def usa_earthdistance():
+    """Verifica (uma vez por processo) se o índice GiST de earthdistance foi criado."""
+    global _tem_earthdistance
+    if _tem_earthdistance is None:
+        try:
+            with db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1 FROM pg_indexes WHERE indexname = 'idx_pet_localizacao'")
+                _tem_earthdistance = cursor.fetchone() is not None
+                cursor.close()
+        except Exception as e:
+            print(f"Erro ao verificar earthdistance: {e}")
+            return False
+    return _tem_earthdistance
+
+def condicao_raio(latitude, longitude, raio_km):
+    """Condição SQL (e parâmetros) para pets a até `raio_km` do ponto.
+
+    Com earthdistance, o earth_box usa o índice GiST; sem ele, as células de
+    geohash que cobrem o raio viram faixas no índice B-tree. Nos dois casos a
+    distância exata é conferida depois, só nas linhas que passaram pelo índice.
+    """
+    if usa_earthdistance():
+        condicao = """(
+            earth_box(ll_to_earth(%s, %s), %s) @> ll_to_earth(p.latitude, p.longitude)
+            AND earth_distance(ll_to_earth(%s, %s), ll_to_earth(p.latitude, p.longitude)) <= %s
+        )"""
+        metros = raio_km * 1000
+        return condicao, [latitude, longitude, metros, latitude, longitude, metros]
+
+    faixas = []
+    params = []
+    for celula in geo.celulas_cobrindo(latitude, longitude, raio_km):
+        # Todos os caracteres do base32 do geohash são menores que '~'
+        faixas.append("(p.geohash >= %s AND p.geohash < %s)")
+        params.extend([celula, celula + '~'])
+    condicao = f"""(
+        ({' OR '.join(faixas)})
+        AND 2 * {geo.RAIO_TERRA_KM} * asin(least(1.0, sqrt(
+            power(sin(radians(p.latitude - %s) / 2), 2)
+            + cos(radians(%s)) * cos(radians(p.latitude))
+              * power(sin(radians(p.longitude - %s) / 2), 2)
+        ))) <= %s
+    )"""
+    params.extend([latitude, latitude, longitude, raio_km])
+    return condicao, params
+
+class EmailJaCadastradoError(Exception):
+    """Já existe um usuário com este e-mail."""
+
 
 class Usuario:
     # CORREÇÃO: O construtor agora aceita 'e_mail' para corresponder à coluna do banco de dados.
@@ -11,53 +171,61 @@ class Usuario:
         self.telefone = telefone
         self.is_admin = is_admin
     
+    @metricas.medir_sql('usuario.salvar')
     def salvar(self):
-        conn = get_db_connection()
-        if conn:
-            try:
+        """Cadastra o usuário e preenche id_usuario/is_admin, numa única ida ao banco.
+
+        Lança EmailJaCadastradoError se o e-mail já existe; outros erros retornam None.
+        """
+        try:
+            with db_connection() as conn:
                 cursor = conn.cursor()
-                # A coluna no banco é 'e_mail'
+                # A coluna no banco é 'e_mail'. O UNIQUE do e-mail decide se o cadastro é novo,
+                # sem um SELECT antes (que ainda deixaria dois cadastros simultâneos passarem)
                 sql_query = """
                     INSERT INTO usuario (nome, sobrenome, e_mail, telefone)
-                    VALUES (%s, %s, %s, %s) RETURNING id_usuario
+                    VALUES (%s, %s, %s, %s)
+                    ON CONFLICT (e_mail) DO NOTHING
+                    RETURNING id_usuario, is_admin
                 """
-                cursor.execute(sql_query, (self.nome, self.sobrenome, self.email, self.telefone))
-                user_id = cursor.fetchone()[0]
+                executar_preparado(cursor, sql_query, (self.nome, self.sobrenome, self.email, self.telefone))
+                linha = cursor.fetchone()
                 conn.commit()
                 cursor.close()
-                conn.close()
-                return user_id
-            except Exception as e:
-                print(f"Erro ao salvar usuário: {e}")
-                if conn: conn.close()
-                return None
-        return None
+        except Exception as e:
+            print(f"Erro ao salvar usuário: {e}")
+            return None
+        if linha is None:
+            raise EmailJaCadastradoError(self.email)
+        self.id_usuario, self.is_admin = linha
+        return self.id_usuario
     
     @staticmethod
+    @metricas.medir_sql('usuario.buscar_por_email')
     def buscar_por_email(email):
-        conn = get_db_connection()
-        if conn:
-            try:
+        try:
+            with db_connection(leitura=True) as conn:
                 cursor = conn.cursor(cursor_factory=RealDictCursor)
                 # A busca é feita na coluna 'e_mail'
-                cursor.execute("SELECT * FROM usuario WHERE e_mail = %s", (email,))
+                # Colunas explícitas: o plano preparado não quebra quando a tabela ganha colunas
+                executar_preparado(cursor, """
+                    SELECT id_usuario, nome, sobrenome, e_mail, telefone, is_admin
+                    FROM usuario WHERE e_mail = %s
+                """, (email,))
                 user_data = cursor.fetchone()
                 cursor.close()
-                conn.close()
                 if user_data:
                     # Retorna um objeto Usuario, que agora aceita 'e_mail'
                     return Usuario(**user_data)
                 return None
-            except Exception as e:
-                print(f"Erro ao buscar usuário: {e}")
-                if conn: conn.close()
-                return None
-        return None
+        except Exception as e:
+            print(f"Erro ao buscar usuário: {e}")
+            return None
 
 class Pet:
     def __init__(self, nome, especie, raca, situacao, foto, data, sexo, 
                  descricao, mensagem_dono, nome_tutor, telefone_tutor, 
-                 visto_em, id_usuario, id_pet=None):
+                 visto_em, id_usuario, id_pet=None, latitude=None, longitude=None):
         self.id_pet = id_pet
         self.nome = nome
         self.especie = especie
@@ -72,95 +240,366 @@ class Pet:
         self.telefone_tutor = telefone_tutor
         self.visto_em = visto_em
         self.id_usuario = id_usuario
+        self.latitude = latitude
+        self.longitude = longitude
     
+    @metricas.medir_sql('pet.salvar')
     def salvar(self):
-        conn = get_db_connection()
-        if conn:
-            try:
+        try:
+            with db_connection() as conn:
                 cursor = conn.cursor()
                 sql_query = """
                     INSERT INTO pet (nome, especie, raca, situacao, foto, data, sexo, 
                                    descricao, mensagem_dono, nome_tutor, telefone_tutor, 
-                                   visto_em, id_usuario)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                                   visto_em, id_usuario, latitude, longitude, geohash)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                     RETURNING id_pet
                 """
+                geohash = None
+                if self.latitude is not None and self.longitude is not None:
+                    geohash = geo.geohash_encode(self.latitude, self.longitude)
                 params = (self.nome, self.especie, self.raca, self.situacao, self.foto, 
                           self.data, self.sexo, self.descricao,
                           self.mensagem_dono, self.nome_tutor, self.telefone_tutor, 
-                          self.visto_em, self.id_usuario)
-                cursor.execute(sql_query, params)
+                          self.visto_em, self.id_usuario, self.latitude, self.longitude, geohash)
+                executar_preparado(cursor, sql_query, params)
                 pet_id = cursor.fetchone()[0]
+                if self.foto:
+                    # Mais um pet usando esta foto (a mesma foto pode servir a vários anúncios)
+                    cursor.execute("""
+                        INSERT INTO arquivo_upload (caminho, referencias) VALUES (%s, 1)
+                        ON CONFLICT (caminho) DO UPDATE SET referencias = arquivo_upload.referencias + 1
+                    """, (self.foto,))
+                # Quem está com o feed aberto recebe o card novo (ver eventos.py)
+                eventos.notificar(cursor, 'novo', pet_id, data=self.data, especie=self.especie,
+                                  situacao=self.situacao, sexo=self.sexo)
+                # O resto vai para a fila de tarefas, na mesma transação do anúncio:
+                # procura anúncios da situação oposta que possam ser o mesmo animal,
+                # avisa quem tem um alerta compatível e calcula o hash da foto
+                matching.agendar(pet_id, cursor)
+                alertas.agendar(pet_id, cursor)
+                if self.foto:
+                    phash.agendar(pet_id, cursor)
                 conn.commit()
                 cursor.close()
-                conn.close()
+                Pet.invalidar_cache(pet_id)
                 return pet_id
-            except Exception as e:
-                print(f"Erro ao salvar pet: {e}")
-                if conn: conn.close()
-                return None
-        return None
+        except Exception as e:
+            print(f"Erro ao salvar pet: {e}")
+            return None
+    
+    @staticmethod
+    def listar_todos(limite=20, cursor=None, especie=None, situacao=None, sexo=None,
+                     data_inicio=None, data_fim=None, perto=None, status='ativo', ordem='recentes'):
+        """Retorna uma página do feed como (pets, proximo_cursor).
+
+        Os filtros são opcionais e cada um tem um índice composto
+        (filtro, data, id_pet) criado em init_db. `perto` é uma tupla
+        (latitude, longitude, raio_km). proximo_cursor é None na última página.
+        Por padrão só os anúncios ativos, que são os que estão nesses índices.
+        `ordem` é uma das chaves de ORDENS_FEED.
+        """
+        if ordem not in ORDENS_FEED:
+            raise ValueError(f"Ordem inválida: use {', '.join(ORDENS_FEED)}.")
+        juncao, coluna, desempate, tag_cursor = ORDENS_FEED[ordem]
+        condicoes, params = Pet._filtros_feed(especie, situacao, sexo, data_inicio, data_fim, perto, status)
+        if cursor:
+            cursor_valor, cursor_id = decodificar_cursor(cursor, tag_cursor)
+            condicoes.append(f"({coluna}, {desempate}) < (%s, %s)")
+            params.extend([cursor_valor, cursor_id])
+
+        where = f"{juncao} WHERE {' AND '.join(condicoes)}"
+        # Busca um item a mais só para saber se existe uma próxima página
+        params.append(limite + 1)
+
+        # As páginas ficam em cache até a próxima escrita em pet (que avança a geração).
+        # As de popularidade mudam sem escrita em pet e ficam no máximo CACHE_TTL desatualizadas
+        assinatura = hashlib.sha1(repr((ordem, where, params)).encode()).hexdigest()
+        chave = f"pets:lista:{cache.geracao('pets:lista')}:{assinatura}"
+        try:
+            return cache.get_or_set(
+                chave, lambda: Pet._buscar_pagina(where, params, limite, coluna, desempate)
+            )
+        except Exception as e:
+            print(f"Erro ao listar pets: {e}")
+            return [], None
+
+    @staticmethod
+    def _filtros_feed(especie=None, situacao=None, sexo=None, data_inicio=None, data_fim=None,
+                      perto=None, status='ativo'):
+        """Condições do WHERE do feed e seus parâmetros."""
+        if status not in STATUS_PET:
+            raise ValueError(f"Status inválido: use {', '.join(STATUS_PET)}.")
+        # Anúncios escondidos pela moderação nunca aparecem no feed. O status vai
+        # como literal (já validado): com parâmetro, o plano genérico do prepared
+        # statement não saberia que pode usar os índices parciais de status = 'ativo'
+        condicoes = ["NOT p.oculto", f"p.status = '{status}'"]
+        params = []
+        for coluna, valor in (('especie', especie), ('situacao', situacao), ('sexo', sexo)):
+            if valor:
+                condicoes.append(f"p.{coluna} = %s")
+                params.append(valor)
+        if data_inicio:
+            condicoes.append("p.data >= %s")
+            params.append(data_inicio)
+        if data_fim:
+            condicoes.append("p.data <= %s")
+            params.append(data_fim)
+        if perto:
+            condicao, params_raio = condicao_raio(*perto)
+            condicoes.append(condicao)
+            params.extend(params_raio)
+        return condicoes, params
+
+    @staticmethod
+    def iterar_feed(campos, especie=None, situacao=None, sexo=None, data_inicio=None,
+                    data_fim=None, perto=None, status='ativo', lote=500):
+        """Gera todos os pets do feed (sem paginação) como dicts já no formato da API.
+
+        Lê de um cursor no servidor, `lote` linhas por vez, e só as colunas de
+        `campos` (chaves de CAMPOS_JSON): a memória usada não cresce com o
+        tamanho da tabela. Erros sobem para quem está consumindo o gerador.
+        """
+        condicoes, params = Pet._filtros_feed(especie, situacao, sexo, data_inicio, data_fim, perto, status)
+        colunas = ', '.join(CAMPOS_JSON[campo] for campo in campos)
+        with db_connection(leitura=True) as conn:
+            cursor = conn.cursor(name='feed_streaming')
+            cursor.itersize = lote
+            cursor.execute(f"""
+                SELECT {colunas}
+                FROM pet p
+                JOIN usuario u ON p.id_usuario = u.id_usuario
+                WHERE {' AND '.join(condicoes)}
+                ORDER BY p.data DESC, p.id_pet DESC
+            """, params)
+            for linha in cursor:
+                yield dict(zip(campos, linha))
+            cursor.close()
+
+    @staticmethod
+    @metricas.medir_sql('pet.feed')
+    def _buscar_pagina(where, params, limite, coluna='p.data', desempate='p.id_pet'):
+        # Erros sobem para quem chamou, assim uma falha não fica guardada no cache
+        with db_connection(leitura=True) as conn:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            executar_preparado(cur, f"""
+                SELECT {COLUNAS_PET}, {coluna} AS valor_ordem
+                FROM pet p 
+                JOIN usuario u ON p.id_usuario = u.id_usuario
+                {where}
+                ORDER BY {coluna} DESC, {desempate} DESC
+                LIMIT %s
+            """, params)
+            pets = [dict(pet) for pet in cur.fetchall()]
+            cur.close()
+
+        proximo_cursor = None
+        if len(pets) > limite:
+            pets = pets[:limite]
+            ultimo = pets[-1]
+            proximo_cursor = codificar_cursor(ultimo['valor_ordem'], ultimo['id_pet'])
+        for pet in pets:
+            del pet['valor_ordem']
+        return pets, proximo_cursor
     
     @staticmethod
-    def listar_todos():
-        conn = get_db_connection()
-        if conn:
-            try:
+    def buscar_texto(termo, limite=20, pagina=1, max_candidatos=2000):
+        """Busca textual ranqueada em nome, raça, descrição e local. Retorna (pets, tem_mais).
+
+        O ranking é calculado sobre os `max_candidatos` resultados mais recentes
+        que casam com o termo: termos muito comuns ("cachorro") não obrigam o
+        banco a ranquear a tabela inteira a cada página.
+        """
+        offset = (pagina - 1) * limite
+        params = (termo, max_candidatos, limite + 1, offset)
+        chave = "pets:busca:{}:{}".format(
+            cache.geracao('pets:lista'), hashlib.sha1(repr(params).encode()).hexdigest()
+        )
+        try:
+            pets = cache.get_or_set(chave, lambda: Pet._buscar_texto_db(params))
+        except Exception as e:
+            print(f"Erro na busca de pets: {e}")
+            return [], False
+        return pets[:limite], len(pets) > limite
+
+    @staticmethod
+    @metricas.medir_sql('pet.busca_texto')
+    def _buscar_texto_db(params):
+        with db_connection(leitura=True) as conn:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            executar_preparado(cursor, f"""
+                WITH consulta AS (
+                    SELECT websearch_to_tsquery('pt_unaccent', %s) AS q
+                ),
+                candidatos AS (
+                    SELECT p.id_pet, ts_rank_cd(p.busca, consulta.q) AS relevancia
+                    FROM pet p, consulta
+                    WHERE p.busca @@ consulta.q AND p.status = 'ativo' AND NOT p.oculto
+                    ORDER BY p.data DESC, p.id_pet DESC
+                    LIMIT %s
+                )
+                SELECT {COLUNAS_PET}, c.relevancia
+                FROM candidatos c
+                JOIN pet p ON p.id_pet = c.id_pet
+                JOIN usuario u ON p.id_usuario = u.id_usuario
+                ORDER BY c.relevancia DESC, p.data DESC, p.id_pet DESC
+                LIMIT %s OFFSET %s
+            """, params)
+            pets = [dict(pet) for pet in cursor.fetchall()]
+            cursor.close()
+            return pets
+
+    @staticmethod
+    def buscar_por_id(pet_id):
+        try:
+            return cache.get_or_set(f"pets:id:{pet_id}", lambda: Pet._buscar_por_id_db(pet_id))
+        except Exception as e:
+            print(f"Erro ao buscar pet: {e}")
+            return None
+
+    @staticmethod
+    @metricas.medir_sql('pet.buscar_por_id')
+    def _buscar_por_id_db(pet_id):
+        with db_connection(leitura=True) as conn:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            executar_preparado(cursor, f"""
+                SELECT {COLUNAS_PET}
+                FROM pet p 
+                JOIN usuario u ON p.id_usuario = u.id_usuario
+                WHERE p.id_pet = %s
+            """, (pet_id,))
+            pet = cursor.fetchone()
+            cursor.close()
+            return dict(pet) if pet else None
+
+    @staticmethod
+    @metricas.medir_sql('pet.listar_matches')
+    def listar_matches(pet_id, limite=20):
+        """Possíveis correspondências do pet (nos dois sentidos), da maior para a menor nota."""
+        try:
+            with db_connection() as conn:
                 cursor = conn.cursor(cursor_factory=RealDictCursor)
-                cursor.execute("""
-                    SELECT p.*, u.nome AS nome_usuario
-                    FROM pet p 
+                executar_preparado(cursor, f"""
+                    SELECT {COLUNAS_PET}, m.pontuacao
+                    FROM (
+                        SELECT id_achado AS id_outro, pontuacao FROM pet_match WHERE id_perdido = %s
+                        UNION ALL
+                        SELECT id_perdido AS id_outro, pontuacao FROM pet_match WHERE id_achado = %s
+                    ) m
+                    JOIN pet p ON p.id_pet = m.id_outro
                     JOIN usuario u ON p.id_usuario = u.id_usuario
-                    ORDER BY p.data DESC
-                """)
-                pets = cursor.fetchall()
+                    WHERE NOT p.oculto AND p.status = 'ativo'
+                    ORDER BY m.pontuacao DESC
+                    LIMIT %s
+                """, (pet_id, pet_id, limite))
+                matches = [dict(linha) for linha in cursor.fetchall()]
                 cursor.close()
-                conn.close()
-                return pets
-            except Exception as e:
-                print(f"Erro ao listar pets: {e}")
-                if conn: conn.close()
-                return []
-        return []
-    
+                return matches
+        except Exception as e:
+            print(f"Erro ao listar correspondências: {e}")
+            return []
+
     @staticmethod
-    def buscar_por_id(pet_id):
-        conn = get_db_connection()
-        if conn:
-            try:
+    @metricas.medir_sql('pet.buscar_por_ids')
+    def buscar_por_ids(ids):
+        """Vários pets de uma vez, na ordem dos ids pedidos (ids inexistentes ou ocultos são ignorados)."""
+        if not ids:
+            return []
+        try:
+            with db_connection() as conn:
                 cursor = conn.cursor(cursor_factory=RealDictCursor)
-                cursor.execute("""
-                    SELECT p.*, u.nome AS nome_usuario
-                    FROM pet p 
+                executar_preparado(cursor, f"""
+                    SELECT {COLUNAS_PET}
+                    FROM pet p
                     JOIN usuario u ON p.id_usuario = u.id_usuario
-                    WHERE p.id_pet = %s
-                """, (pet_id,))
-                pet = cursor.fetchone()
+                    WHERE p.id_pet = ANY(%s) AND NOT p.oculto AND p.status = 'ativo'
+                """, (list(ids),))
+                por_id = {linha['id_pet']: dict(linha) for linha in cursor.fetchall()}
                 cursor.close()
-                conn.close()
-                return pet
-            except Exception as e:
-                print(f"Erro ao buscar pet: {e}")
-                if conn: conn.close()
-                return None
-        return None
+                return [por_id[id_pet] for id_pet in ids if id_pet in por_id]
+        except Exception as e:
+            print(f"Erro ao buscar pets: {e}")
+            return []
 
     @staticmethod
+    @metricas.medir_sql('pet.deletar')
     def deletar_por_id(pet_id):
-        conn = get_db_connection()
-        if conn:
-            try:
+        """Apaga o pet e, se ele era o último a usar a foto, o arquivo da foto."""
+        try:
+            with db_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute("DELETE FROM pet WHERE id_pet = %s", (pet_id,))
+                cursor.execute("DELETE FROM pet WHERE id_pet = %s RETURNING foto", (pet_id,))
+                linha = cursor.fetchone()
+                foto = linha[0] if linha else None
+                foto_liberada = None
+                if foto:
+                    cursor.execute("""
+                        UPDATE arquivo_upload SET referencias = referencias - 1
+                        WHERE caminho = %s RETURNING referencias
+                    """, (foto,))
+                    restantes = cursor.fetchone()
+                    if restantes is None:
+                        # Foto antiga (anterior ao armazenamento por hash): pertence só a este pet
+                        foto_liberada = foto
+                    elif restantes[0] <= 0:
+                        cursor.execute("DELETE FROM arquivo_upload WHERE caminho = %s", (foto,))
+                        foto_liberada = foto
+                if foto_liberada:
+                    # O arquivo só é apagado pela fila, depois do commit; se o DELETE
+                    # for desfeito, a tarefa também é e a foto continua lá
+                    agendar_remocao(foto_liberada, cursor)
+                if linha:
+                    eventos.notificar(cursor, 'removido', pet_id)
                 conn.commit()
                 cursor.close()
-                conn.close()
-                return True
-            except Exception as e:
-                print(f"Erro ao deletar pet: {e}")
-                if conn: conn.close()
-                return False
-        return False
+        except Exception as e:
+            print(f"Erro ao deletar pet: {e}")
+            return False
+
+        Pet.invalidar_cache(pet_id)
+        phash.remover_do_indice(pet_id)
+        return True
+
+    @staticmethod
+    @metricas.medir_sql('pet.alterar_status')
+    def alterar_status(pet_id, id_usuario, status):
+        """O dono marca o anúncio como 'resolvido' ou o reativa ('ativo').
+
+        Reativar renova a validade: o prazo de PET_EXPIRA_DIAS recomeça a contar.
+        Retorna False se o pet não existe, não é do usuário ou já está nesse status.
+        """
+        if status not in ('ativo', 'resolvido'):
+            raise ValueError("Status inválido: use 'ativo' ou 'resolvido'.")
+        try:
+            with db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    UPDATE pet SET status = %s, status_em = CURRENT_TIMESTAMP
+                    WHERE id_pet = %s AND id_usuario = %s AND status <> %s
+                    RETURNING data, especie, situacao, sexo
+                """, (status, pet_id, id_usuario, status))
+                linha = cursor.fetchone()
+                if linha:
+                    if status == 'ativo':
+                        data, especie, situacao, sexo = linha
+                        eventos.notificar(cursor, 'novo', pet_id, data=data, especie=especie,
+                                          situacao=situacao, sexo=sexo)
+                    else:
+                        eventos.notificar(cursor, 'removido', pet_id)
+                conn.commit()
+                cursor.close()
+        except Exception as e:
+            print(f"Erro ao alterar o status do pet: {e}")
+            return False
+        if linha:
+            Pet.invalidar_cache(pet_id)
+        return linha is not None
+
+    @staticmethod
+    def invalidar_cache(pet_id):
+        """Remove o pet do cache e invalida todas as páginas do feed."""
+        cache.delete(f"pets:id:{pet_id}")
+        cache.invalidar_namespace('pets:lista')
 
 class Denuncia:
     def __init__(self, id_pet, id_usuario, motivo, id_denuncia=None, data_denuncia=None):
@@ -170,50 +609,238 @@ class Denuncia:
         self.motivo = motivo
         self.data_denuncia = data_denuncia
 
+    @metricas.medir_sql('denuncia.salvar')
     def salvar(self):
-        conn = get_db_connection()
-        if conn:
-            try:
+        """Grava a denúncia e atualiza o resumo do pet na mesma transação.
+
+        Se o pet chegar a DENUNCIA_LIMITE_OCULTAR denunciantes distintos desde a
+        última revisão, ele é escondido na hora, sem esperar um administrador.
+        """
+        try:
+            with db_connection() as conn:
                 cursor = conn.cursor()
+                executar_preparado(
+                    cursor,
+                    "SELECT EXISTS (SELECT 1 FROM denuncia WHERE id_pet = %s AND id_usuario = %s)",
+                    (self.id_pet, self.id_usuario)
+                )
+                novo_denunciante = 0 if cursor.fetchone()[0] else 1
                 sql_query = """
                     INSERT INTO denuncia (id_pet, id_usuario, motivo)
-                    VALUES (%s, %s, %s) RETURNING id_denuncia
+                    VALUES (%s, %s, %s) RETURNING id_denuncia, data_denuncia
                 """
-                cursor.execute(sql_query, (self.id_pet, self.id_usuario, self.motivo))
-                denuncia_id = cursor.fetchone()[0]
+                executar_preparado(cursor, sql_query, (self.id_pet, self.id_usuario, self.motivo))
+                denuncia_id, data_denuncia = cursor.fetchone()
+                executar_preparado(cursor, """
+                    INSERT INTO denuncia_resumo AS r (id_pet, total, denunciantes, primeira, ultima)
+                    VALUES (%s, 1, 1, %s, %s)
+                    ON CONFLICT (id_pet) DO UPDATE SET
+                        total = r.total + 1,
+                        denunciantes = r.denunciantes + %s,
+                        ultima = EXCLUDED.ultima,
+                        pendente = TRUE
+                    RETURNING denunciantes - denunciantes_revisados
+                """, (self.id_pet, data_denuncia, data_denuncia, novo_denunciante))
+                ocultado = False
+                if cursor.fetchone()[0] >= Config.DENUNCIA_LIMITE_OCULTAR:
+                    cursor.execute(
+                        "UPDATE pet SET oculto = TRUE WHERE id_pet = %s AND NOT oculto",
+                        (self.id_pet,)
+                    )
+                    ocultado = cursor.rowcount > 0
+                    if ocultado:
+                        eventos.notificar(cursor, 'removido', self.id_pet)
                 conn.commit()
                 cursor.close()
-                conn.close()
+                if ocultado:
+                    Pet.invalidar_cache(self.id_pet)
                 return denuncia_id
-            except Exception as e:
-                print(f"Erro ao salvar denúncia: {e}")
-                if conn: conn.close()
-                return None
-        return None
+        except Exception as e:
+            print(f"Erro ao salvar denúncia: {e}")
+            return None
 
     @staticmethod
-    def listar_todas():
-        conn = get_db_connection()
-        if conn:
-            try:
+    @metricas.medir_sql('denuncia.fila_moderacao')
+    def fila_moderacao(ordem='contagem', cursor=None, limite=50):
+        """Pets com denúncias pendentes, um item por pet. Retorna (itens, proximo_cursor).
+
+        `ordem` é 'contagem' (mais denunciados primeiro) ou 'recentes' (última
+        denúncia mais recente primeiro). Cada item traz os contadores do resumo
+        e as 3 denúncias mais recentes do pet.
+        """
+        # ordem -> (coluna, tipo do valor no cursor)
+        coluna, tag_cursor = {'contagem': ('r.total', 'i'), 'recentes': ('r.ultima', 't')}.get(ordem, (None, None))
+        if coluna is None:
+            raise ValueError("Ordem inválida: use 'contagem' ou 'recentes'.")
+        condicoes = ["r.pendente"]
+        params = []
+        if cursor:
+            valor, cursor_id = decodificar_cursor(cursor, tag_cursor)
+            condicoes.append(f"({coluna}, r.id_pet) < (%s, %s)")
+            params.extend([valor, cursor_id])
+        params.append(limite + 1)
+        try:
+            with db_connection(leitura=True) as conn:
+                cur = conn.cursor(cursor_factory=RealDictCursor)
+                cur.execute(f"""
+                    SELECT
+                        r.id_pet, r.total, r.denunciantes, r.primeira, r.ultima,
+                        p.nome AS pet_nome, p.foto, p.oculto, recentes.denuncias
+                    FROM denuncia_resumo r
+                    JOIN pet p ON p.id_pet = r.id_pet
+                    CROSS JOIN LATERAL (
+                        SELECT json_agg(json_build_object(
+                            'motivo', d.motivo,
+                            'data_denuncia', d.data_denuncia,
+                            'usuario_email', u.e_mail
+                        ) ORDER BY d.data_denuncia DESC) AS denuncias
+                        FROM (
+                            SELECT motivo, data_denuncia, id_usuario FROM denuncia
+                            WHERE id_pet = r.id_pet
+                            ORDER BY data_denuncia DESC
+                            LIMIT 3
+                        ) d
+                        JOIN usuario u ON u.id_usuario = d.id_usuario
+                    ) recentes
+                    WHERE {' AND '.join(condicoes)}
+                    ORDER BY {coluna} DESC, r.id_pet DESC
+                    LIMIT %s
+                """, params)
+                itens = [dict(item) for item in cur.fetchall()]
+                cur.close()
+        except Exception as e:
+            print(f"Erro ao listar a fila de moderação: {e}")
+            return [], None
+
+        proximo_cursor = None
+        if len(itens) > limite:
+            itens = itens[:limite]
+            ultimo = itens[-1]
+            chave = ultimo['total'] if ordem == 'contagem' else ultimo['ultima']
+            proximo_cursor = codificar_cursor(chave, ultimo['id_pet'])
+        return itens, proximo_cursor
+
+    @staticmethod
+    @metricas.medir_sql('denuncia.marcar_revisado')
+    def marcar_revisado(pet_id):
+        """O administrador manteve o anúncio: sai da fila e volta a aparecer se estava oculto."""
+        try:
+            with db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    UPDATE denuncia_resumo
+                    SET pendente = FALSE, denunciantes_revisados = denunciantes
+                    WHERE id_pet = %s
+                """, (pet_id,))
+                cursor.execute("UPDATE pet SET oculto = FALSE WHERE id_pet = %s", (pet_id,))
+                revisado = cursor.rowcount > 0
+                conn.commit()
+                cursor.close()
+        except Exception as e:
+            print(f"Erro ao revisar denúncias: {e}")
+            return False
+        Pet.invalidar_cache(pet_id)
+        return revisado
+
+class Alerta:
+    def __init__(self, id_usuario, especie, situacao='Achado', sexo=None, raca=None,
+                 latitude=None, longitude=None, raio_km=None, data_inicio=None, data_fim=None,
+                 id_alerta=None):
+        self.id_alerta = id_alerta
+        self.id_usuario = id_usuario
+        self.especie = especie
+        self.situacao = situacao
+        self.sexo = sexo
+        self.raca = raca
+        self.latitude = latitude
+        self.longitude = longitude
+        self.raio_km = raio_km
+        self.data_inicio = data_inicio
+        self.data_fim = data_fim
+
+    @metricas.medir_sql('alerta.salvar')
+    def salvar(self):
+        """Grava o alerta e as suas linhas no índice invertido (ver alertas.py)."""
+        try:
+            with db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    INSERT INTO alerta (id_usuario, situacao, especie, sexo, raca, latitude, longitude,
+                                        raio_km, data_inicio, data_fim)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    RETURNING id_alerta
+                """, (self.id_usuario, self.situacao, self.especie, self.sexo, self.raca, self.latitude,
+                      self.longitude, self.raio_km, self.data_inicio, self.data_fim))
+                self.id_alerta = cursor.fetchone()[0]
+                execute_values(cursor, """
+                    INSERT INTO alerta_indice (situacao, especie, sexo, celula, id_alerta) VALUES %s
+                    ON CONFLICT DO NOTHING
+                """, alertas.linhas_indice(self.id_alerta, self.situacao, self.especie, self.sexo,
+                                            self.latitude, self.longitude, self.raio_km))
+                conn.commit()
+                cursor.close()
+                return self.id_alerta
+        except Exception as e:
+            print(f"Erro ao salvar alerta: {e}")
+            return None
+
+    @staticmethod
+    @metricas.medir_sql('alerta.listar_por_usuario')
+    def listar_por_usuario(id_usuario):
+        try:
+            with db_connection() as conn:
                 cursor = conn.cursor(cursor_factory=RealDictCursor)
-                sql_query = """
-                    SELECT 
-                        d.id_denuncia, d.motivo, d.data_denuncia,
-                        p.id_pet, p.nome AS pet_nome, p.foto,
-                        u.id_usuario, u.e_mail AS usuario_email
-                    FROM denuncia d
-                    JOIN pet p ON d.id_pet = p.id_pet
-                    JOIN usuario u ON d.id_usuario = u.id_usuario
-                    ORDER BY d.data_denuncia DESC
-                """
-                cursor.execute(sql_query)
-                denuncias = cursor.fetchall()
+                cursor.execute("""
+                    SELECT id_alerta, situacao, especie, sexo, raca, latitude, longitude, raio_km,
+                           data_inicio, data_fim, criado_em
+                    FROM alerta WHERE id_usuario = %s AND ativo
+                    ORDER BY id_alerta DESC
+                """, (id_usuario,))
+                resultado = cursor.fetchall()
+                cursor.close()
+                return resultado
+        except Exception as e:
+            print(f"Erro ao listar alertas: {e}")
+            return []
+
+    @staticmethod
+    @metricas.medir_sql('alerta.remover')
+    def remover(id_alerta, id_usuario):
+        """Apaga um alerta do usuário (com o índice e os avisos, pelo ON DELETE CASCADE)."""
+        try:
+            with db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "DELETE FROM alerta WHERE id_alerta = %s AND id_usuario = %s",
+                    (id_alerta, id_usuario)
+                )
+                removido = cursor.rowcount > 0
+                conn.commit()
+                cursor.close()
+                return removido
+        except Exception as e:
+            print(f"Erro ao remover alerta: {e}")
+            return False
+
+    @staticmethod
+    @metricas.medir_sql('alerta.avisos_recentes')
+    def avisos_recentes(id_usuario, limite=20):
+        """Últimos anúncios que combinaram com os alertas do usuário."""
+        try:
+            with db_connection() as conn:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                cursor.execute("""
+                    SELECT o.id_notificacao, o.id_alerta, o.criado_em, o.enviado_em,
+                           p.id_pet, p.nome, p.especie, p.situacao, p.visto_em, p.data
+                    FROM notificacao_outbox o
+                    JOIN pet p ON p.id_pet = o.id_pet
+                    WHERE o.id_usuario = %s AND NOT p.oculto
+                    ORDER BY o.id_notificacao DESC
+                    LIMIT %s
+                """, (id_usuario, limite))
+                resultado = cursor.fetchall()
                 cursor.close()
-                conn.close()
-                return denuncias
-            except Exception as e:
-                print(f"Erro ao listar denúncias: {e}")
-                if conn: conn.close()
-                return []
-        return []
\ No newline at end of file
+                return resultado
+        except Exception as e:
+            print(f"Erro ao listar avisos: {e}")
+            return []
@@ -0,0 +1,268 @@
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from psycopg2.extras import execute_values
+
+import fila
+from config import Config
+from database import db_connection
+
+# ==========================================
+# HASH PERCEPTUAL DAS FOTOS (dHash)
+# ==========================================
+
+# O dHash reduz a foto para 9x8 em tons de cinza e compara cada pixel com o
+# vizinho da direita: 64 bits que mudam pouco com redimensionamento, compressão
+# ou pequenos ajustes de cor. Fotos parecidas têm hashes a poucos bits de distância.
+
+def dhash(caminho):
+    """Hash perceptual de 64 bits da imagem, como inteiro com sinal (cabe num BIGINT)."""
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(caminho) as imagem:
+        # draft() deixa o decodificador JPEG já ler a foto reduzida, bem mais rápido
+        imagem.draft('L', (64, 64))
+        pixels = np.asarray(imagem.convert('L').resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    valor = int.from_bytes(np.packbits(bits).tobytes(), 'big')
+    return valor - (1 << 64) if valor >= (1 << 63) else valor
+
+def distancia(hash_a, hash_b):
+    return bin((hash_a ^ hash_b) & 0xFFFFFFFFFFFFFFFF).count('1')
+
+# ==========================================
+# ÍNDICE EM MEMÓRIA (MULTI-INDEX HASHING)
+# ==========================================
+
+class IndiceHamming:
+    """Busca por distância de Hamming dividindo o hash em 4 blocos de 16 bits.
+
+    Se dois hashes estão a até `r` bits, pelo menos um dos 4 blocos difere em
+    no máximo r // 4 bits (princípio da casa dos pombos). Então basta procurar,
+    em cada tabela, os blocos a até r // 4 bits do bloco consultado e conferir
+    a distância completa só desses candidatos.
+    """
+
+    BLOCOS = 4
+    BITS_BLOCO = 16
+
+    def __init__(self):
+        self._tabelas = [{} for _ in range(self.BLOCOS)]
+        self._hashes = {}  # id_pet -> hash sem sinal
+        self._lock = threading.Lock()
+
+    def _blocos(self, valor):
+        mascara = (1 << self.BITS_BLOCO) - 1
+        return [(valor >> (self.BITS_BLOCO * i)) & mascara for i in range(self.BLOCOS)]
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def adicionar(self, id_pet, valor):
+        valor &= 0xFFFFFFFFFFFFFFFF
+        with self._lock:
+            if id_pet in self._hashes:
+                self._remover(id_pet)
+            self._hashes[id_pet] = valor
+            for tabela, bloco in zip(self._tabelas, self._blocos(valor)):
+                tabela.setdefault(bloco, set()).add(id_pet)
+
+    def _remover(self, id_pet):
+        valor = self._hashes.pop(id_pet)
+        for tabela, bloco in zip(self._tabelas, self._blocos(valor)):
+            ids = tabela.get(bloco)
+            if ids:
+                ids.discard(id_pet)
+                if not ids:
+                    del tabela[bloco]
+
+    def remover(self, id_pet):
+        with self._lock:
+            if id_pet in self._hashes:
+                self._remover(id_pet)
+
+    def _vizinhos(self, bloco, raio):
+        """Todos os valores de 16 bits a até `raio` bits de `bloco`."""
+        resultado = [bloco]
+        fronteira = [(bloco, -1)]
+        for _ in range(raio):
+            proxima = []
+            for valor, ultimo_bit in fronteira:
+                for bit in range(ultimo_bit + 1, self.BITS_BLOCO):
+                    vizinho = valor ^ (1 << bit)
+                    resultado.append(vizinho)
+                    proxima.append((vizinho, bit))
+            fronteira = proxima
+        return resultado
+
+    def buscar(self, valor, raio):
+        """[(distancia, id_pet)] dos hashes a até `raio` bits, do mais parecido ao menos."""
+        valor &= 0xFFFFFFFFFFFFFFFF
+        raio_bloco = raio // self.BLOCOS
+        candidatos = set()
+        with self._lock:
+            for tabela, bloco in zip(self._tabelas, self._blocos(valor)):
+                for vizinho in self._vizinhos(bloco, raio_bloco):
+                    ids = tabela.get(vizinho)
+                    if ids:
+                        candidatos.update(ids)
+            resultado = []
+            for id_pet in candidatos:
+                d = distancia(valor, self._hashes[id_pet])
+                if d <= raio:
+                    resultado.append((d, id_pet))
+        resultado.sort()
+        return resultado
+
+
+_indice = IndiceHamming()
+_recarga = None
+_recarga_lock = threading.Lock()
+
+def _carregar_indice():
+    indice = IndiceHamming()
+    with db_connection() as conn:
+        # Cursor nomeado (no servidor): a tabela inteira não passa pela memória de uma vez
+        cursor = conn.cursor(name='carregar_foto_hash')
+        cursor.itersize = 10000
+        cursor.execute("SELECT id_pet, foto_hash FROM pet WHERE foto_hash IS NOT NULL")
+        for id_pet, valor in cursor:
+            indice.adicionar(id_pet, valor)
+        cursor.close()
+        conn.rollback()
+    return indice
+
+def _recarregar():
+    global _indice
+    while True:
+        try:
+            # O índice novo é montado à parte e trocado de uma vez: as buscas usam o antigo enquanto isso
+            _indice = _carregar_indice()
+            espera = Config.PHASH_RECARGA_SEGUNDOS
+        except Exception as e:
+            print(f"❌ Erro ao carregar o índice de fotos parecidas: {e}")
+            espera = min(30, Config.PHASH_RECARGA_SEGUNDOS)
+        time.sleep(espera)
+
+def get_indice():
+    """Índice do processo, carregado e recarregado numa thread própria.
+
+    Nenhuma requisição espera pela carga: até a primeira terminar o índice
+    está vazio, e as recargas (a cada PHASH_RECARGA_SEGUNDOS) trocam o índice
+    inteiro quando ficam prontas. Os hashes são calculados pelo worker da fila,
+    então a foto de um anúncio novo só entra aqui na recarga seguinte.
+    """
+    global _recarga
+    if _recarga is None:
+        with _recarga_lock:
+            if _recarga is None:
+                _recarga = threading.Thread(target=_recarregar, name='phash-indice', daemon=True)
+                _recarga.start()
+    return _indice
+
+def similares_de_varios(pet_ids, raio=None):
+    """{id_pet: [(distancia, id_pet)]} dos pets com foto parecida, com uma única consulta ao banco."""
+    raio = Config.PHASH_DISTANCIA_MAX if raio is None else raio
+    if not pet_ids:
+        return {}
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id_pet, foto_hash FROM pet WHERE id_pet = ANY(%s)", (list(pet_ids),))
+        hashes = dict(cursor.fetchall())
+        cursor.close()
+    indice = get_indice()
+    resultado = {}
+    for pet_id in pet_ids:
+        valor = hashes.get(pet_id)
+        resultado[pet_id] = [] if valor is None else [
+            (d, outro) for d, outro in indice.buscar(valor, raio) if outro != pet_id
+        ]
+    return resultado
+
+def similares(pet_id, raio=None):
+    """[(distancia, id_pet)] de pets com foto parecida (sem o próprio pet)."""
+    return similares_de_varios([pet_id], raio)[pet_id]
+
+# ==========================================
+# CÁLCULO EM SEGUNDO PLANO
+# ==========================================
+
+@fila.tarefa('phash.processar')
+def processar(pet_id):
+    """Calcula e grava o hash da foto de um pet."""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT foto FROM pet WHERE id_pet = %s", (pet_id,))
+        linha = cursor.fetchone()
+        if not linha or not linha[0]:
+            cursor.close()
+            return None
+        valor = dhash(os.path.join(Config.UPLOAD_FOLDER, linha[0]))
+        cursor.execute("UPDATE pet SET foto_hash = %s WHERE id_pet = %s", (valor, pet_id))
+        conn.commit()
+        cursor.close()
+    if _recarga is not None:
+        # Só num processo que usa o índice (o worker da fila não usa)
+        _indice.adicionar(pet_id, valor)
+    return valor
+
+def remover_do_indice(pet_id):
+    _indice.remover(pet_id)
+
+def agendar(pet_id, cursor=None):
+    """Calcula o hash da foto pela fila de tarefas, fora da requisição que salvou o pet."""
+    fila.enfileirar('phash.processar', {'pet_id': pet_id}, cursor=cursor)
+
+# ==========================================
+# BACKFILL (LINHA DE COMANDO)
+# ==========================================
+
+def _dhash_seguro(caminho):
+    try:
+        return dhash(caminho)
+    except Exception as e:
+        print(f"❌ {caminho}: {e}")
+        return None
+
+def backfill(processos=None, lote=1000):
+    """Calcula o hash das fotos de pets que ainda não têm, em paralelo em todos os núcleos."""
+    total = 0
+    ultimo_id = 0
+    with ProcessPoolExecutor(max_workers=processos) as executor:
+        while True:
+            with db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT id_pet, foto FROM pet
+                    WHERE foto IS NOT NULL AND foto_hash IS NULL AND id_pet > %s
+                    ORDER BY id_pet LIMIT %s
+                """, (ultimo_id, lote))
+                pendentes = cursor.fetchall()
+                if not pendentes:
+                    cursor.close()
+                    break
+                ultimo_id = pendentes[-1][0]
+                caminhos = [os.path.join(Config.UPLOAD_FOLDER, foto) for _, foto in pendentes]
+                valores = list(executor.map(_dhash_seguro, caminhos, chunksize=32))
+                linhas = [(id_pet, valor) for (id_pet, _), valor in zip(pendentes, valores) if valor is not None]
+                if linhas:
+                    execute_values(cursor, """
+                        UPDATE pet SET foto_hash = dados.valor
+                        FROM (VALUES %s) AS dados (id_pet, valor)
+                        WHERE pet.id_pet = dados.id_pet
+                    """, linhas)
+                conn.commit()
+                cursor.close()
+            total += len(linhas)
+            print(f"🖼️ {total} hash(es) calculado(s)...")
+    print(f"Concluído: {total} foto(s) com hash.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calcula o hash perceptual das fotos que ainda não têm.")
+    parser.add_argument('--processos', type=int, default=None, help="padrão: número de núcleos")
+    args = parser.parse_args()
+    backfill(args.processos)
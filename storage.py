@@ -0,0 +1,127 @@
+import hashlib
+import os
+import tempfile
+import time
+
+import fila
+import metricas
+from config import Config
+from database import db_connection
+from imagens import FORMATOS, VARIANTES, nome_variante
+
+# ==========================================
+# ARMAZENAMENTO DE UPLOADS POR CONTEÚDO
+# ==========================================
+
+# Cada foto é gravada com o nome do seu hash SHA-256, em subpastas pelos
+# primeiros caracteres do hash para não acumular milhares de arquivos numa pasta só:
+#   static/uploads/3f/a2/3fa2...e9.jpg
+# Fotos idênticas viram o mesmo arquivo; a tabela 'arquivo_upload' conta quantos
+# pets usam cada um, e o arquivo só é apagado quando o último deles é removido.
+
+class ArquivoGrandeDemaisError(Exception):
+    """O upload passou do tamanho máximo permitido."""
+
+
+class ArmazenamentoUploads:
+
+    def __init__(self, pasta, tamanho_max, tamanho_bloco=64 * 1024):
+        self.pasta = pasta
+        self.tamanho_max = tamanho_max
+        self.tamanho_bloco = tamanho_bloco
+        self.pasta_temporaria = os.path.join(pasta, '.tmp')
+        os.makedirs(self.pasta_temporaria, exist_ok=True)
+
+    def caminho(self, nome):
+        return os.path.join(self.pasta, nome)
+
+    def salvar(self, stream, extensao):
+        """Grava o stream em blocos, calculando o hash no caminho.
+
+        Retorna (nome, novo): o nome relativo à pasta de uploads e se o
+        arquivo foi criado agora (False quando já existia uma cópia idêntica).
+        """
+        inicio = time.perf_counter()
+        extensao = extensao.lower().replace('jpeg', 'jpg')
+        sha256 = hashlib.sha256()
+        tamanho = 0
+        descritor, temporario = tempfile.mkstemp(dir=self.pasta_temporaria, suffix='.upload')
+        try:
+            with os.fdopen(descritor, 'wb') as destino:
+                while True:
+                    bloco = stream.read(self.tamanho_bloco)
+                    if not bloco:
+                        break
+                    tamanho += len(bloco)
+                    if tamanho > self.tamanho_max:
+                        raise ArquivoGrandeDemaisError(
+                            f"A foto passa do limite de {self.tamanho_max // (1024 * 1024)} MB."
+                        )
+                    sha256.update(bloco)
+                    destino.write(bloco)
+
+            metricas.upload_bytes.observar(tamanho)
+            digest = sha256.hexdigest()
+            nome = f"{digest[:2]}/{digest[2:4]}/{digest}.{extensao}"
+            caminho_final = self.caminho(nome)
+            novo = True
+            if os.path.exists(caminho_final):
+                try:
+                    # Renova o mtime: a limpeza de órfãos (limpeza_uploads.py) não
+                    # recolhe uma cópia que acabou de ganhar outro anúncio
+                    os.utime(caminho_final)
+                    os.remove(temporario)
+                    novo = False
+                except FileNotFoundError:
+                    # Foi para a quarentena neste meio-tempo: grava de novo
+                    pass
+            if novo:
+                os.makedirs(os.path.dirname(caminho_final), exist_ok=True)
+                os.replace(temporario, caminho_final)
+            metricas.upload_duracao.observar(time.perf_counter() - inicio)
+            return nome, novo
+        except Exception:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+
+    def remover(self, nome):
+        """Apaga o arquivo e suas variantes (thumb/medium). Erros são apenas registrados."""
+        caminhos = [self.caminho(nome)] + [
+            self.caminho(nome_variante(nome, variante, formato))
+            for variante in VARIANTES for formato in FORMATOS
+        ]
+        for caminho in caminhos:
+            try:
+                os.remove(caminho)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                # Se o arquivo não puder ser apagado, apenas loga o erro, não impede a operação
+                print(f"Erro ao deletar arquivo de imagem: {e}")
+
+
+armazenamento = ArmazenamentoUploads(Config.UPLOAD_FOLDER, Config.UPLOAD_MAX_BYTES)
+
+# ==========================================
+# REMOÇÃO EM SEGUNDO PLANO
+# ==========================================
+
+@fila.tarefa('uploads.remover')
+def remover_se_orfao(foto):
+    """Apaga a foto se nenhum pet voltou a usá-la desde que a remoção foi agendada.
+
+    Entre o DELETE do último pet e esta tarefa, a mesma foto pode ter sido
+    enviada de novo (mesmo hash, mesmo arquivo) e ganhado outra linha em arquivo_upload.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM arquivo_upload WHERE caminho = %s", (foto,))
+        em_uso = cursor.fetchone() is not None
+        cursor.close()
+    if not em_uso:
+        armazenamento.remover(foto)
+
+def agendar_remocao(foto, cursor=None):
+    fila.enfileirar('uploads.remover', {'foto': foto}, cursor=cursor)
+
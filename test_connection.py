@@ -5,9 +5,9 @@ def test_connection():
     if conn:
         print("✅ Conexão com banco estabelecida!")
         cursor = conn.cursor()
-        cursor.execute("SELECT @@version")
+        cursor.execute("SELECT version()")
         version = cursor.fetchone()
-        print(f"Versão SQL Server: {version[0]}")
+        print(f"Versão PostgreSQL: {version[0]}")
         conn.close()
     else:
         print("❌ Erro na conexão com banco")
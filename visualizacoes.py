@@ -0,0 +1,113 @@
+import atexit
+import math
+import threading
+import time
+from collections import Counter
+
+from psycopg2.extras import execute_values
+
+import metricas
+from config import Config
+from database import db_connection
+
+# ==========================================
+# CONTADORES DE VISUALIZAÇÃO (WRITE-BEHIND)
+# ==========================================
+
+# Um UPDATE por acesso a /verpet/<id> custaria uma escrita (e um lock de linha)
+# por página vista. Em vez disso, cada processo soma os acessos num Counter em
+# memória e uma thread grava o acumulado a cada VISUALIZACOES_INTERVALO segundos,
+# num único INSERT ... ON CONFLICT com uma linha por pet. A requisição só
+# incrementa o Counter.
+#
+# Se o processo morrer entre duas gravações, perdem-se no máximo os acessos
+# desses poucos segundos: é um sinal de popularidade, não uma contabilidade.
+
+# Placar de tendência: cada visualização vale 2^((t - EPOCA) / meia-vida), ou
+# seja, as novas valem mais que as antigas. O placar guarda o logaritmo da soma,
+# que não estoura o float e pode ser comparado (e indexado) diretamente.
+EPOCA = 1704067200  # 2024-01-01 00:00 UTC
+
+def peso_log(instante=None):
+    """Logaritmo do peso de uma visualização feita em `instante` (padrão: agora)."""
+    instante = time.time() if instante is None else instante
+    return (instante - EPOCA) * math.log(2) / (Config.VISUALIZACOES_MEIA_VIDA_HORAS * 3600)
+
+@metricas.medir_sql('visualizacoes.gravar')
+def gravar(pendentes):
+    """Soma {id_pet: visualizações} em pet_visualizacao, numa transação."""
+    agora = peso_log()
+    # Em ordem de id: dois processos gravando ao mesmo tempo travam as linhas
+    # na mesma ordem, então um espera o outro em vez de entrar em deadlock
+    linhas = [(pet_id, total, math.log(total) + agora) for pet_id, total in sorted(pendentes.items())]
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        execute_values(cursor, """
+            INSERT INTO pet_visualizacao AS v (id_pet, total, tendencia)
+            SELECT d.id_pet, d.total, d.tendencia
+            FROM (VALUES %s) AS d (id_pet, total, tendencia)
+            WHERE EXISTS (SELECT 1 FROM pet p WHERE p.id_pet = d.id_pet)
+            ORDER BY d.id_pet
+            ON CONFLICT (id_pet) DO UPDATE SET
+                total = v.total + EXCLUDED.total,
+                tendencia = GREATEST(v.tendencia, EXCLUDED.tendencia)
+                            + LN(1 + EXP(-ABS(v.tendencia - EXCLUDED.tendencia))),
+                atualizado_em = CURRENT_TIMESTAMP
+        """, linhas, page_size=1000)
+        conn.commit()
+        cursor.close()
+
+class ContadorVisualizacoes:
+    """Soma as visualizações em memória e as grava em lote numa thread própria."""
+
+    def __init__(self, intervalo):
+        self.intervalo = intervalo
+        self._pendentes = Counter()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def registrar(self, pet_id):
+        """Conta uma visualização. Não consulta o banco."""
+        with self._lock:
+            self._pendentes[pet_id] += 1
+            if self._thread is None:
+                # Só no primeiro uso: com gunicorn --preload o módulo é importado antes do fork
+                self._thread = threading.Thread(target=self._rodar, name='visualizacoes', daemon=True)
+                self._thread.start()
+
+    def descarregar(self):
+        """Grava as visualizações acumuladas. Retorna quantos pets foram atualizados."""
+        with self._lock:
+            pendentes, self._pendentes = self._pendentes, Counter()
+        if not pendentes:
+            return 0
+        try:
+            gravar(pendentes)
+        except Exception:
+            # Voltam para a próxima rodada; o Counter cresce no máximo até o número de pets
+            with self._lock:
+                self._pendentes.update(pendentes)
+            raise
+        return len(pendentes)
+
+    def _rodar(self):
+        while True:
+            time.sleep(self.intervalo)
+            try:
+                self.descarregar()
+            except Exception as e:
+                print(f"❌ Erro ao gravar as visualizações: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {'pendentes': sum(self._pendentes.values()), 'pets': len(self._pendentes)}
+
+
+contador = ContadorVisualizacoes(Config.VISUALIZACOES_INTERVALO)
+
+@atexit.register
+def _descarregar_ao_sair():
+    try:
+        contador.descarregar()
+    except Exception as e:
+        print(f"❌ Visualizações perdidas ao encerrar: {e}")